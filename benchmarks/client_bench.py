@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Throughput and latency benchmarks of the client API.
+
+Each benchmark runs a number of operations against a Colonies server and
+reports operations per second together with p50/p99 latency. By default an
+in-process MockColoniesServer is started, so the numbers measure the client
+(signing, encoding, HTTP/WebSocket round trips) rather than a real server.
+
+Benchmarks:
+    sign_pure, sign_native  crypto.sign of an RPC payload
+    submit_func_spec        submit a function spec
+    assign_close            assign a waiting process and close it
+    wait                    wait for a process that is closed concurrently
+    channel_append          append a message to a channel
+    subscribe_channel       latency from channel_append until the entry
+                            arrives on a subscription
+    upload_data             upload a 64 KiB file
+    download_data           download a 64 KiB file
+
+Results are printed as a table and can be written as JSON with --output.
+With --baseline, ops/sec is compared against a previously written result
+file and the script exits with status 1 if any benchmark is more than
+--tolerance slower.
+
+Usage: python3 benchmarks/client_bench.py [--iterations N] [--native]
+                                          [--output FILE] [--baseline FILE]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import string
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crypto import Crypto
+from mockserver import MockColoniesServer
+from pycolonies import Colonies, func_spec
+
+FILE_SIZE = 64 * 1024
+
+def percentile(values, p):
+    values = sorted(values)
+    i = min(len(values) - 1, max(0, int(round(p / 100.0 * len(values))) - 1))
+    return values[i]
+
+def summarize(latencies, elapsed):
+    return {
+        "ops": len(latencies),
+        "ops_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000
+    }
+
+def timed(fn, iterations):
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - start)
+
+def native_crypto_available():
+    try:
+        Crypto(native=True)
+        return True
+    except OSError:
+        return False
+
+class Bench:
+    def __init__(self, colonies, native):
+        self.colonies = colonies
+        self.crypto = Crypto(native=native)
+        self.server_prvkey = self.crypto.prvkey()
+        self.colony_prvkey = self.crypto.prvkey()
+        self.executor_prvkey = self.crypto.prvkey()
+        self.colonyname = "bench-" + "".join(random.choices(string.ascii_lowercase, k=8))
+        self.executortype = "bench-executor"
+
+    def setup(self):
+        colony = {"colonyid": self.crypto.id(self.colony_prvkey), "name": self.colonyname}
+        self.colonies.add_colony(colony, self.server_prvkey)
+        executor = {
+            "executorname": "bench",
+            "executorid": self.crypto.id(self.executor_prvkey),
+            "colonyname": self.colonyname,
+            "executortype": self.executortype
+        }
+        self.colonies.add_executor(executor, self.colony_prvkey)
+        self.colonies.approve_executor(self.colonyname, "bench", self.colony_prvkey)
+
+    def teardown(self):
+        self.colonies.del_colony(self.colonyname, self.server_prvkey)
+
+    def spec(self, channels=None):
+        spec = func_spec("bench", ["1", "2"], self.colonyname, self.executortype, maxexectime=60)
+        if channels is not None:
+            spec.channels = channels
+        return spec
+
+    def sign(self, native, iterations):
+        crypto = Crypto(native=native)
+        payload = "eyJtc2d0eXBlIjoic3VibWl0ZnVuY3NwZWNtc2cifQ==" * 8
+        return timed(lambda i: crypto.sign(payload, self.executor_prvkey), iterations)
+
+    def submit_func_spec(self, iterations):
+        spec = self.spec()
+        result = timed(lambda i: self.colonies.submit_func_spec(spec, self.executor_prvkey), iterations)
+        self.drain()
+        return result
+
+    def assign_close(self, iterations):
+        spec = self.spec()
+        for _ in range(iterations):
+            self.colonies.submit_func_spec(spec, self.executor_prvkey)
+
+        def cycle(i):
+            process = self.colonies.assign(self.colonyname, 10, self.executor_prvkey)
+            self.colonies.close(process.processid, ["3"], self.executor_prvkey)
+
+        return timed(cycle, iterations)
+
+    def wait(self, iterations):
+        spec = self.spec()
+        latencies = []
+        elapsed = 0
+        for _ in range(iterations):
+            process = self.colonies.submit_func_spec(spec, self.executor_prvkey)
+            assigned = self.colonies.assign(self.colonyname, 10, self.executor_prvkey)
+            closer = threading.Timer(0.005, self.colonies.close, args=(assigned.processid, ["3"], self.executor_prvkey))
+            t = time.perf_counter()
+            closer.start()
+            self.colonies.wait(process, 10, self.executor_prvkey)
+            latencies.append(time.perf_counter() - t)
+            elapsed += latencies[-1]
+            closer.join()
+        return summarize(latencies, elapsed)
+
+    def channel_process(self):
+        spec = self.spec(channels=["bench"])
+        self.colonies.submit_func_spec(spec, self.executor_prvkey)
+        return self.colonies.assign(self.colonyname, 10, self.executor_prvkey)
+
+    def channel_append(self, iterations):
+        process = self.channel_process()
+        result = timed(lambda i: self.colonies.channel_append(process.processid, "bench", i + 1, "x" * 100, self.executor_prvkey), iterations)
+        self.colonies.close(process.processid, [], self.executor_prvkey)
+        return result
+
+    def subscribe_channel(self, iterations):
+        process = self.channel_process()
+        sent = {}
+        received = {}
+        done = threading.Event()
+
+        def callback(entries):
+            now = time.perf_counter()
+            for entry in entries:
+                received[entry["sequence"]] = now
+            if len(received) >= iterations:
+                done.set()
+                return False
+            return True
+
+        subscriber = threading.Thread(target=self.colonies.subscribe_channel,
+                                      args=(process.processid, "bench", self.executor_prvkey),
+                                      kwargs={"after_seq": 0, "timeout": 60, "callback": callback},
+                                      daemon=True)
+        subscriber.start()
+        time.sleep(0.2)
+
+        start = time.perf_counter()
+        for i in range(1, iterations + 1):
+            sent[i] = time.perf_counter()
+            self.colonies.channel_append(process.processid, "bench", i, "x" * 100, self.executor_prvkey)
+        done.wait(60)
+        elapsed = max(received.values()) - start
+        self.colonies.close(process.processid, [], self.executor_prvkey)
+        return summarize([received[i] - sent[i] for i in received], elapsed)
+
+    def upload_data(self, iterations):
+        data = os.urandom(FILE_SIZE)
+        return timed(lambda i: self.colonies.upload_data(self.colonyname, self.executor_prvkey,
+                                                          filename="bench-" + str(i), data=data, label="/bench"), iterations)
+
+    def download_data(self, iterations):
+        f = self.colonies.upload_data(self.colonyname, self.executor_prvkey, filename="bench", data=os.urandom(FILE_SIZE), label="/bench")
+        return timed(lambda i: self.colonies.download_data(self.colonyname, self.executor_prvkey, fileid=f["fileid"]), iterations)
+
+    def drain(self):
+        self.colonies.remove_all_processes(self.colonyname, self.colony_prvkey)
+
+def compare(results, baseline, tolerance):
+    """Return the names of the benchmarks that are more than tolerance slower than the baseline."""
+    regressions = []
+    print()
+    print("%-20s %14s %14s %9s" % ("benchmark", "baseline op/s", "current op/s", "change"))
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        change = result["ops_per_sec"] / base["ops_per_sec"] - 1
+        flag = ""
+        if change < -tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("%-20s %14.1f %14.1f %+8.1f%%%s" % (name, base["ops_per_sec"], result["ops_per_sec"], change * 100, flag))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--native", action="store_true", help="sign RPC messages with the native crypto library")
+    parser.add_argument("--host", help="benchmark an existing server instead of an in-process mock server")
+    parser.add_argument("--port", type=int, default=50080)
+    parser.add_argument("--server-prvkey", help="server private key, required with --host")
+    parser.add_argument("--only", nargs="*", help="names of the benchmarks to run")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a JSON file written with --output")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown relative to the baseline (default: 0.2)")
+    args = parser.parse_args()
+
+    native = native_crypto_available()
+    if args.native and not native:
+        parser.error("native crypto library not found, set CRYPTOLIB")
+
+    server = None
+    if args.host is None:
+        server = MockColoniesServer(native_crypto=native).start()
+        server.set_s3_env()
+        colonies = server.client(native_crypto=args.native)
+    else:
+        colonies = Colonies(args.host, args.port, native_crypto=args.native)
+
+    bench = Bench(colonies, args.native)
+    if args.server_prvkey is not None:
+        bench.server_prvkey = args.server_prvkey
+
+    benchmarks = {
+        "sign_pure": lambda n: bench.sign(False, n),
+        "sign_native": lambda n: bench.sign(True, n),
+        "submit_func_spec": bench.submit_func_spec,
+        "assign_close": bench.assign_close,
+        "wait": bench.wait,
+        "channel_append": bench.channel_append,
+        "subscribe_channel": bench.subscribe_channel,
+        "upload_data": bench.upload_data,
+        "download_data": bench.download_data,
+    }
+    if not native:
+        del benchmarks["sign_native"]
+    if args.only:
+        benchmarks = {name: fn for name, fn in benchmarks.items() if name in args.only}
+
+    print("%-20s %8s %12s %10s %10s" % ("benchmark", "ops", "ops/sec", "p50 (ms)", "p99 (ms)"))
+    results = {}
+    bench.setup()
+    try:
+        for name, fn in benchmarks.items():
+            results[name] = fn(args.iterations)
+            r = results[name]
+            print("%-20s %8d %12.1f %10.2f %10.2f" % (name, r["ops"], r["ops_per_sec"], r["p50_ms"], r["p99_ms"]))
+    finally:
+        bench.teardown()
+        if server is not None:
+            server.stop()
+
+    if args.output is not None:
+        report = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "native_crypto": args.native,
+            "serializer": colonies.serializer.name,
+            "iterations": args.iterations,
+            "server": "mock" if args.host is None else args.host + ":" + str(args.port),
+            "results": results
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        if len(compare(results, baseline, args.tolerance)) > 0:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
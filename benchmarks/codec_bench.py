@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of the binary codecs against JSON stringification of arguments.
+
+Without a codec, values that are not str/int have to be converted to strings
+by the submitter and parsed again by the executor, e.g. a float series is
+sent as ["0.1", "0.2", ...]. With a codec, the values are packed into a
+single base64 blob. Both paths are measured end to end: converting the
+values, encoding the RPC payload as JSON, and decoding it on the other side.
+No server is needed.
+
+Payloads:
+    floats_1k, floats_100k  float series such as the DES executor's NDVI series
+    records_1k              list of dicts with mixed field types
+    bytes_1m                1 MiB binary blob
+
+Usage: python3 benchmarks/codec_bench.py [--iterations N] [--output FILE]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codec import available_codecs, decode_values, encode_values
+
+def percentile(values, p):
+    values = sorted(values)
+    i = min(len(values) - 1, max(0, int(round(p / 100.0 * len(values))) - 1))
+    return values[i]
+
+def payloads():
+    rng = random.Random(1)
+    return {
+        "floats_1k": [rng.random() for _ in range(1000)],
+        "floats_100k": [rng.random() for _ in range(100000)],
+        "records_1k": [{"id": i, "name": "pixel-" + str(i), "value": rng.random(), "valid": i % 2 == 0}
+                       for i in range(1000)],
+        "bytes_1m": rng.randbytes(1024 * 1024),
+    }
+
+def json_roundtrip(values):
+    # what callers do today: stringify every value, parse it back on the executor
+    if isinstance(values, bytes):
+        args = [values.hex()]
+    else:
+        args = [json.dumps(value) if isinstance(value, dict) else str(value) for value in values]
+    data = json.dumps({"args": args})
+    received = json.loads(data)["args"]
+    if isinstance(values, bytes):
+        decoded = bytes.fromhex(received[0])
+    else:
+        decoded = [json.loads(value) if value.startswith("{") else float(value) for value in received]
+    return len(data), decoded
+
+def codec_roundtrip(values, codec):
+    data = json.dumps({"args": encode_values([values], codec)})
+    decoded = decode_values(json.loads(data)["args"], [codec])[0]
+    return len(data), decoded
+
+def bench(fn, iterations):
+    latencies = []
+    size = 0
+    for _ in range(iterations):
+        t = time.perf_counter()
+        size, _ = fn()
+        latencies.append(time.perf_counter() - t)
+    return {"bytes": size, "p50_ms": percentile(latencies, 50) * 1000, "p99_ms": percentile(latencies, 99) * 1000}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    print("%-12s %-8s %12s %10s %10s" % ("payload", "encoding", "bytes", "p50 ms", "p99 ms"))
+    for name, values in payloads().items():
+        results[name] = {"json": bench(lambda: json_roundtrip(values), args.iterations)}
+        for codec in available_codecs():
+            results[name][codec] = bench(lambda: codec_roundtrip(values, codec), args.iterations)
+        for encoding, result in results[name].items():
+            print("%-12s %-8s %12d %10.3f %10.3f" % (name, encoding, result["bytes"], result["p50_ms"], result["p99_ms"]))
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"iterations": args.iterations, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
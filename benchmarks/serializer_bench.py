@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the RPC encode/decode path for each installed JSON backend.
+
+Encoding covers what __rpc does before signing and sending: payload dumps,
+base64 and the envelope dumps. Decoding covers the reply: envelope loads,
+base64 decode and payload loads.
+
+Usage: python3 benchmarks/serializer_bench.py [--iterations N]
+"""
+
+import argparse
+import base64
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycolonies import func_spec
+from serializer import available_serializers, get_serializer
+
+def sample_process(output):
+    spec = func_spec("sum_nums", ["1", "2"], "dev", "python-executor", maxexectime=60)
+    return {
+        "processid": "a" * 64,
+        "initiatorid": "b" * 64,
+        "initiatorname": "user",
+        "assignedexecutorid": "c" * 64,
+        "isassigned": True,
+        "state": 1,
+        "prioritytime": 1700000000000000000,
+        "submissiontime": "2024-01-01T12:00:00.000000Z",
+        "starttime": "2024-01-01T12:00:01.000000Z",
+        "endtime": "0001-01-01T00:00:00Z",
+        "waitdeadline": "0001-01-01T00:00:00Z",
+        "execdeadline": "2024-01-01T12:01:01.000000Z",
+        "retries": 0,
+        "attributes": [],
+        "spec": spec.model_dump(by_alias=True),
+        "waitforparents": False,
+        "parents": [],
+        "children": [],
+        "processgraphid": "",
+        "in": output,
+        "out": [],
+        "errors": []
+    }
+
+def sample_messages():
+    spec = func_spec("sum_nums", ["1", "2"], "dev", "python-executor", maxexectime=60)
+    return {
+        "submitfuncspecmsg": {
+            "msgtype": "submitfuncspecmsg",
+            "spec": spec.model_dump(by_alias=True)
+        },
+        "closesuccessfulmsg": {
+            "msgtype": "closesuccessfulmsg",
+            "processid": "a" * 64,
+            "out": [i * 0.5 for i in range(1000)]
+        },
+        "channelappendmsg": {
+            "msgtype": "channelappendmsg",
+            "processid": "a" * 64,
+            "name": "chat",
+            "sequence": 1,
+            "inreplyto": 0,
+            "payload": list(os.urandom(4096)),
+            "payloadtype": ""
+        },
+        "assignprocessmsg (reply)": sample_process([str(i) for i in range(100)]),
+    }
+
+def encode(serializer, msg):
+    payload = base64.b64encode(serializer.dumps(msg)).decode("ascii")
+    rpc = {"payloadtype": "msg", "payload": payload, "signature": "0" * 130}
+    return serializer.dumps(rpc)
+
+def decode(serializer, data):
+    reply = serializer.loads(data)
+    return serializer.loads(base64.b64decode(reply["payload"]))
+
+def measure(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    backends = available_serializers()
+    print("backends:", ", ".join(backends))
+    print()
+    print("%-26s %-8s %12s %12s %10s" % ("message", "backend", "encode (us)", "decode (us)", "speedup"))
+
+    for name, msg in sample_messages().items():
+        baseline = None
+        for backend in reversed(backends):
+            serializer = get_serializer(backend)
+            data = encode(serializer, msg)
+            enc = measure(lambda: encode(serializer, msg), args.iterations)
+            dec = measure(lambda: decode(serializer, data), args.iterations)
+            if baseline is None:
+                baseline = enc + dec
+            print("%-26s %-8s %12.1f %12.1f %9.2fx" % (name, backend, enc, dec, baseline / (enc + dec)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,560 @@
+import collections
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from errors import (ColoniesConnectionError, ColoniesAuthError, ColoniesConflictError, ColoniesNotFoundError,
+                    ColoniesTimeoutError)
+from memo import canonical_hash
+
+def blueprint_name(blueprint):
+    return blueprint["metadata"]["name"]
+
+def blueprint_generation(blueprint):
+    return blueprint["metadata"].get("generation", 0)
+
+def blueprint_location(blueprint):
+    return blueprint["metadata"].get("locationname", "")
+
+def blueprint_hash(blueprint):
+    """Return the SHA-256 of the parts of a blueprint set by its manifest.
+
+    Covers the kind, the spec, the handler and the location, independent of
+    dict ordering, and ignores the fields set by the server.
+    """
+    return canonical_hash({
+        "kind": blueprint.get("kind"),
+        "spec": blueprint.get("spec"),
+        "handler": blueprint.get("handler"),
+        "locationname": blueprint_location(blueprint),
+    })
+
+def reconcile_target(process):
+    """Return (blueprint name, action, force) of a reconcile process."""
+    kwargs = process.spec.kwargs or {}
+    name = kwargs.get("blueprintname") or kwargs.get("blueprintName") or kwargs.get("name")
+    if name is None and process.spec.args is not None and len(process.spec.args) > 0:
+        name = process.spec.args[0]
+    force = str(kwargs.get("force", "false")).lower() == "true"
+    return name, kwargs.get("action", "reconcile"), force
+
+class BlueprintInformer:
+    """Local cache of the blueprints of a colony, kept up to date by generation.
+
+    start() lists the blueprints once. After that, resync() lists them again
+    in a single call every resync_interval seconds, and refresh(name)
+    re-reads one blueprint, e.g. when a reconcile process for it has been
+    assigned. Only blueprints that were added or removed or whose
+    generation changed are reported to the handlers; other blueprints are
+    replaced silently, so the cached status stays current. Reads are served
+    from memory, indexed by name, kind and location.
+
+    Usage:
+        informer = BlueprintInformer(colonies, colonyname, prvkey, kind="HomeDevice")
+        informer.add_handler(on_update=lambda old, new: print(new["metadata"]["name"]))
+        informer.start()
+
+    Args:
+        colonies: Colonies client
+        colonyname: Name of the colony
+        prvkey: Private key for authentication
+        kind: Only cache blueprints of this kind
+        location: Only cache blueprints at this location
+        resync_interval: Seconds between resyncs by start(), None to only
+                         resync when resync() is called
+    """
+
+    def __init__(self, colonies, colonyname, prvkey, kind=None, location=None, resync_interval=60):
+        self.colonies = colonies
+        self.colonyname = colonyname
+        self.prvkey = prvkey
+        self.kind = kind
+        self.location = location
+        self.resync_interval = resync_interval
+        self.blueprints = {}
+        self.by_kind = {}
+        self.by_location = {}
+        self.handlers = []
+        self.synced = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def add_handler(self, on_add=None, on_update=None, on_delete=None):
+        """Register functions called on changes, on the thread that found them.
+
+        Args:
+            on_add: Function on_add(blueprint)
+            on_update: Function on_update(old, new), called when the
+                       generation changed
+            on_delete: Function on_delete(blueprint)
+        """
+        self.handlers.append((on_add, on_update, on_delete))
+
+    def start(self):
+        """List the blueprints and start resyncing in the background."""
+        self.resync()
+        if self.resync_interval is not None:
+            self.thread = threading.Thread(target=self.__resync_loop, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __resync_loop(self):
+        while not self.stopped.wait(self.resync_interval):
+            try:
+                self.resync()
+            except Exception:
+                # a failing call or handler must not stop the resyncs
+                continue
+
+    def resync(self):
+        """List all blueprints and report the changes since the last list."""
+        blueprints = self.colonies.get_blueprints(self.colonyname, self.prvkey, kind=self.kind,
+                                                  location=self.location) or []
+        current = {blueprint_name(blueprint): blueprint for blueprint in blueprints}
+        changes = []
+        with self.lock:
+            for name in list(self.blueprints):
+                if name not in current:
+                    changes.append(self.__remove(name))
+            for blueprint in blueprints:
+                changes.append(self.__put(blueprint))
+        self.synced.set()
+        self.__dispatch(changes)
+
+    def refresh(self, name):
+        """Re-read one blueprint and report it if it changed.
+
+        Returns:
+            The blueprint, or None if it no longer exists
+        """
+        try:
+            blueprint = self.colonies.get_blueprint(self.colonyname, name, self.prvkey)
+        except ColoniesNotFoundError:
+            blueprint = None
+        with self.lock:
+            if blueprint is None or not self.__matches(blueprint):
+                change = self.__remove(name)
+                blueprint = None
+            else:
+                change = self.__put(blueprint)
+        self.__dispatch([change])
+        return blueprint
+
+    def __matches(self, blueprint):
+        return (self.kind is None or blueprint.get("kind") == self.kind) and \
+            (self.location is None or blueprint_location(blueprint) == self.location)
+
+    def __put(self, blueprint):
+        name = blueprint_name(blueprint)
+        old = self.blueprints.get(name)
+        if old is not None:
+            self.__unindex(old)
+        self.blueprints[name] = blueprint
+        self.by_kind.setdefault(blueprint.get("kind"), set()).add(name)
+        self.by_location.setdefault(blueprint_location(blueprint), set()).add(name)
+        if old is None:
+            return ("add", None, blueprint)
+        if blueprint_generation(old) != blueprint_generation(blueprint):
+            return ("update", old, blueprint)
+        return None
+
+    def __remove(self, name):
+        old = self.blueprints.pop(name, None)
+        if old is None:
+            return None
+        self.__unindex(old)
+        return ("delete", old, None)
+
+    def __unindex(self, blueprint):
+        name = blueprint_name(blueprint)
+        for index, key in ((self.by_kind, blueprint.get("kind")), (self.by_location, blueprint_location(blueprint))):
+            names = index.get(key)
+            if names is not None:
+                names.discard(name)
+                if len(names) == 0:
+                    del index[key]
+
+    def __dispatch(self, changes):
+        for change in changes:
+            if change is None:
+                continue
+            event, old, new = change
+            for on_add, on_update, on_delete in self.handlers:
+                if event == "add" and on_add is not None:
+                    on_add(new)
+                elif event == "update" and on_update is not None:
+                    on_update(old, new)
+                elif event == "delete" and on_delete is not None:
+                    on_delete(old)
+
+    def get(self, name):
+        """Return a cached blueprint, or None."""
+        with self.lock:
+            return self.blueprints.get(name)
+
+    def list(self, kind=None, location=None):
+        """Return the cached blueprints, optionally of one kind and at one location."""
+        with self.lock:
+            names = None
+            for index, key in ((self.by_kind, kind), (self.by_location, location)):
+                if key is not None:
+                    matching = index.get(key, set())
+                    names = matching if names is None else names & matching
+            if names is None:
+                return list(self.blueprints.values())
+            return [self.blueprints[name] for name in sorted(names)]
+
+    def __len__(self):
+        with self.lock:
+            return len(self.blueprints)
+
+    def history(self, name, since=0):
+        """Return the history entries of a blueprint newer than generation since, oldest first.
+
+        A handler can use this to see all generations between the old and
+        the new blueprint passed to on_update.
+
+        Raises:
+            ColoniesNotFoundError: The blueprint is not cached
+        """
+        blueprint = self.get(name)
+        if blueprint is None:
+            raise ColoniesNotFoundError("blueprint " + name + " is not cached", status=404)
+        limit = max(1, blueprint_generation(blueprint) - since)
+        entries = self.colonies.get_blueprint_history(blueprint["blueprintid"], self.prvkey, limit=limit) or []
+        entries = [entry for entry in entries if entry.get("generation", 0) > since]
+        return sorted(entries, key=lambda entry: entry.get("generation", 0))
+
+class ReconcileRequest:
+    def __init__(self, name):
+        self.name = name
+        self.processes = []
+        self.force = False
+
+class Reconciler:
+    """Assigns reconcile processes and runs a handler for each blueprint on a pool of workers.
+
+    Reconcile processes are queued by blueprint name. A process for a
+    blueprint that is already queued joins that entry, so a burst of spec
+    changes leads to one handler call, and a blueprint is never reconciled
+    by two workers at the same time; a process arriving while it is being
+    reconciled queues it once more. All processes of an entry are closed
+    with the result of the handler call, or failed with its error.
+
+    The handler is called with the current blueprint and returns its new
+    status, or None to leave the status alone. It is skipped if the
+    generation has already been reconciled, unless one of the processes
+    asked for a forced reconcile. Statuses are written every
+    status_interval seconds, only the latest one per blueprint and only if
+    it differs from the last one written. on_delete(name) is called when the
+    blueprint no longer exists.
+
+    Usage:
+        def reconcile(blueprint):
+            apply(blueprint["spec"])
+            return {"synced": True}
+
+        reconciler = Reconciler(colonies, colonyname, executor_prvkey, reconcile, workers=8)
+        reconciler.start()
+
+    Args:
+        colonies: Colonies client
+        colonyname: Name of the colony
+        prvkey: Private key of the reconciler executor
+        handler: Function handler(blueprint) returning the status or None
+        on_delete: Function on_delete(name) called for removed blueprints
+        informer: BlueprintInformer used to read blueprints, so its cache and
+                  handlers see the changes reconciled
+        workers: Maximum number of blueprints reconciled at the same time
+        assign_timeout: Seconds each assign call waits for a process
+        status_interval: Seconds between status writes
+        max_pending: Maximum number of assigned processes waiting to be
+                     reconciled; when reached no more processes are assigned
+    """
+
+    def __init__(self, colonies, colonyname, prvkey, handler, on_delete=None, informer=None, workers=4,
+                 assign_timeout=10, status_interval=1.0, max_pending=1000):
+        self.colonies = colonies
+        self.colonyname = colonyname
+        self.prvkey = prvkey
+        self.handler = handler
+        self.on_delete = on_delete
+        self.informer = informer
+        self.workers = workers
+        self.assign_timeout = assign_timeout
+        self.status_interval = status_interval
+        self.max_pending = max_pending
+
+        self.requests = {}
+        self.ready = collections.deque()
+        self.active = set()
+        self.pending = 0
+        self.reconciled = {}
+        self.statuses = {}
+        self.written = {}
+        self.counters = {"processes": 0, "collapsed": 0, "reconciled": 0, "skipped": 0, "failed": 0,
+                         "status_writes": 0, "status_coalesced": 0}
+        self.lock = threading.Condition()
+        self.status_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def start(self):
+        """Start assigning processes, the workers and the status writer in background threads."""
+        targets = [self.__assign_loop, self.__status_loop] + [self.__work] * self.workers
+        self.threads = [threading.Thread(target=target, daemon=True) for target in targets]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """Stop assigning, reconcile the processes already assigned and write the pending statuses."""
+        self.stopping.set()
+        if len(self.threads) > 0:
+            self.threads[0].join()
+        with self.lock:
+            self.stopped.set()
+            self.lock.notify_all()
+        for thread in self.threads[1:]:
+            thread.join()
+        self.flush()
+
+    def __assign_loop(self):
+        while not self.stopping.is_set():
+            with self.lock:
+                if self.pending >= self.max_pending:
+                    self.lock.wait(0.5)
+                    continue
+            try:
+                process = self.colonies.assign(self.colonyname, self.assign_timeout, self.prvkey)
+            except (ColoniesNotFoundError, ColoniesTimeoutError):
+                continue
+            except ColoniesAuthError:
+                # the executor has been removed or rejected
+                break
+            except ColoniesConnectionError:
+                self.stopping.wait(1)
+                continue
+            self.submit(process)
+
+    def submit(self, process):
+        """Queue a reconcile process assigned by the caller."""
+        name, action, force = reconcile_target(process)
+        if process.spec.funcname != "reconcile" or name is None:
+            self.__finish([process], errors=["not a reconcile process"])
+            return
+        with self.lock:
+            self.counters["processes"] += 1
+            request = self.requests.get(name)
+            if request is None:
+                request = self.requests[name] = ReconcileRequest(name)
+                if name not in self.active:
+                    self.ready.append(name)
+            else:
+                self.counters["collapsed"] += 1
+            request.processes.append(process)
+            request.force = request.force or force
+            self.pending += 1
+            self.lock.notify_all()
+
+    def __work(self):
+        while True:
+            with self.lock:
+                while len(self.ready) == 0:
+                    if self.stopped.is_set():
+                        return
+                    self.lock.wait(0.5)
+                name = self.ready.popleft()
+                request = self.requests.pop(name)
+                self.active.add(name)
+            try:
+                self.__reconcile(request)
+            finally:
+                with self.lock:
+                    self.active.discard(name)
+                    self.pending -= len(request.processes)
+                    if name in self.requests:
+                        self.ready.append(name)
+                    self.lock.notify_all()
+
+    def __get(self, name):
+        if self.informer is not None:
+            return self.informer.refresh(name)
+        try:
+            return self.colonies.get_blueprint(self.colonyname, name, self.prvkey)
+        except ColoniesNotFoundError:
+            return None
+
+    def __reconcile(self, request):
+        name = request.name
+        try:
+            blueprint = self.__get(name)
+            if blueprint is None:
+                with self.status_lock:
+                    self.statuses.pop(name, None)
+                    self.written.pop(name, None)
+                self.reconciled.pop(name, None)
+                if self.on_delete is not None:
+                    self.on_delete(name)
+                output = ["deleted"]
+            elif not request.force and self.reconciled.get(name) == blueprint_generation(blueprint):
+                with self.lock:
+                    self.counters["skipped"] += 1
+                output = ["unchanged"]
+            else:
+                status = self.handler(blueprint)
+                self.reconciled[name] = blueprint_generation(blueprint)
+                if status is not None:
+                    self.__set_status(name, status, blueprint.get("status"))
+                with self.lock:
+                    self.counters["reconciled"] += 1
+                output = ["reconciled"]
+        except Exception as err:
+            with self.lock:
+                self.counters["failed"] += 1
+            self.__finish(request.processes, errors=[str(err)])
+            return
+        self.__finish(request.processes, output=output)
+
+    def __finish(self, processes, output=None, errors=None):
+        for process in processes:
+            try:
+                if errors is not None:
+                    self.colonies.fail(process.processid, errors, self.prvkey)
+                else:
+                    self.colonies.close(process.processid, output, self.prvkey)
+            except ColoniesConnectionError:
+                pass
+
+    def __set_status(self, name, status, current):
+        with self.status_lock:
+            if status == self.written.get(name, current):
+                self.statuses.pop(name, None)
+                self.counters["status_coalesced"] += 1
+                return
+            if name in self.statuses:
+                self.counters["status_coalesced"] += 1
+            self.statuses[name] = status
+
+    def __status_loop(self):
+        while not self.stopped.wait(self.status_interval):
+            self.flush()
+
+    def flush(self):
+        """Write the pending statuses now."""
+        with self.status_lock:
+            statuses = self.statuses
+            self.statuses = {}
+        for name, status in statuses.items():
+            try:
+                self.colonies.update_blueprint_status(self.colonyname, name, status, self.prvkey)
+            except ColoniesNotFoundError:
+                continue
+            except ColoniesConnectionError:
+                # try again with the next flush, unless a newer status came in
+                with self.status_lock:
+                    self.statuses.setdefault(name, status)
+                continue
+            with self.status_lock:
+                self.written[name] = status
+                self.counters["status_writes"] += 1
+
+    def stats(self):
+        """Return the number of processes, collapsed processes, handler calls, skips, failures and status writes."""
+        with self.lock, self.status_lock:
+            return dict(self.counters, pending=self.pending)
+
+def load_manifests(directory):
+    """Return the blueprints in the .json files of a directory, sorted by file name.
+
+    A file may hold one blueprint or a list of them.
+    """
+    manifests = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(directory, filename)) as f:
+            content = json.load(f)
+        manifests.extend(content if isinstance(content, list) else [content])
+    return manifests
+
+def apply_blueprints(colonies, manifests, prvkey, concurrency=8, informer=None):
+    """Create or update blueprints so they match their manifests.
+
+    The current blueprints are read with one get_blueprints call per colony,
+    or from informer for its colony. A manifest is only sent if it is new or
+    if the hash of its kind, spec, handler and location differs from the
+    current blueprint, and up to concurrency of them are sent at the same
+    time. Blueprints without a manifest are left alone.
+
+    Args:
+        colonies: Colonies client
+        manifests: Blueprints, each with metadata.name and metadata.colonyname
+        prvkey: Private key for authentication
+        concurrency: Maximum number of add and update calls at the same time
+        informer: BlueprintInformer caching the current blueprints
+
+    Returns:
+        {"created": [names], "updated": [names], "unchanged": [names],
+        "failed": {name: exception}}
+
+    Raises:
+        ValueError: Two manifests have the same colony and name
+    """
+    current = {}
+    keys = set()
+    for manifest in manifests:
+        colonyname = manifest["metadata"]["colonyname"]
+        key = (colonyname, blueprint_name(manifest))
+        if key in keys:
+            raise ValueError("blueprint " + key[1] + " appears more than once")
+        keys.add(key)
+        if colonyname in current or (informer is not None and informer.colonyname == colonyname):
+            continue
+        blueprints = colonies.get_blueprints(colonyname, prvkey) or []
+        current[colonyname] = {blueprint_name(blueprint): blueprint for blueprint in blueprints}
+
+    report = {"created": [], "updated": [], "unchanged": [], "failed": {}}
+    changes = []
+    for manifest in manifests:
+        colonyname = manifest["metadata"]["colonyname"]
+        name = blueprint_name(manifest)
+        if colonyname in current:
+            existing = current[colonyname].get(name)
+        else:
+            existing = informer.get(name)
+        if existing is None:
+            changes.append((manifest, "created"))
+        elif blueprint_hash(existing) != blueprint_hash(manifest):
+            changes.append((manifest, "updated"))
+        else:
+            report["unchanged"].append(name)
+
+    def send(manifest, change):
+        if change == "created":
+            try:
+                return colonies.add_blueprint(manifest, prvkey), change
+            except ColoniesConflictError:
+                # added since the blueprints were read
+                change = "updated"
+        return colonies.update_blueprint(manifest, prvkey), change
+
+    if len(changes) > 0:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [(manifest, pool.submit(send, manifest, change)) for manifest, change in changes]
+            for manifest, future in futures:
+                try:
+                    _, change = future.result()
+                except ColoniesConnectionError as err:
+                    report["failed"][blueprint_name(manifest)] = err
+                    continue
+                report[change].append(blueprint_name(manifest))
+    return report
@@ -0,0 +1,187 @@
+import base64
+import pickle
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+BLOB_PREFIX = "colonies-codec:"
+
+# key under which encoded kwargs are stored in FuncSpec.kwargs
+KWARGS_KEY = "__colonies_codec__"
+
+class Codec:
+    """Binary encoder/decoder for function arguments and results.
+
+    The encoded bytes are carried base64 encoded in the existing string
+    fields of FuncSpec and Process, so the server does not need to know
+    about them.
+    """
+    name = ""
+
+    def encode(self, obj) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data):
+        raise NotImplementedError
+
+class PickleCodec(Codec):
+    """Pickle protocol 5, with large buffers such as numpy arrays kept out-of-band.
+
+    Out-of-band buffers are appended to the pickle stream as they are instead
+    of being copied into it, and are sliced back out of the blob without
+    copying when decoding. Like any pickle, decoding can run arbitrary code,
+    so blobs are only decoded by receivers that chose this codec.
+    """
+    name = "pickle"
+
+    def encode(self, obj) -> bytes:
+        buffers = []
+        data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        raws = [buffer.raw() for buffer in buffers]
+        header = struct.pack("<IQ", len(raws), len(data)) + b"".join(struct.pack("<Q", raw.nbytes) for raw in raws)
+        return b"".join([header, data] + raws)
+
+    def decode(self, data):
+        view = memoryview(data)
+        count, size = struct.unpack_from("<IQ", view)
+        offset = struct.calcsize("<IQ")
+        lengths = struct.unpack_from("<" + "Q" * count, view, offset)
+        offset += 8 * count
+        pickled = view[offset:offset + size]
+        offset += size
+        buffers = []
+        for length in lengths:
+            buffers.append(view[offset:offset + length])
+            offset += length
+        return pickle.loads(pickled, buffers=buffers)
+
+class MsgpackCodec(Codec):
+    name = "msgpack"
+
+    def encode(self, obj) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def decode(self, data):
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+def available_codecs():
+    """Return the names of the codecs that can be used, preferred first."""
+    names = []
+    if msgpack is not None:
+        names.append(MsgpackCodec.name)
+    names.append(PickleCodec.name)
+    return names
+
+def get_codec(name=None) -> Codec:
+    """Return a codec.
+
+    Args:
+        name: "msgpack" or "pickle", None selects msgpack if it is installed
+              and pickle otherwise
+
+    Returns:
+        A Codec instance
+    """
+    if isinstance(name, Codec):
+        return name
+    if name is None:
+        name = available_codecs()[0]
+    if name == MsgpackCodec.name:
+        if msgpack is None:
+            raise ValueError("msgpack codec requested but msgpack is not installed")
+        return MsgpackCodec()
+    if name == PickleCodec.name:
+        return PickleCodec()
+    raise ValueError("unknown codec: " + str(name))
+
+def is_blob(value):
+    return isinstance(value, str) and value.startswith(BLOB_PREFIX)
+
+def has_blobs(values):
+    if not values:
+        return False
+    for value in values:
+        if is_blob(value):
+            return True
+    return False
+
+def blob_codec(values):
+    """Return the name of the codec of the first blob in values, or None if there is none."""
+    for value in values or []:
+        if is_blob(value):
+            return value[len(BLOB_PREFIX):].split(":", 1)[0]
+    return None
+
+def encode_blob(obj, codec):
+    return BLOB_PREFIX + codec.name + ":" + base64.b64encode(codec.encode(obj)).decode("ascii")
+
+def allowed_codec(name, codecs):
+    """Return the codec of codecs named name.
+
+    Raises:
+        ValueError: name is not one of codecs
+    """
+    for codec in codecs or []:
+        codec = get_codec(codec)
+        if codec.name == name:
+            return codec
+    raise ValueError("codec " + name + " is not allowed")
+
+def decode_blob(value, codecs):
+    """Decode a blob, if it was encoded with one of codecs.
+
+    The codec named in the blob is only used if the receiver allowed it, so
+    a sender cannot make a receiver unpickle data it did not ask for.
+    """
+    name, data = value[len(BLOB_PREFIX):].split(":", 1)
+    return allowed_codec(name, codecs).decode(base64.b64decode(data))
+
+def encode_values(values, codec):
+    """Pack a list of arguments or results into a list holding a single blob.
+
+    Args:
+        values: List of arbitrary values the codec can encode
+        codec: Codec instance or name
+    """
+    if values is None:
+        return values
+    return [encode_blob(list(values), get_codec(codec))]
+
+def decode_values(values, codecs):
+    """Expand each blob in values into the list of values it was created from.
+
+    A child process gets the outputs of all its parents concatenated into its
+    input, so blobs can be mixed with plain values.
+
+    Args:
+        values: List of values
+        codecs: Codecs or codec names allowed to decode, values are returned
+                as they are if there are none
+
+    Raises:
+        ValueError: A blob was encoded with a codec not in codecs
+    """
+    if not codecs or not has_blobs(values):
+        return values
+    decoded = []
+    for value in values:
+        if is_blob(value):
+            decoded.extend(decode_blob(value, codecs))
+        else:
+            decoded.append(value)
+    return decoded
+
+def encode_kwargs(kwargs, codec):
+    if not kwargs:
+        return kwargs
+    return {KWARGS_KEY: encode_blob(dict(kwargs), get_codec(codec))}
+
+def decode_kwargs(kwargs, codecs):
+    if not codecs or not kwargs or KWARGS_KEY not in kwargs:
+        return kwargs
+    decoded = {key: value for key, value in kwargs.items() if key != KWARGS_KEY}
+    decoded.update(decode_blob(kwargs[KWARGS_KEY], codecs))
+    return decoded
@@ -56,6 +56,13 @@ class Crypto:
           else:
               return sign(data, prvkey)
 
+      def recoverid(self, data, signature):
+          if self.native:
+              i = self.c_lib.recoverid(data.encode('utf-8'), signature.encode('utf-8'))
+              return i.decode("utf-8")
+          else:
+              return recover_id(data, signature)
+
 def genkey():
     random_bytes = os.urandom(32)  # Generate 32 random bytes
     hash_obj = hashlib.sha3_256()  # Create a SHA-3 256 hash object
@@ -79,6 +86,25 @@ def sign(msg, prv_hex):
     sig_hex = sig.hex()
     return sig_hex
 
+def recover_id(msg, sig_hex):
+    sig = bytes.fromhex(sig_hex)
+    if len(sig) != 65:
+        raise Exception("Invalid signature")
+    r = big_endian_to_int(sig[0:32])
+    s = big_endian_to_int(sig[32:64])
+    v = sig[64]
+
+    hash = hashlib.sha3_256()
+    hash.update(msg.encode('utf-8'))
+    z = big_endian_to_int(hash.digest())
+
+    public_key_bytes = ecdsa_raw_recover(z, (v, r, s))
+    pub_hex = "04"+public_key_bytes.hex()
+    hash = hashlib.sha3_256()
+    hash.update(pub_hex.encode('utf-8'))
+
+    return hash.hexdigest()
+
 def get_id(prv_key):
     prv_key_bytes = bytes.fromhex(prv_key)
     pub = private_key_to_public_key(prv_key_bytes)
@@ -153,6 +179,24 @@ def ecdsa_raw_sign(msg_hash: bytes, private_key_bytes: bytes) -> Tuple[int, int,
 
     return v - 27, r, s
 
+def ecdsa_raw_recover(z: int, vrs: Tuple[int, int, int]) -> bytes:
+    v, r, s = vrs
+    if not (0 < r < N and 0 < s < N):
+        raise Exception("Invalid signature")
+
+    x = r
+    xcubedaseven = (x * x * x + A * x + 7) % P
+    beta = pow(xcubedaseven, (P + 1) // 4, P)
+    y = beta if v == (beta % 2) else P - beta
+    if (xcubedaseven - y * y) % P != 0:
+        raise Exception("Invalid signature")
+
+    Gz = jacobian_multiply(to_jacobian(G), (N - z) % N)
+    XY = jacobian_multiply((x, y, 1), s)
+    Qr = jacobian_add(Gz, XY)
+    Q = jacobian_multiply(Qr, inv(r, N))
+    return encode_raw_public_key(from_jacobian(Q))
+
 def fast_multiply(a: Tuple[int, int], n: int) -> Tuple[int, int]:
     return from_jacobian(jacobian_multiply(to_jacobian(a), n))
 
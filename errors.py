@@ -0,0 +1,79 @@
+class ColoniesConnectionError(Exception):
+    """Base class of the errors raised by RPC calls.
+
+    Attributes:
+        status: HTTP status of the reply, None if no reply was received
+        msgtype: RPC message type of the failed call
+    """
+
+    def __init__(self, message, status=None, msgtype=None):
+        super().__init__(message)
+        self.status = status
+        self.msgtype = msgtype
+
+class ColoniesTransportError(ColoniesConnectionError):
+    """No valid reply was received, e.g. the connection was refused or reset.
+
+    Attributes:
+        connect_failed: True if the request was never sent because no
+                        connection could be established
+    """
+
+    def __init__(self, message, msgtype=None, connect_failed=False):
+        super().__init__(message, msgtype=msgtype)
+        self.connect_failed = connect_failed
+
+class ColoniesTimeoutError(ColoniesConnectionError):
+    """The request or the server timed out."""
+
+class ColoniesError(ColoniesConnectionError):
+    """The server replied with an error."""
+
+class ColoniesAuthError(ColoniesError):
+    """The request was not authorized (HTTP 401/403)."""
+
+class ColoniesNotFoundError(ColoniesError):
+    """The requested object does not exist (HTTP 404)."""
+
+class ColoniesConflictError(ColoniesError):
+    """The object already exists or was modified concurrently (HTTP 409)."""
+
+class ColoniesServerError(ColoniesError):
+    """The server failed to handle the request (HTTP 5xx)."""
+
+class ColoniesRateLimitError(ColoniesError):
+    """A client-side rate limiter rejected the call before it was sent, it is never retried."""
+
+class ColoniesProcessError(Exception):
+    """A process the client waited for failed.
+
+    Attributes:
+        process: The failed process
+    """
+
+    def __init__(self, process):
+        errors = process.errors or []
+        super().__init__("process " + process.processid + " failed: " + "; ".join(str(err) for err in errors))
+        self.process = process
+
+def error_from_reply(status, message, msgtype=None):
+    """Return the exception matching an error reply.
+
+    Args:
+        status: HTTP status of the reply
+        message: Error message sent by the server
+        msgtype: RPC message type of the failed call
+    """
+    if status in (401, 403):
+        cls = ColoniesAuthError
+    elif status == 404:
+        cls = ColoniesNotFoundError
+    elif status == 409:
+        cls = ColoniesConflictError
+    elif status in (408, 504):
+        cls = ColoniesTimeoutError
+    elif status is not None and status >= 500:
+        cls = ColoniesServerError
+    else:
+        cls = ColoniesError
+    return cls(message, status=status, msgtype=msgtype)
@@ -53,10 +53,10 @@ class ColoniesMonad:
         
         return self
 
-    def unwrap(self):
+    def unwrap(self, timeout=100):
         processgraph = self.colonies.submit_workflow(self.wf, self.executor_prvkey)
         last_process = self.colonies.find_process(self.prev_func, processgraph.processids, self.executor_prvkey)
-        process = self.colonies.wait(last_process, 100, self.executor_prvkey)
+        process = self.colonies.wait(last_process, timeout, self.executor_prvkey)
 
         if len(process.output)>0:
             return process.output[0]
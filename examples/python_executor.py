@@ -1,12 +1,12 @@
 from crypto import Crypto
 from pycolonies import colonies_client
 from pycolonies import func_spec
-from pycolonies import ColoniesConnectionError
+from pycolonies import ColoniesAuthError, ColoniesNotFoundError, ColoniesTimeoutError, ColoniesTransportError
 import signal
-import base64 
 import os
 import uuid
 import sys
+import time
 
 class PythonExecutor:
     def __init__(self):
@@ -20,6 +20,7 @@ class PythonExecutor:
         self.executorid = crypto.id(self.executor_prvkey)
         self.executorname = "python-executor"
         self.executortype = "python-executor"
+        self.functions = set()
 
         self.register()
         
@@ -41,18 +42,19 @@ class PythonExecutor:
         print("Executor", self.executorname, "registered")
    
     def start(self):
+        backoff = 1
         while (True):
             try:
                 # try to get a process from the colonies server, the call will block for max 10 seconds
-                # an exception will be raised if no processes can be assigned, and we will restart start the while loop
+                # a ColoniesNotFoundError will be raised if no processes can be assigned, and we will restart the while loop
                 assigned_process = self.colonies.assign(self.colonyname, 10, self.executor_prvkey)
+                backoff = 1
                 print()
                 print("Process", assigned_process.processid, "is assigned to Executor")
 
-                # ok, executor was assigned a process, extract the function code to run
-                code_base64 = assigned_process.spec.env["code"]
-                code_bytes2 = base64.b64decode(code_base64)
-                code = code_bytes2.decode("ascii")
+                # ok, executor was assigned a process, extract the function code to run,
+                # code submitted by hash is downloaded once and cached by the client
+                code = self.colonies.get_code(assigned_process.spec, self.executor_prvkey)
 
                 # add the function to the global scope
                 exec(code)
@@ -60,13 +62,15 @@ class PythonExecutor:
                 # extract args and call the function code we just injected
                 funcspec = assigned_process.spec
                 funcname = funcspec.funcname
-                try:
-                    self.colonies.add_function(self.colonyname, 
-                                             self.executorname, 
-                                             funcname,  
-                                             self.executor_prvkey)
-                except Exception as err:
-                    print(err)
+                if funcname not in self.functions:
+                    try:
+                        self.colonies.add_function(self.colonyname, 
+                                                 self.executorname, 
+                                                 funcname,  
+                                                 self.executor_prvkey)
+                        self.functions.add(funcname)
+                    except Exception as err:
+                        print(err)
 
                 try:
                     # if "input" is defined, it is the output of the parent process,
@@ -105,9 +109,20 @@ class PythonExecutor:
                 print("done")
                 # close the process as successful
                 self.colonies.close(assigned_process.processid, res_arr, self.executor_prvkey)
-            except ColoniesConnectionError as err:
+            except (ColoniesNotFoundError, ColoniesTimeoutError):
+                continue
+            except ColoniesAuthError as err:
+                # the executor has been removed or rejected, retrying will not help
                 print(err)
                 sys.exit(-1)
+            except ColoniesTransportError as err:
+                # assign is not idempotent, so the client only retries it when no connection
+                # could be established; a reset or timed out call may already have assigned
+                # a process and is not retried. Back off here, so a restarting server is not
+                # hammered, and let the server reassign anything lost once maxexectime expires
+                print(err)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
             except Exception as err:
                 pass
 
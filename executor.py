@@ -0,0 +1,726 @@
+import collections
+import contextlib
+import hashlib
+import os
+import shutil
+import signal
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from codec import decode_kwargs, decode_values, encode_values
+from crypto import Crypto
+from pycolonies import Colonies
+from errors import (ColoniesConnectionError, ColoniesTransportError, ColoniesTimeoutError, ColoniesAuthError,
+                    ColoniesNotFoundError, ColoniesError)
+
+class Lease:
+    def __init__(self, processid, deadline):
+        self.processid = processid
+        self.deadline = deadline
+        self.last_heartbeat = None
+
+class LeaseManager:
+    """Keeps the processes an executor is running alive.
+
+    A background thread sends a heartbeat for every tracked process each
+    interval seconds, so whoever watches the process can tell a slow job
+    from a dead worker. Each process also has a lease: if it is not
+    released or extended before the lease runs out, on_expired is called,
+    which by default fails the process so it can be retried elsewhere.
+
+    The Colonies server has no call to move the exec deadline of a running
+    process, so leases are enforced by the executor. Keep maxexectime set as
+    the backstop for executors that die without failing their processes. The
+    default heartbeat only checks that each process is still running and
+    stops tracking those closed, failed or removed by someone else; it
+    writes nothing, so the process log stays the user's. Pass heartbeat to
+    publish heartbeats somewhere watchers can see them.
+
+    Args:
+        colonies: Colonies client
+        prvkey: Private key of the executor
+        interval: Seconds between heartbeats
+        heartbeat: Function heartbeat(processid) sending one heartbeat,
+                   defaults to checking the process is still running
+        on_expired: Function on_expired(processid) called when a lease runs out,
+                    defaults to failing the process
+    """
+
+    def __init__(self, colonies, prvkey, interval=10, heartbeat=None, on_expired=None):
+        self.colonies = colonies
+        self.prvkey = prvkey
+        self.interval = interval
+        self.heartbeat = heartbeat if heartbeat is not None else self.__check
+        self.on_expired = on_expired if on_expired is not None else self.__fail
+        self.leases = {}
+        self.lock = threading.Condition()
+        self.stopped = False
+        self.thread = None
+
+    def start(self):
+        self.stopped = False
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            self.lock.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def track(self, process, lease=None):
+        """Start sending heartbeats for a process.
+
+        Args:
+            process: The assigned process
+            lease: Seconds until the lease expires, defaults to the maxexectime
+                   of the process; None or <= 0 means the lease never expires
+        """
+        if lease is None and process.spec.maxexectime is not None and process.spec.maxexectime > 0:
+            lease = process.spec.maxexectime
+        deadline = time.monotonic() + lease if lease is not None and lease > 0 else None
+        with self.lock:
+            self.leases[process.processid] = Lease(process.processid, deadline)
+            self.lock.notify()
+
+    def extend(self, processid, seconds):
+        """Make sure the lease of a process lasts at least seconds from now.
+
+        Returns:
+            False if the process is not tracked, e.g. because its lease already expired
+        """
+        with self.lock:
+            lease = self.leases.get(processid)
+            if lease is None:
+                return False
+            deadline = time.monotonic() + seconds
+            if lease.deadline is not None and deadline > lease.deadline:
+                lease.deadline = deadline
+            return True
+
+    def release(self, processid):
+        """Stop tracking a process, call when it has been closed or failed."""
+        with self.lock:
+            self.leases.pop(processid, None)
+
+    def deadline(self, processid):
+        """Return the remaining seconds of the lease of a process, or None if it has no deadline."""
+        with self.lock:
+            lease = self.leases.get(processid)
+            if lease is None or lease.deadline is None:
+                return None
+            return lease.deadline - time.monotonic()
+
+    def __check(self, processid):
+        if self.colonies.get_process(processid, self.prvkey).state != Colonies.RUNNING:
+            self.release(processid)
+
+    def __fail(self, processid):
+        self.colonies.fail(processid, ["lease expired"], self.prvkey)
+
+    def __run(self):
+        next_heartbeat = time.monotonic()
+        while True:
+            now = time.monotonic()
+            with self.lock:
+                if self.stopped:
+                    return
+                leases = list(self.leases.values())
+                expired = [lease for lease in leases if lease.deadline is not None and lease.deadline <= now]
+                for lease in expired:
+                    del self.leases[lease.processid]
+
+            for lease in expired:
+                try:
+                    self.on_expired(lease.processid)
+                except Exception:
+                    pass
+
+            if now >= next_heartbeat:
+                for lease in leases:
+                    if lease in expired:
+                        continue
+                    try:
+                        self.heartbeat(lease.processid)
+                        lease.last_heartbeat = time.monotonic()
+                    except ColoniesTransportError:
+                        pass
+                    except ColoniesConnectionError:
+                        # the process is gone or no longer ours
+                        self.release(lease.processid)
+                next_heartbeat = now + self.interval
+
+            with self.lock:
+                if self.stopped:
+                    return
+                deadlines = [lease.deadline for lease in self.leases.values() if lease.deadline is not None]
+                self.lock.wait(max(0.0, min([next_heartbeat] + deadlines) - time.monotonic()))
+
+class FsStager:
+    """Stages the snapshots and dirs declared in FuncSpec.fs into a local cache.
+
+    stage(process) returns at once and downloads in the background, so the
+    executor can start it when a process is assigned and let the transfer
+    overlap with the process running before it. Snapshots are staged into
+    cache_dir/snapshots/<snapshotid> and reused as they are, as snapshots
+    never change. A dir is a file label; the latest revision of each file is
+    staged into cache_dir/dirs/<hash of the names and checksums>, so
+    unchanged dirs are reused too. File contents are kept in
+    cache_dir/objects by SHA-256 checksum and linked into place, so a file
+    shared by several snapshots and dirs is downloaded once and checked
+    against its checksum.
+
+    The names in fs.snapshots are looked up as snapshot names, then as ids.
+    Files are staged by basename, and two different files with the same
+    basename fail the staging with ColoniesError. The cache is not pruned.
+
+    Args:
+        colonies: Colonies client, needs the AWS_S3_* environment to download
+        colonyname: Name of the colony
+        prvkey: Private key of the executor
+        cache_dir: Directory of the local cache
+        workers: Maximum number of files downloaded at the same time
+    """
+
+    def __init__(self, colonies, colonyname, prvkey, cache_dir, workers=4):
+        self.colonies = colonies
+        self.colonyname = colonyname
+        self.prvkey = prvkey
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.jobs = ThreadPoolExecutor(max_workers=workers)
+        self.downloads = ThreadPoolExecutor(max_workers=workers)
+        self.staged = {}
+        self.objects = {}
+        self.counters = {"downloaded": 0, "reused": 0, "bytes": 0, "staged": 0}
+        self.lock = threading.Lock()
+        for subdir in ("objects", "snapshots", "dirs", "tmp"):
+            os.makedirs(os.path.join(self.cache_dir, subdir), exist_ok=True)
+
+    def stage(self, process):
+        """Start staging the fs of a process, once per process.
+
+        Returns:
+            Future of {"mount", "snapshots": {name: path}, "dirs": {label: path}}
+        """
+        with self.lock:
+            future = self.staged.get(process.processid)
+            if future is not None:
+                return future
+            future = self.staged[process.processid] = Future()
+
+        fs = process.spec.fs
+        jobs = []
+        if fs is not None:
+            jobs += [("snapshots", name, self.jobs.submit(self.__stage_snapshot, name)) for name in fs.snapshots or []]
+            jobs += [("dirs", label, self.jobs.submit(self.__stage_dir, label)) for label in fs.dirs or []]
+        staged = {"mount": fs.mount if fs is not None else "", "snapshots": {}, "dirs": {}}
+        remaining = [len(jobs)]
+
+        def done(_):
+            with self.lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+            for kind, name, job in jobs:
+                if job.exception() is not None:
+                    future.set_exception(job.exception())
+                    return
+                staged[kind][name] = job.result()
+            future.set_result(staged)
+
+        if len(jobs) == 0:
+            future.set_result(staged)
+        for _, _, job in jobs:
+            job.add_done_callback(done)
+        return future
+
+    def wait(self, process, timeout=None):
+        """Return the staged fs of a process, staging it first if needed.
+
+        Raises:
+            Exception: The error of a failed download
+        """
+        return self.stage(process).result(timeout)
+
+    def release(self, processid):
+        """Forget a process; its files stay in the cache."""
+        with self.lock:
+            self.staged.pop(processid, None)
+
+    def stats(self):
+        """Return the number of files downloaded and reused, the bytes downloaded and the dirs staged."""
+        with self.lock:
+            return dict(self.counters)
+
+    def shutdown(self):
+        self.jobs.shutdown(wait=False)
+        self.downloads.shutdown(wait=False)
+
+    def __stage_snapshot(self, name):
+        try:
+            snapshot = self.colonies.get_snapshot_by_name(self.colonyname, name, self.prvkey)
+        except ColoniesNotFoundError:
+            snapshot = self.colonies.get_snapshot_by_id(self.colonyname, name, self.prvkey)
+        path = os.path.join(self.cache_dir, "snapshots", snapshot["snapshotid"])
+        if os.path.isdir(path):
+            with self.lock:
+                self.counters["reused"] += len(snapshot.get("fileids") or [])
+            return path
+        files = []
+        for fileid in snapshot.get("fileids") or []:
+            files.append(self.colonies.get_file(self.colonyname, self.prvkey, fileid=fileid)[0])
+        return self.__link(files, path)
+
+    def __stage_dir(self, label):
+        files = []
+        for filename in self.colonies.get_files(label, self.colonyname, self.prvkey) or []:
+            files.append(self.colonies.get_file(self.colonyname, self.prvkey, label=label, filename=filename)[0])
+        version = hashlib.sha256()
+        for f in sorted(files, key=lambda f: f["name"]):
+            version.update((f["name"] + "\0" + f["checksum"] + "\0").encode("utf-8"))
+        path = os.path.join(self.cache_dir, "dirs", version.hexdigest())
+        if os.path.isdir(path):
+            with self.lock:
+                self.counters["reused"] += len(files)
+            return path
+        return self.__link(files, path)
+
+    def __link(self, files, path):
+        # files are staged flat, so two files with the same basename would overwrite each other
+        names = {}
+        for f in files:
+            name = os.path.basename(f["name"])
+            other = names.setdefault(name, f)
+            if other["fileid"] != f["fileid"]:
+                raise ColoniesError("files " + other["name"] + " and " + f["name"] + " are both staged as " + name)
+        # fetch the contents in parallel, then publish the directory with a rename
+        objects = [(name, self.__object(f)) for name, f in names.items()]
+        tmp = os.path.join(self.cache_dir, "tmp", os.path.basename(path) + "-" + str(threading.get_ident()))
+        os.makedirs(tmp, exist_ok=True)
+        try:
+            for name, future in objects:
+                dst = os.path.join(tmp, name)
+                try:
+                    os.link(future.result(), dst)
+                except OSError:
+                    shutil.copyfile(future.result(), dst)
+            try:
+                os.rename(tmp, path)
+            except OSError:
+                # staged by someone else in the meantime
+                shutil.rmtree(tmp, ignore_errors=True)
+        except BaseException:
+            # e.g. a failed download, do not leave a partial directory behind
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        with self.lock:
+            self.counters["staged"] += 1
+        return path
+
+    def __object(self, f):
+        checksum = f["checksum"]
+        with self.lock:
+            future = self.objects.get(checksum)
+            if future is not None and not (future.done() and future.exception() is not None):
+                self.counters["reused"] += 1
+                return future
+            path = os.path.join(self.cache_dir, "objects", checksum)
+            if os.path.exists(path):
+                future = Future()
+                future.set_result(path)
+                self.counters["reused"] += 1
+            else:
+                future = self.downloads.submit(self.__download, f, path)
+            self.objects[checksum] = future
+            return future
+
+    def __download(self, f, path):
+        data = self.colonies.download_data(self.colonyname, self.prvkey, fileid=f["fileid"])
+        if hashlib.sha256(data).hexdigest() != f["checksum"]:
+            raise ColoniesError("checksum mismatch for file " + f["name"])
+        tmp = path + "." + str(threading.get_ident())
+        with open(tmp, "wb") as out:
+            out.write(data)
+        os.replace(tmp, path)
+        with self.lock:
+            self.counters["downloaded"] += 1
+            self.counters["bytes"] += len(data)
+        return path
+
+class Function:
+    def __init__(self, name, func, max_concurrency=None, timeout=None):
+        self.name = name
+        self.func = func
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.running = 0
+        self.pending = collections.deque()
+
+class Executor:
+    """Assigns processes from a colony and runs them on a pool of worker threads.
+
+    Functions registered with the function() decorator are looked up by the
+    funcname of the assigned process and called with its args, or with the
+    output of its parents if it has any. Processes of other functions are
+    passed to handler(process). The return value becomes the output of the
+    process: None closes it without output, a tuple or list is used as is,
+    and any other value is wrapped in a list. If the function raises, the
+    process is failed with the error message.
+
+    A function can limit how many of its processes run at the same time.
+    Processes over the limit wait in a queue without taking up a worker, so
+    heavy functions cannot starve the pool; when one finishes, its worker
+    takes the next queued process of the same function.
+
+    With a stager, the snapshots and dirs in the fs of each process are
+    staged as soon as it is assigned, and the process runs once they are in
+    place; staged_fs() returns their paths to the function running on the
+    calling thread. With prefetch, that many processes are assigned ahead of
+    free workers, so their data is downloaded while earlier processes run.
+
+    drain() shuts the executor down without stranding processes: it stops
+    assigning new processes, waits up to a grace period for running ones,
+    fails those still running so they can be retried elsewhere, and then
+    unregisters the executor.
+
+    If the client memoizes results, the outputs of the processes it closes
+    are stored with Colonies.store_result.
+
+    Args:
+        colonies: Colonies client
+        colonyname: Name of the colony
+        executorname: Name of the executor
+        executortype: Type of the executor
+        prvkey: Private key of the executor
+        handler: Function handler(process) running processes of functions that
+                 have not been registered
+        colony_prvkey: Private key of the colony owner, needed to register
+                       and unregister the executor
+        workers: Maximum number of processes run at the same time
+        assign_timeout: Seconds each assign call waits for a process
+        grace: Seconds drain() waits for running processes
+        heartbeat_interval: If set, a LeaseManager sends heartbeats for running
+                            processes at this interval
+        max_queued: Maximum number of processes waiting for a function limit;
+                    when reached no more processes are assigned until one of
+                    them starts
+        log_handler: ColoniesLogHandler; records logged while a process runs
+                     go to its log and are flushed before it is closed
+        codec: Codec or codec name used to decode the args and kwargs of
+               registered functions and to encode their outputs. Without it,
+               blobs are passed on as they are, as decoding pickle blobs from
+               whoever can submit processes could run their code.
+        stager: FsStager staging the fs of assigned processes
+        prefetch: Number of processes assigned ahead of free workers
+    """
+
+    def __init__(self, colonies, colonyname, executorname, executortype, prvkey, handler=None, colony_prvkey=None,
+                 workers=1, assign_timeout=10, grace=30, heartbeat_interval=None, max_queued=16,
+                 log_handler=None, codec=None, stager=None, prefetch=0):
+        self.colonies = colonies
+        self.colonyname = colonyname
+        self.executorname = executorname
+        self.executortype = executortype
+        self.prvkey = prvkey
+        self.handler = handler
+        self.colony_prvkey = colony_prvkey
+        self.workers = workers
+        self.assign_timeout = assign_timeout
+        self.grace = grace
+        self.max_queued = max_queued
+        self.log_handler = log_handler
+        self.codec = codec
+        self.stager = stager
+        self.leases = None
+        if heartbeat_interval is not None:
+            self.leases = LeaseManager(colonies, prvkey, interval=heartbeat_interval, on_expired=self.__expire)
+
+        self.functions = {}
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        # prefetched processes wait in the queue of the pool
+        self.slots = threading.Semaphore(workers + prefetch)
+        self.local = threading.local()
+        self.running = {}
+        self.queued = 0
+        self.lock = threading.Condition()
+        self.draining = threading.Event()
+        self.force = threading.Event()
+        self.stopped = threading.Event()
+        self.assign_thread = None
+        self.drain_thread = None
+
+    def register(self):
+        """Add and approve the executor, requires colony_prvkey."""
+        executor = {
+            "executorname": self.executorname,
+            "executorid": Crypto().id(self.prvkey),
+            "colonyname": self.colonyname,
+            "executortype": self.executortype
+        }
+        self.colonies.add_executor(executor, self.colony_prvkey)
+        self.colonies.approve_executor(self.colonyname, self.executorname, self.colony_prvkey)
+
+    def unregister(self):
+        self.colonies.remove_executor(self.colonyname, self.executorname, self.colony_prvkey)
+
+    def function(self, name=None, max_concurrency=None, timeout=None):
+        """Decorator registering a function the executor can run.
+
+        Args:
+            name: Function name, defaults to the name of the decorated function
+            max_concurrency: Maximum number of processes of this function run
+                             at the same time, None for no limit
+            timeout: Seconds after which a running process of this function is
+                     failed, None for no timeout. The worker stays busy until
+                     the function returns, as threads cannot be interrupted.
+        """
+        def decorator(func):
+            funcname = name if name is not None else func.__name__
+            self.functions[funcname] = Function(funcname, func, max_concurrency, timeout)
+            return func
+        return decorator
+
+    def add_functions(self):
+        """Add the registered functions to the executor, skipping those it already has."""
+        added = self.colonies.get_functions_by_executor(self.colonyname, self.executorname, self.prvkey)
+        added = {function["funcname"] for function in added or []}
+        for funcname in self.functions:
+            if funcname not in added:
+                self.colonies.add_function(self.colonyname, self.executorname, funcname, self.prvkey)
+
+    def start(self):
+        """Add the registered functions and start assigning processes in a background thread."""
+        if len(self.functions) > 0:
+            self.add_functions()
+        if self.leases is not None:
+            self.leases.start()
+        self.assign_thread = threading.Thread(target=self.__assign_loop, daemon=True)
+        self.assign_thread.start()
+        return self
+
+    def run(self, signals=(signal.SIGINT, signal.SIGTERM)):
+        """Start the executor and block until it has been drained.
+
+        The first of the given signals drains the executor, a second one cuts
+        the grace period short. Must be called from the main thread if
+        signals are given.
+        """
+        for signum in signals:
+            signal.signal(signum, self.__on_signal)
+        self.start()
+        while not self.stopped.wait(0.5):
+            pass
+
+    def __on_signal(self, signum, frame):
+        if self.drain_thread is None:
+            self.drain_thread = threading.Thread(target=self.drain, daemon=True)
+            self.drain_thread.start()
+        else:
+            self.force.set()
+
+    def __assign_loop(self):
+        while not self.draining.is_set():
+            with self.lock:
+                # bound the processes waiting for a function limit
+                if self.queued >= self.max_queued:
+                    self.lock.wait(0.5)
+                    continue
+            if not self.slots.acquire(timeout=0.5):
+                continue
+            try:
+                process = self.colonies.assign(self.colonyname, self.assign_timeout, self.prvkey)
+            except (ColoniesNotFoundError, ColoniesTimeoutError):
+                self.slots.release()
+                continue
+            except ColoniesAuthError:
+                # the executor has been removed or rejected
+                self.slots.release()
+                self.draining.set()
+                break
+            except ColoniesConnectionError:
+                self.slots.release()
+                self.draining.wait(1)
+                continue
+
+            if self.leases is not None:
+                self.leases.track(process)
+            if self.stager is not None:
+                self.stager.stage(process)
+            function = self.functions.get(process.spec.funcname)
+            with self.lock:
+                self.running[process.processid] = process
+                if function is not None and function.max_concurrency is not None \
+                        and function.running >= function.max_concurrency:
+                    function.pending.append(process)
+                    self.queued += 1
+                    self.slots.release()
+                    continue
+                if function is not None:
+                    function.running += 1
+            self.pool.submit(self.__work, process, function)
+
+    def __work(self, process, function):
+        try:
+            while process is not None:
+                self.__execute(process, function)
+                if function is None:
+                    break
+                with self.lock:
+                    function.running -= 1
+                    process = None
+                    while len(function.pending) > 0 and process is None:
+                        process = function.pending.popleft()
+                        self.queued -= 1
+                        if process.processid not in self.running:
+                            # failed by drain while queued
+                            process = None
+                    if process is not None:
+                        function.running += 1
+                    self.lock.notify_all()
+        finally:
+            self.slots.release()
+
+    def staged_fs(self):
+        """Return the staged fs of the process running on the calling thread, see FsStager.stage."""
+        return getattr(self.local, "staged", None)
+
+    def __execute(self, process, function):
+        timer = None
+        try:
+            with self.lock:
+                if process.processid not in self.running:
+                    # failed by drain while prefetched
+                    return
+            log = contextlib.nullcontext()
+            if self.log_handler is not None:
+                log = self.log_handler.process(process.processid)
+            try:
+                with log:
+                    if self.stager is not None:
+                        self.local.staged = self.stager.wait(process)
+                    if function is not None:
+                        if function.timeout is not None:
+                            timer = threading.Timer(function.timeout, self.__timeout, (process, function))
+                            timer.daemon = True
+                            timer.start()
+                        args = process.input if process.input is not None and len(process.input) > 0 else process.spec.args
+                        kwargs = process.spec.kwargs or {}
+                        codecs = [self.codec] if self.codec is not None else None
+                        output = function.func(*decode_values(args, codecs), **decode_kwargs(kwargs, codecs))
+                        if self.codec is not None and output is not None:
+                            output = encode_values(output if isinstance(output, (list, tuple)) else [output],
+                                                   self.codec)
+                    elif self.handler is not None:
+                        output = self.handler(process)
+                    else:
+                        raise Exception("function " + process.spec.funcname + " is not registered")
+            except Exception as err:
+                if self.__finish(process.processid):
+                    self.colonies.fail(process.processid, [str(err)], self.prvkey)
+                return
+
+            if output is None:
+                output = []
+            elif isinstance(output, tuple):
+                output = list(output)
+            elif not isinstance(output, list):
+                output = [output]
+            if self.__finish(process.processid):
+                try:
+                    self.colonies.close(process.processid, output, self.prvkey,
+                                        colonyname=process.spec.conditions.colonyname)
+                except Exception as err:
+                    # e.g. an output that cannot be serialized or offloaded,
+                    # the process is no longer tracked, so fail it now
+                    self.colonies.fail(process.processid, [str(err)], self.prvkey)
+                    return
+                if self.colonies.memo is not None:
+                    self.colonies.store_result(process, output, self.prvkey)
+        except ColoniesConnectionError:
+            pass
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if self.stager is not None:
+                self.local.staged = None
+                self.stager.release(process.processid)
+            if self.leases is not None:
+                self.leases.release(process.processid)
+
+    def __timeout(self, process, function):
+        if self.__finish(process.processid):
+            try:
+                self.colonies.fail(process.processid,
+                                   [function.name + " timed out after " + str(function.timeout) + " seconds"],
+                                   self.prvkey)
+            except ColoniesConnectionError:
+                pass
+
+    def __expire(self, processid):
+        # drop the process from running, so its worker does not close it and drain does not report it
+        if self.__finish(processid):
+            self.colonies.fail(processid, ["lease expired"], self.prvkey)
+
+    def __finish(self, processid):
+        # returns False if drain or a timeout has already failed the process
+        with self.lock:
+            finished = self.running.pop(processid, None) is not None
+            self.lock.notify_all()
+            return finished
+
+    def drain(self, grace=None):
+        """Stop assigning, wait for running processes, fail the rest and unregister.
+
+        A process assigned by an assign call that was in flight when the drain
+        started is run like the others, and so are processes queued behind a
+        function limit.
+
+        Args:
+            grace: Seconds to wait for running processes, defaults to the grace
+                   given to the constructor
+
+        Returns:
+            The ids of the processes that were failed because they did not
+            finish in time
+        """
+        if grace is None:
+            grace = self.grace
+        deadline = time.monotonic() + grace
+        self.draining.set()
+        if self.assign_thread is not None:
+            self.assign_thread.join()
+
+        with self.lock:
+            while len(self.running) > 0 and not self.force.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.lock.wait(min(remaining, 0.1))
+            stranded = list(self.running)
+            self.running.clear()
+        for processid in stranded:
+            try:
+                self.colonies.fail(processid, ["executor " + self.executorname + " shut down"], self.prvkey)
+            except ColoniesConnectionError:
+                pass
+
+        self.pool.shutdown(wait=False)
+        if self.leases is not None:
+            self.leases.stop()
+        if self.colony_prvkey is not None:
+            try:
+                self.unregister()
+            except ColoniesConnectionError:
+                pass
+        self.stopped.set()
+        return stranded
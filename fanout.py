@@ -0,0 +1,399 @@
+import collections
+import itertools
+import queue
+import statistics
+import threading
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+
+from errors import ColoniesConnectionError, ColoniesNotFoundError, ColoniesProcessError, ColoniesTimeoutError
+from model import Process, Workflow
+from pycolonies import Colonies, FuncSpecTemplate
+
+def chunks(iterable, chunksize):
+    """Split an iterable into lists of at most chunksize items, lazily."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunksize))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+def wait_finished(colonies, process, timeout, prvkey, cancelled=None):
+    """Wait for a process to succeed or fail and return it.
+
+    Args:
+        cancelled: threading.Event, waiting stops soon after it is set
+
+    Raises:
+        ColoniesTimeoutError: The process did not finish within timeout
+                              seconds, or waiting was cancelled
+    """
+    process = colonies.wait(process, timeout, prvkey, cancelled)
+    if process.state in (Colonies.SUCCESSFUL, Colonies.FAILED):
+        return process
+    if cancelled is not None and cancelled.is_set():
+        raise ColoniesTimeoutError("waiting for process " + process.processid + " was cancelled")
+    raise ColoniesTimeoutError("process " + process.processid + " did not finish within " + str(timeout) + " seconds")
+
+def wait_output(colonies, process, timeout, prvkey, cancelled=None):
+    """Wait for a process and return its output.
+
+    Args:
+        cancelled: threading.Event, waiting stops soon after it is set
+
+    Raises:
+        ColoniesProcessError: The process failed
+        ColoniesTimeoutError: The process did not finish within timeout seconds
+    """
+    process = wait_finished(colonies, process, timeout, prvkey, cancelled)
+    if process.state == Colonies.FAILED:
+        raise ColoniesProcessError(process)
+    return process.output or []
+
+def map(colonies, func, iterable, colonyname, executortype, prvkey, chunksize=1, max_inflight=32, ordered=True,
+        timeout=3600, **kwargs):
+    """Run a function over the items of an iterable, one process per chunk of items.
+
+    Each process is called with the items of its chunk as args and should
+    return one output per item. At most max_inflight processes are submitted
+    but not yet finished at any time, and the iterable is consumed lazily.
+    If a process fails or the generator is closed early, the unfinished
+    processes are removed.
+
+    Args:
+        colonies: Colonies client
+        func: Function, or name of a function registered by the executors
+        iterable: Items to map
+        colonyname: Name of the colony
+        executortype: Type of the executors running the function
+        prvkey: Private key for authentication
+        chunksize: Number of items per process
+        max_inflight: Maximum number of unfinished processes
+        ordered: If True, outputs are yielded in input order, otherwise as
+                 soon as their process finishes
+        timeout: Seconds to wait for each process
+        **kwargs: Passed on to func_spec, e.g. maxexectime or maxretries
+
+    Yields:
+        The outputs of the processes
+
+    Raises:
+        ColoniesProcessError: A process failed
+    """
+    template = FuncSpecTemplate(func, colonyname, executortype, **kwargs)
+    cancelled = threading.Event()
+    lock = threading.Lock()
+    unfinished = set()
+
+    def remove(processids):
+        for processid in processids:
+            try:
+                colonies.remove_process(processid, prvkey)
+            except ColoniesConnectionError:
+                pass
+
+    def run(chunk):
+        process = colonies.submit_func_spec(template.dump(chunk), prvkey)
+        with lock:
+            orphan = cancelled.is_set()
+            if not orphan:
+                unfinished.add(process.processid)
+        if orphan:
+            # submitted after map was left
+            remove([process.processid])
+            raise ColoniesTimeoutError("map was cancelled")
+        try:
+            outputs = wait_output(colonies, process, timeout, prvkey, cancelled)
+        except ColoniesProcessError:
+            with lock:
+                unfinished.discard(process.processid)
+            raise
+        # a process that timed out stays in unfinished and is removed
+        with lock:
+            unfinished.discard(process.processid)
+        return outputs
+
+    def next_outputs(pending):
+        if ordered:
+            future = pending.popleft()
+        else:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            future = done.pop()
+            pending.remove(future)
+        return future.result()
+
+    pool = ThreadPoolExecutor(max_workers=max_inflight)
+    try:
+        pending = collections.deque()
+        for chunk in chunks(iterable, chunksize):
+            if len(pending) >= max_inflight:
+                yield from next_outputs(pending)
+            pending.append(pool.submit(run, chunk))
+        while len(pending) > 0:
+            yield from next_outputs(pending)
+    finally:
+        with lock:
+            cancelled.set()
+            leftover = list(unfinished)
+        pool.shutdown(wait=False, cancel_futures=True)
+        remove(leftover)
+
+def map_reduce(colonies, mapper, reducer, iterable, colonyname, executortype, prvkey, chunksize=1, max_inflight=32,
+               timeout=3600, on_partial=None, **kwargs):
+    """Map chunks of an iterable and reduce the outputs, as one workflow.
+
+    The mappers and a reducer depending on all of them are submitted as a
+    single workflow, so the reducer is started by the server as soon as the
+    last mapper has finished and gets their outputs as input. To bound the
+    number of processes in flight, at most max_inflight mappers are
+    submitted per workflow. If the input needs more, the workflows are run
+    one after the other and their results are combined by one more reducer
+    process, so the reducer must then be associative.
+
+    Args:
+        colonies: Colonies client
+        mapper: Function called with the items of a chunk as args
+        reducer: Function called with the outputs of the mappers as args
+        iterable: Items to map
+        colonyname: Name of the colony
+        executortype: Type of the executors running the functions
+        prvkey: Private key for authentication
+        chunksize: Number of items per mapper process
+        max_inflight: Maximum number of mapper processes per workflow
+        timeout: Seconds to wait for each process
+        on_partial: Function on_partial(index, output) called with the output
+                    of each mapper as soon as it finishes, index being the
+                    position of its chunk
+        **kwargs: Passed on to func_spec, e.g. maxexectime or maxretries
+
+    Returns:
+        The output of the reducer, unwrapped if it is a single value
+
+    Raises:
+        ColoniesProcessError: A process failed
+    """
+    map_template = FuncSpecTemplate(mapper, colonyname, executortype, **kwargs)
+    reduce_template = FuncSpecTemplate(reducer, colonyname, executortype, **kwargs)
+    cancelled = threading.Event()
+
+    def run_mapper(processid):
+        process = colonies.get_process(processid, prvkey)
+        if len(process.spec.conditions.dependencies) > 0:
+            # the reducer, waited for once all mappers are done
+            return None, process
+        index = int(process.spec.nodename.rsplit("-", 1)[1])
+        return index, wait_output(colonies, process, timeout, prvkey, cancelled)
+
+    def unwrap(output):
+        return output[0] if len(output) == 1 else output
+
+    results = []
+    offset = 0
+    pool = ThreadPoolExecutor(max_workers=max_inflight)
+    try:
+        wave_chunks = chunks(iterable, chunksize)
+        while True:
+            wave = list(itertools.islice(wave_chunks, max_inflight))
+            if len(wave) == 0:
+                break
+
+            workflow = Workflow(colonyname=colonyname)
+            for i, chunk in enumerate(wave):
+                spec = map_template.spec(chunk)
+                spec.nodename = spec.funcname + "-" + str(offset + i)
+                workflow.functionspecs.append(spec)
+            reduce_spec = reduce_template.spec([])
+            reduce_spec.nodename = reduce_spec.funcname + "-reduce-" + str(len(results))
+            reduce_spec.conditions.dependencies = [spec.nodename for spec in workflow.functionspecs]
+            workflow.functionspecs.append(reduce_spec)
+            graph = colonies.submit_workflow(workflow, prvkey)
+
+            reduce_process = None
+            try:
+                for future in as_completed([pool.submit(run_mapper, processid) for processid in graph.processids]):
+                    index, output = future.result()
+                    if index is None:
+                        reduce_process = output
+                    elif on_partial is not None:
+                        on_partial(index, output)
+            except ColoniesProcessError:
+                # the reducer would wait for the failed mapper forever
+                try:
+                    colonies.remove_processgraph(graph.processgraphid, prvkey)
+                except ColoniesConnectionError:
+                    pass
+                raise
+
+            results.append(unwrap(wait_output(colonies, reduce_process, timeout, prvkey)))
+            offset += len(wave)
+    finally:
+        cancelled.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if len(results) == 0:
+        return None
+    if len(results) == 1:
+        return results[0]
+
+    process = colonies.submit_func_spec(reduce_template.dump(results), prvkey)
+    return unwrap(wait_output(colonies, process, timeout, prvkey))
+
+def speculate(colonies, processes, prvkey, quantile=0.9, slowdown=1.5, max_copies=1, timeout=3600, poll_interval=1.0):
+    """Wait for independent processes, running copies of the stragglers.
+
+    Once the given quantile of the processes has finished, a process that
+    has been running for more than slowdown times the median run time of
+    the finished ones, going by starttime and endtime, gets a copy
+    submitted with its spec. The first copy of a process to finish
+    successfully is used, and the others are removed with remove_process.
+    Processes that are still waiting are not copied, as a copy would wait
+    in the same queue.
+
+    Finished processes are received from one subscribe_processes stream per
+    colony and executor type. Every poll_interval the waiting and running
+    processes of each colony are listed, two calls per colony however many
+    processes there are, to find the stragglers. A process missing from
+    both lists twice in a row without an event, e.g. because it finished
+    before the stream was connected, is read with get_process.
+
+    Only use this for processes whose function can safely run twice, and
+    not for processes of a workflow, whose copies would not get the
+    outputs of their parents.
+
+    Args:
+        colonies: Colonies client
+        processes: Submitted processes
+        prvkey: Private key for authentication
+        quantile: Fraction of the processes that has to be finished before
+                  stragglers are copied
+        slowdown: How many times longer than the median a process has to
+                  run to count as a straggler
+        max_copies: Maximum number of copies per process
+        timeout: Seconds to wait for all processes
+        poll_interval: Seconds between listings of the unfinished processes
+
+    Returns:
+        The successful processes in the order of processes, each either
+        the original or one of its copies
+
+    Raises:
+        ColoniesProcessError: All copies of a process failed
+        ColoniesTimeoutError: The processes did not finish within timeout seconds
+    """
+    deadline = time.monotonic() + timeout
+    finished = queue.Queue()
+    copies = [[process] for process in processes]
+    owners = {process.processid: index for index, process in enumerate(processes)}
+    done = set()
+    failed_copies = [0] * len(processes)
+    missing = {}
+    results = [None] * len(processes)
+    durations = []
+    remaining = [len(processes)]
+
+    def pump(subscription):
+        for process in subscription:
+            finished.put(process)
+
+    def remove(process):
+        try:
+            colonies.remove_process(process.processid, prvkey)
+        except ColoniesConnectionError:
+            pass
+
+    def handle(process):
+        index = owners.get(process.processid)
+        if index is None or process.processid in done or \
+                process.state not in (Colonies.SUCCESSFUL, Colonies.FAILED):
+            return
+        done.add(process.processid)
+        missing.pop(process.processid, None)
+        if results[index] is not None:
+            return
+        if process.state == Colonies.SUCCESSFUL:
+            results[index] = process
+            remaining[0] -= 1
+            durations.append((process.endtime - process.starttime).total_seconds())
+            for other in copies[index]:
+                if other.processid not in done:
+                    remove(other)
+        else:
+            failed_copies[index] += 1
+            if failed_copies[index] == len(copies[index]):
+                raise ColoniesProcessError(process)
+
+    def poll():
+        unfinished = [process for group in copies for process in group
+                      if process.processid not in done and results[owners[process.processid]] is None]
+        running = {}
+        listed = set()
+        for colonyname in {process.spec.conditions.colonyname for process in unfinished}:
+            for state in (Colonies.WAITING, Colonies.RUNNING):
+                for entry in colonies.list_processes(colonyname, len(unfinished) + 100, state, prvkey) or []:
+                    if entry["processid"] in owners:
+                        listed.add(entry["processid"])
+                        if state == Colonies.RUNNING:
+                            running[entry["processid"]] = entry
+        for process in unfinished:
+            if process.processid in listed:
+                missing.pop(process.processid, None)
+                continue
+            missing[process.processid] = missing.get(process.processid, 0) + 1
+            if missing[process.processid] >= 2:
+                try:
+                    handle(colonies.get_process(process.processid, prvkey))
+                except ColoniesNotFoundError:
+                    pass
+        return running
+
+    def copy_stragglers(running):
+        threshold = slowdown * statistics.median(durations)
+        now = datetime.now(timezone.utc)
+        for index, group in enumerate(copies):
+            if results[index] is not None or len(group) > max_copies:
+                continue
+            entry = running.get(group[-1].processid)
+            if entry is None:
+                continue
+            latest = Process(**entry)
+            if (now - latest.starttime).total_seconds() <= threshold:
+                continue
+            process = colonies.submit_func_spec(latest.spec, prvkey)
+            owners[process.processid] = index
+            group.append(process)
+
+    subscriptions = []
+    try:
+        for colonyname, executortype in {(process.spec.conditions.colonyname, process.spec.conditions.executortype)
+                                         for process in processes}:
+            subscription = colonies.subscribe_processes(colonyname, prvkey, executortype=executortype,
+                                                        states=[Colonies.SUCCESSFUL, Colonies.FAILED],
+                                                        filter=lambda process: process.processid in owners)
+            subscriptions.append(subscription)
+            threading.Thread(target=pump, args=(subscription,), daemon=True).start()
+
+        polled = time.monotonic()
+        while remaining[0] > 0:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise ColoniesTimeoutError(str(remaining[0]) + " processes did not finish within " + str(timeout) +
+                                           " seconds")
+            try:
+                handle(finished.get(timeout=min(poll_interval, left)))
+                while remaining[0] > 0:
+                    handle(finished.get_nowait())
+            except queue.Empty:
+                pass
+
+            if remaining[0] > 0 and time.monotonic() - polled >= poll_interval:
+                polled = time.monotonic()
+                running = poll()
+                if remaining[0] > 0 and len(durations) > 0 and \
+                        len(processes) - remaining[0] >= quantile * len(processes):
+                    copy_stragglers(running)
+    finally:
+        for subscription in subscriptions:
+            subscription.close()
+    return results
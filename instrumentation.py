@@ -0,0 +1,192 @@
+import bisect
+import threading
+
+try:
+    from opentelemetry import metrics as otel_metrics
+except ImportError:
+    otel_metrics = None
+
+PHASES = ("serialize", "sign", "wait", "network", "parse", "total")
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RPCEvent:
+    """Timings and sizes of one RPC call, passed to the hooks registered with Colonies.add_rpc_hook.
+
+    Pre hooks get the event before the request is sent, with the serialize and
+    sign timings and the request size filled in. Post hooks get it when the
+    call has completed or failed.
+
+    Attributes:
+        msgtype: RPC message type, e.g. "submitfuncspecmsg"
+        request_size: Size of the HTTP request body in bytes
+        response_size: Size of the HTTP response body in bytes, 0 if no response was received
+        status_code: HTTP status code, None if no response was received
+        serialize: Seconds spent encoding the message and the envelope
+        sign: Seconds spent signing the payload
+        wait: Seconds spent in the pre hooks, e.g. waiting for a rate limiter
+        network: Seconds from sending the request until the response was
+                 received, not counting the pre hooks
+        parse: Seconds spent decoding the response
+        error: The exception the call raises, or None
+    """
+
+    def __init__(self, msgtype, request_size, serialize, sign):
+        self.msgtype = msgtype
+        self.request_size = request_size
+        self.response_size = 0
+        self.status_code = None
+        self.serialize = serialize
+        self.sign = sign
+        self.wait = 0.0
+        self.network = 0.0
+        self.parse = 0.0
+        self.error = None
+
+    @property
+    def total(self):
+        return self.serialize + self.sign + self.wait + self.network + self.parse
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate the q-quantile by linear interpolation within the matching bucket."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n > 0:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+class RPCMetrics:
+    """Post hook collecting latency histograms per msgtype and phase.
+
+    Usage:
+        metrics = RPCMetrics()
+        colonies.add_rpc_hook(post=metrics)
+        ...
+        print(metrics.prometheus())
+
+    Args:
+        buckets: Upper bounds of the histogram buckets in seconds
+        prefix: Prefix of the exported metric names
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix="pycolonies_rpc"):
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.errors = {}
+            self.request_bytes = {}
+            self.response_bytes = {}
+
+    def __call__(self, event):
+        with self.lock:
+            for phase in PHASES:
+                key = (event.msgtype, phase)
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = Histogram(self.buckets)
+                    self.histograms[key] = histogram
+                histogram.observe(getattr(event, phase))
+            self.request_bytes[event.msgtype] = self.request_bytes.get(event.msgtype, 0) + event.request_size
+            self.response_bytes[event.msgtype] = self.response_bytes.get(event.msgtype, 0) + event.response_size
+            if event.error is not None:
+                self.errors[event.msgtype] = self.errors.get(event.msgtype, 0) + 1
+
+    def quantile(self, msgtype, phase, q):
+        """Return the estimated q-quantile in seconds of a phase, or None if no calls were recorded.
+
+        Args:
+            msgtype: RPC message type
+            phase: "serialize", "sign", "wait", "network", "parse" or "total"
+            q: Quantile between 0 and 1, e.g. 0.99
+        """
+        with self.lock:
+            histogram = self.histograms.get((msgtype, phase))
+            return None if histogram is None else histogram.quantile(q)
+
+    def summary(self):
+        """Return {msgtype: {"count", "errors", phase: mean seconds, ...}} for all recorded calls."""
+        summary = {}
+        with self.lock:
+            for (msgtype, phase), histogram in self.histograms.items():
+                entry = summary.setdefault(msgtype, {"count": histogram.count, "errors": self.errors.get(msgtype, 0)})
+                entry[phase] = histogram.sum / histogram.count
+        return summary
+
+    def prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        name = self.prefix + "_duration_seconds"
+        lines = [
+            "# HELP " + name + " Time spent in each phase of an RPC call.",
+            "# TYPE " + name + " histogram"
+        ]
+        with self.lock:
+            for (msgtype, phase), histogram in sorted(self.histograms.items()):
+                labels = 'msgtype="' + msgtype + '",phase="' + phase + '"'
+                cumulative = 0
+                for bound, n in zip(self.buckets, histogram.counts):
+                    cumulative += n
+                    lines.append(name + "_bucket{" + labels + ',le="' + repr(bound) + '"} ' + str(cumulative))
+                lines.append(name + "_bucket{" + labels + ',le="+Inf"} ' + str(histogram.count))
+                lines.append(name + "_sum{" + labels + "} " + repr(histogram.sum))
+                lines.append(name + "_count{" + labels + "} " + str(histogram.count))
+
+            for metric, help, values in (("errors_total", "Number of failed RPC calls.", self.errors),
+                                         ("request_bytes_total", "Bytes sent in RPC requests.", self.request_bytes),
+                                         ("response_bytes_total", "Bytes received in RPC responses.", self.response_bytes)):
+                lines.append("# HELP " + self.prefix + "_" + metric + " " + help)
+                lines.append("# TYPE " + self.prefix + "_" + metric + " counter")
+                for msgtype, value in sorted(values.items()):
+                    lines.append(self.prefix + "_" + metric + '{msgtype="' + msgtype + '"} ' + str(value))
+        return "\n".join(lines) + "\n"
+
+class OpenTelemetryHook:
+    """Post hook recording RPC metrics with the OpenTelemetry metrics API.
+
+    Requires the opentelemetry-api package; exporting is configured through
+    the application's MeterProvider as usual.
+
+    Args:
+        meter: Meter to create the instruments with, defaults to the global "pycolonies" meter
+    """
+
+    def __init__(self, meter=None):
+        if otel_metrics is None:
+            raise ImportError("opentelemetry-api is not installed")
+        if meter is None:
+            meter = otel_metrics.get_meter("pycolonies")
+        self.duration = meter.create_histogram("pycolonies.rpc.duration", unit="s",
+                                               description="Time spent in each phase of an RPC call")
+        self.request_size = meter.create_histogram("pycolonies.rpc.request.size", unit="By",
+                                                   description="Size of RPC requests")
+        self.errors = meter.create_counter("pycolonies.rpc.errors", description="Number of failed RPC calls")
+
+    def __call__(self, event):
+        for phase in PHASES:
+            self.duration.record(getattr(event, phase), {"msgtype": event.msgtype, "phase": phase})
+        self.request_size.record(event.request_size, {"msgtype": event.msgtype})
+        if event.error is not None:
+            self.errors.add(1, {"msgtype": event.msgtype})
@@ -0,0 +1,202 @@
+import collections
+import contextlib
+import logging
+import threading
+import time
+
+from errors import ColoniesConnectionError
+
+class ColoniesLogHandler(logging.Handler):
+    """Logging handler shipping records to the process log in batches.
+
+    Records are buffered per process and a background thread sends each
+    buffer as a single add_log call, joining the lines with newlines, once
+    it holds batch_size lines or every flush_interval seconds. Messages are
+    split so that no add_log call carries more than max_bytes of UTF-8, and
+    a longer line is sent as several messages.
+
+    A record is logged to the process given by its processid attribute
+    (logger.info(..., extra={"processid": ...})), the process bound to the
+    current thread with process(), or the processid given to the
+    constructor, in that order. Records without a process are ignored.
+
+    When more than half of max_buffered lines are waiting, only one in
+    sample_ratio records below WARNING is kept, and when max_buffered is
+    reached they are all dropped. Warnings and errors are always kept. The
+    number of dropped lines is appended to the next batch of the process.
+
+    Args:
+        colonies: Colonies client
+        prvkey: Private key of the executor
+        processid: Process records are logged to by default
+        level: Minimum level of the records to ship
+        flush_interval: Maximum seconds a line is buffered
+        batch_size: Number of buffered lines of a process that triggers a flush
+        max_bytes: Maximum size of one log message in bytes
+        max_buffered: Maximum number of buffered lines over all processes
+        sample_ratio: Keep one in this many records under load
+    """
+
+    def __init__(self, colonies, prvkey, processid=None, level=logging.NOTSET, flush_interval=1.0, batch_size=100,
+                 max_bytes=65536, max_buffered=10000, sample_ratio=10):
+        super().__init__(level)
+        self.colonies = colonies
+        self.prvkey = prvkey
+        self.processid = processid
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.max_buffered = max_buffered
+        self.sample_ratio = sample_ratio
+        self.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+
+        self.buffers = {}
+        self.buffered = 0
+        self.dropped = collections.Counter()
+        self.sampled = 0
+        self.full = set()
+        self.local = threading.local()
+        self.cond = threading.Condition()
+        self.send_lock = threading.Lock()
+        self.closed = False
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    @contextlib.contextmanager
+    def process(self, processid):
+        """Log the records of the current thread to a process, flushing them on exit.
+
+        Exit the context before closing the process, so its log is complete
+        when the process finishes.
+        """
+        previous = getattr(self.local, "processid", None)
+        self.local.processid = processid
+        try:
+            yield self
+        finally:
+            self.local.processid = previous
+            self.__flush([processid])
+
+    def emit(self, record):
+        processid = getattr(record, "processid", None)
+        if processid is None:
+            processid = getattr(self.local, "processid", None)
+        if processid is None:
+            processid = self.processid
+        if processid is None:
+            return
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        with self.cond:
+            if self.closed:
+                return
+            if not self.__admit(record):
+                self.dropped[processid] += 1
+                return
+            buffer = self.buffers.setdefault(processid, [])
+            buffer.append(line)
+            self.buffered += 1
+            if len(buffer) >= self.batch_size:
+                self.full.add(processid)
+                self.cond.notify()
+
+    def __admit(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        if self.buffered >= self.max_buffered:
+            return False
+        if self.buffered >= self.max_buffered // 2:
+            self.sampled += 1
+            return self.sampled % self.sample_ratio == 0
+        return True
+
+    def flush(self, processid=None):
+        """Send the buffered lines of a process, or of all processes, now."""
+        self.__flush(None if processid is None else [processid])
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+        self.__flush(None)
+        super().close()
+
+    def __take(self, processid):
+        lines = self.buffers.pop(processid, [])
+        self.buffered -= len(lines)
+        dropped = self.dropped.pop(processid, 0)
+        if dropped > 0:
+            lines.append(str(dropped) + " log lines dropped")
+
+        messages = []
+        message = None
+        size = 0
+        for line in lines:
+            for part in self.__split(line):
+                part_size = len(part.encode("utf-8"))
+                if message is not None and size + part_size + 1 <= self.max_bytes:
+                    message += "\n" + part
+                    size += part_size + 1
+                else:
+                    if message is not None:
+                        messages.append(message)
+                    message = part
+                    size = part_size
+        if message is not None:
+            messages.append(message)
+        return messages
+
+    def __split(self, line):
+        """Split a line into parts of at most max_bytes UTF-8 bytes, not cutting characters."""
+        data = line.encode("utf-8")
+        parts = []
+        while len(data) > self.max_bytes:
+            cut = self.max_bytes
+            # back up to the start of a multi-byte character
+            while cut > 0 and data[cut] & 0xC0 == 0x80:
+                cut -= 1
+            if cut == 0:
+                cut = self.max_bytes
+            parts.append(data[:cut].decode("utf-8", errors="replace"))
+            data = data[cut:]
+        parts.append(data.decode("utf-8", errors="replace"))
+        return parts
+
+    def __flush(self, processids):
+        # the send lock keeps the batches of a process in order when the
+        # background thread and a caller flush at the same time
+        with self.send_lock:
+            with self.cond:
+                if processids is None:
+                    processids = set(self.buffers) | set(self.dropped)
+                batches = [(processid, self.__take(processid)) for processid in processids]
+                self.full.difference_update(processids)
+            for processid, messages in batches:
+                for message in messages:
+                    try:
+                        self.colonies.add_log(processid, message, self.prvkey)
+                    except ColoniesConnectionError:
+                        # the process is gone or the server is unreachable,
+                        # logging must not fail the caller
+                        pass
+
+    def __run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            with self.cond:
+                while not self.closed and len(self.full) == 0 and time.monotonic() < next_flush:
+                    self.cond.wait(next_flush - time.monotonic())
+                if self.closed:
+                    return
+                if time.monotonic() >= next_flush:
+                    processids = None
+                    next_flush = time.monotonic() + self.flush_interval
+                else:
+                    processids = list(self.full)
+            self.__flush(processids)
@@ -0,0 +1,194 @@
+import base64
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# maximum number of submitted processes whose result is waited for
+MAX_PENDING = 10000
+
+@functools.lru_cache(maxsize=1024)
+def code_digest(code_base64):
+    return hashlib.sha256(base64.b64decode(code_base64)).hexdigest()
+
+def canonical_hash(obj):
+    data = json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def spec_key(spec):
+    """Return the SHA-256 of the function identity and inputs of a serialized spec.
+
+    The key covers the function name, the executor type, the code, the
+    args and kwargs, the environment and the filesystem, and does not
+    depend on dict ordering or on whether the code was sent inline or by
+    hash.
+    """
+    env = dict(spec.get("env") or {})
+    code = env.pop("code_sha256", None)
+    inline = env.pop("code", None)
+    if code is None and inline:
+        code = code_digest(inline)
+    return canonical_hash({
+        "funcname": spec.get("funcname"),
+        "executortype": spec["conditions"].get("executortype"),
+        "code": code,
+        "args": spec.get("args") or [],
+        "kwargs": spec.get("kwargs") or {},
+        "env": env,
+        "fs": spec.get("fs") or {},
+    })
+
+def workflow_key(workflow):
+    """Return the SHA-256 of the nodes and dependencies of a serialized workflow."""
+    return canonical_hash([[spec_key(spec), spec.get("nodename"), spec["conditions"].get("dependencies") or []]
+                           for spec in workflow["functionspecs"]])
+
+class ResultCache:
+    """Memoization settings, local cache and hit counters of a client.
+
+    Results are stored through the file API, so they are shared by all
+    clients of a colony, and the most recently used ones are also kept in
+    memory. Only memoize functions whose output depends on nothing but their
+    code and inputs.
+
+    Args:
+        ttl: Seconds a stored result is used for
+        label: File label the results are stored under
+        funcnames: Names of the functions to memoize, None memoizes all
+        max_entries: Maximum number of results kept in memory
+    """
+
+    def __init__(self, ttl=3600, label="/.pycolonies/memo", funcnames=None, max_entries=1024):
+        self.ttl = ttl
+        self.label = label
+        self.funcnames = set(funcnames) if funcnames is not None else None
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        # processid -> (time submitted, colonyname, path) of submitted processes whose result is not stored yet
+        self.pending = OrderedDict()
+        # (colonyname, path) -> (time submitted, process) of the same
+        self.inflight = {}
+        # processids of processes returned from the cache
+        self.served = set()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.lock = threading.Lock()
+
+    def enabled(self, spec):
+        return self.funcnames is None or spec.get("funcname") in self.funcnames
+
+    def path(self, spec):
+        """Return the path, relative to label, the result of a serialized spec is stored under.
+
+        The function name is a directory of its own, so the results of one
+        function are found without matching on names.
+        """
+        return "functions/" + spec.get("funcname") + "/" + spec_key(spec)
+
+    def workflow_path(self, workflow):
+        """Return the path, relative to label, the process graph of a serialized workflow is stored under."""
+        return "workflows/" + workflow_key(workflow)
+
+    def get(self, colonyname, path):
+        with self.lock:
+            entry = self.entries.get((colonyname, path))
+            if entry is None:
+                return None
+            if time.time() - entry["stored"] > self.ttl:
+                del self.entries[(colonyname, path)]
+                return None
+            self.entries.move_to_end((colonyname, path))
+            return entry
+
+    def put(self, colonyname, path, entry):
+        if time.time() - entry["stored"] > self.ttl:
+            return
+        with self.lock:
+            self.entries[(colonyname, path)] = entry
+            self.entries.move_to_end((colonyname, path))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def remove(self, colonyname, path=None, funcname=None, workflows=False):
+        with self.lock:
+            for key in list(self.entries):
+                if key[0] != colonyname or (path is not None and key[1] != path):
+                    continue
+                directory = key[1].rsplit("/", 1)[0]
+                if funcname is not None and directory != "functions/" + funcname:
+                    continue
+                if workflows and directory != "workflows":
+                    continue
+                del self.entries[key]
+
+    def submitted(self, colonyname, path, process):
+        now = time.time()
+        with self.lock:
+            # forget processes nobody read back within ttl, e.g. fire-and-forget submissions
+            while len(self.pending) > 0:
+                processid, (stored, key_colonyname, key_path) = next(iter(self.pending.items()))
+                if now - stored <= self.ttl and len(self.pending) < MAX_PENDING:
+                    break
+                del self.pending[processid]
+                entry = self.inflight.get((key_colonyname, key_path))
+                if entry is not None and entry[1].processid == processid:
+                    del self.inflight[(key_colonyname, key_path)]
+            self.pending[process.processid] = (now, colonyname, path)
+            self.inflight[(colonyname, path)] = (now, process)
+
+    def running(self, colonyname, path):
+        """Return the process already submitted for a result that is not stored yet, or None."""
+        with self.lock:
+            entry = self.inflight.get((colonyname, path))
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl:
+                del self.inflight[(colonyname, path)]
+                return None
+            return entry[1]
+
+    def finished(self, processid):
+        """Forget a submitted process, returning (colonyname, path) if its result should be stored."""
+        with self.lock:
+            entry = self.pending.pop(processid, None)
+            if entry is None:
+                return None
+            key = entry[1:]
+            if key in self.inflight and self.inflight[key][1].processid == processid:
+                del self.inflight[key]
+            return key
+
+    def serve(self, processid):
+        with self.lock:
+            if len(self.served) >= 10000:
+                self.served.clear()
+            self.served.add(processid)
+
+    def is_served(self, processid):
+        with self.lock:
+            return processid in self.served
+
+    def count(self, hit=False, coalesced=False):
+        with self.lock:
+            if coalesced:
+                self.coalesced += 1
+            elif hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @property
+    def hit_rate(self):
+        with self.lock:
+            total = self.hits + self.coalesced + self.misses
+            return (self.hits + self.coalesced) / total if total > 0 else 0.0
+
+    def stats(self):
+        """Return the hit counters and the number of results kept in memory."""
+        hit_rate = self.hit_rate
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "hit_rate": hit_rate,
+                    "entries": len(self.entries)}
@@ -0,0 +1,1424 @@
+#!/usr/bin/env python3
+"""
+In-process stand-in for a Colonies server.
+
+Speaks the signed RPC envelope on /api and the WebSocket protocol on /pubsub,
+and keeps colonies, executors, processes, workflows, channels, logs, files,
+snapshots and blueprints in memory. An S3 compatible object store runs on a
+second port so upload_file/download_file work unchanged.
+
+Signature recovery is slow in pure Python, so the caller id is only recovered
+for assign and add_log, where it selects the executor type and names the log
+source. Create the server with authenticate=True to recover and check it for
+every message.
+
+Usage:
+    with MockColoniesServer() as server:
+        server.set_s3_env()
+        client = server.client()
+        ...
+
+or standalone: python3 mockserver.py --port 50080 --s3-port 9000
+"""
+
+import argparse
+import base64
+import bisect
+import hashlib
+import itertools
+import os
+import queue
+import secrets
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from crypto import Crypto
+from serializer import get_serializer
+
+WAITING = 0
+RUNNING = 1
+SUCCESSFUL = 2
+FAILED = 3
+
+ZERO_TIME = "0001-01-01T00:00:00Z"
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Messages whose outcome depends on who sent them. The caller id is always
+# recovered for these, and for every message when authenticate=True.
+IDENTITY_MSGTYPES = {"assignprocessmsg", "addlogmsg"}
+
+def timestamp(t=None):
+    if t is None:
+        t = time.time()
+    return datetime.fromtimestamp(t, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+def generate_id():
+    return secrets.token_hex(32)
+
+class RPCError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+CLOSED = object()
+
+class Listener:
+    def __init__(self, match):
+        self.match = match
+        self.events = queue.Queue()
+
+def ws_accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+
+def ws_unmask(data, mask):
+    n = len(data)
+    key = (mask * (n // 4 + 1))[:n]
+    return (int.from_bytes(data, "big") ^ int.from_bytes(key, "big")).to_bytes(n, "big")
+
+def ws_read_frame(rfile):
+    header = rfile.read(2)
+    if len(header) < 2:
+        raise ConnectionError("connection closed")
+    opcode = header[0] & 0x0f
+    masked = header[1] & 0x80
+    length = header[1] & 0x7f
+    if length == 126:
+        length = struct.unpack("!H", rfile.read(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", rfile.read(8))[0]
+    mask = rfile.read(4) if masked else None
+    data = rfile.read(length)
+    if mask is not None and length > 0:
+        data = ws_unmask(data, mask)
+    return opcode, data
+
+def ws_write_frame(wfile, data, opcode=0x1):
+    n = len(data)
+    if n < 126:
+        header = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    wfile.write(header + data)
+    wfile.flush()
+
+class MockColoniesServer:
+    def __init__(self, host="127.0.0.1", port=0, s3_port=0, authenticate=False, native_crypto=False):
+        self.host = host
+        self.authenticate = authenticate
+        self.crypto = Crypto(native=native_crypto)
+        self.serializer = get_serializer()
+        self.lock = threading.Condition()
+        self.seq = itertools.count()
+        self.last_log_timestamp = 0
+
+        self.colonies = {}
+        self.executors = {}
+        self.users = {}
+        self.functions = {}
+        self.processes = {}
+        self.queues = {}
+        self.running = {}
+        self.processgraphs = {}
+        self.attributes = {}
+        self.logs = []
+        self.channels = {}
+        self.files = {}
+        self.snapshots = {}
+        self.crons = {}
+        self.generators = {}
+        self.blueprint_definitions = {}
+        self.blueprints = {}
+        self.blueprint_history = {}
+        self.listeners = set()
+
+        self.buckets = {}
+        self.s3_lock = threading.Lock()
+
+        self.handlers = {
+            "addcolonymsg": self.__add_colony,
+            "removecolonymsg": self.__remove_colony,
+            "getcoloniesmsg": self.__get_colonies,
+            "getcolonymsg": self.__get_colony,
+            "getcolonystatsmsg": self.__get_colony_stats,
+            "addexecutormsg": self.__add_executor,
+            "approveexecutormsg": self.__approve_executor,
+            "rejectexecutormsg": self.__reject_executor,
+            "removeexecutormsg": self.__remove_executor,
+            "getexecutorsmsg": self.__get_executors,
+            "getexecutormsg": self.__get_executor,
+            "addusermsg": self.__add_user,
+            "getusersmsg": self.__get_users,
+            "removeusermsg": self.__remove_user,
+            "addfunctionmsg": self.__add_function,
+            "getfunctionsmsg": self.__get_functions,
+            "submitfuncspecmsg": self.__submit_funcspec,
+            "submitworkflowspecmsg": self.__submit_workflow,
+            "assignprocessmsg": self.__assign,
+            "getprocessmsg": self.__get_process,
+            "getprocessesmsg": self.__get_processes,
+            "removeprocessmsg": self.__remove_process,
+            "removeallprocessesmsg": self.__remove_all_processes,
+            "closesuccessfulmsg": self.__close_successful,
+            "closefailedmsg": self.__close_failed,
+            "setoutputmsg": self.__set_output,
+            "getprocessgraphmsg": self.__get_processgraph,
+            "getprocessgraphsmsg": self.__get_processgraphs,
+            "removeprocessgraphmsg": self.__remove_processgraph,
+            "removeallprocessgraphsmsg": self.__remove_all_processgraphs,
+            "addattributemsg": self.__add_attribute,
+            "getattributemsg": self.__get_attribute,
+            "addlogmsg": self.__add_log,
+            "getlogsmsg": self.__get_logs,
+            "channelappendmsg": self.__channel_append,
+            "channelreadmsg": self.__channel_read,
+            "addfilemsg": self.__add_file,
+            "getfilemsg": self.__get_file,
+            "getfilesmsg": self.__get_files,
+            "getfilelabelsmsg": self.__get_file_labels,
+            "removefilemsg": self.__remove_file,
+            "createsnapshotmsg": self.__create_snapshot,
+            "getsnapshotsmsg": self.__get_snapshots,
+            "getsnapshotmsg": self.__get_snapshot,
+            "addcronmsg": self.__add_cron,
+            "getcronmsg": self.__get_cron,
+            "getcronsmsg": self.__get_crons,
+            "removecronmsg": self.__remove_cron,
+            "runcronmsg": self.__run_cron,
+            "addgeneratormsg": self.__add_generator,
+            "getgeneratormsg": self.__get_generator,
+            "getgeneratorsmsg": self.__get_generators,
+            "removegeneratormsg": self.__remove_generator,
+            "addblueprintdefinitionmsg": self.__add_blueprint_definition,
+            "getblueprintdefinitionmsg": self.__get_blueprint_definition,
+            "getblueprintdefinitionsmsg": self.__get_blueprint_definitions,
+            "removeblueprintdefinitionmsg": self.__remove_blueprint_definition,
+            "addblueprintmsg": self.__add_blueprint,
+            "getblueprintmsg": self.__get_blueprint,
+            "getblueprintsmsg": self.__get_blueprints,
+            "updateblueprintmsg": self.__update_blueprint,
+            "updateblueprintstatusmsg": self.__update_blueprint_status,
+            "reconcileblueprintmsg": self.__reconcile_blueprint,
+            "getblueprinthistorymsg": self.__get_blueprint_history,
+            "removeblueprintmsg": self.__remove_blueprint,
+        }
+
+        self.api_server = ThreadingHTTPServer((host, port), self.__api_handler_class())
+        self.api_server.daemon_threads = True
+        self.s3_server = ThreadingHTTPServer((host, s3_port), self.__s3_handler_class())
+        self.s3_server.daemon_threads = True
+        self.port = self.api_server.server_address[1]
+        self.s3_port = self.s3_server.server_address[1]
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def start(self):
+        for target, args in ((self.api_server.serve_forever, (0.05,)), (self.s3_server.serve_forever, (0.05,)), (self.__reaper, ())):
+            t = threading.Thread(target=target, args=args, daemon=True)
+            t.start()
+            self.threads.append(t)
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.api_server.shutdown()
+        self.s3_server.shutdown()
+        self.api_server.server_close()
+        self.s3_server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def client(self, **kwargs):
+        """Return a Colonies client connected to this server."""
+        from pycolonies import Colonies
+        return Colonies(self.host, self.port, tls=False, **kwargs)
+
+    def s3_env(self, bucket="colonies"):
+        """Return the AWS_S3_* environment variables pointing at the S3 stand-in."""
+        return {
+            "AWS_S3_ENDPOINT": self.host + ":" + str(self.s3_port),
+            "AWS_S3_ACCESSKEY": "mock",
+            "AWS_S3_SECRETKEY": "mock",
+            "AWS_S3_REGION": "us-east-1",
+            "AWS_S3_TLS": "false",
+            "AWS_S3_SKIPVERIFY": "false",
+            "AWS_S3_BUCKET": bucket,
+        }
+
+    def set_s3_env(self, bucket="colonies"):
+        os.environ.update(self.s3_env(bucket))
+
+    # RPC transport
+
+    def __handle_rpc(self, body):
+        try:
+            rpc = self.serializer.loads(body)
+            msg = self.serializer.loads(base64.b64decode(rpc["payload"]))
+            msgtype = msg.get("msgtype", rpc.get("payloadtype"))
+            handler = self.handlers.get(msgtype)
+            if handler is None:
+                raise RPCError(400, "unsupported message type: " + str(msgtype))
+            caller = self.__caller(rpc, msgtype)
+            result = handler(msg, caller)
+            return 200, self.__reply(msgtype, result, False)
+        except RPCError as err:
+            return err.status, self.__reply("error", {"status": err.status, "message": err.message}, True)
+        except Exception as err:
+            return 400, self.__reply("error", {"status": 400, "message": str(err)}, True)
+
+    def __reply(self, payloadtype, payload, error):
+        return self.serializer.dumps({
+            "payloadtype": payloadtype,
+            "payload": base64.b64encode(self.serializer.dumps(payload)).decode("ascii"),
+            "error": error
+        })
+
+    def __caller(self, rpc, msgtype):
+        if not self.authenticate and msgtype not in IDENTITY_MSGTYPES:
+            return None
+        try:
+            return self.crypto.recoverid(rpc["payload"], rpc["signature"])
+        except Exception:
+            raise RPCError(403, "invalid signature")
+
+    def __api_handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                status, reply = server._MockColoniesServer__handle_rpc(body)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def do_GET(self):
+                if self.headers.get("Upgrade", "").lower() != "websocket":
+                    self.send_error(400)
+                    return
+                self.send_response(101)
+                self.send_header("Upgrade", "websocket")
+                self.send_header("Connection", "Upgrade")
+                self.send_header("Sec-WebSocket-Accept", ws_accept_key(self.headers["Sec-WebSocket-Key"]))
+                self.end_headers()
+                self.wfile.flush()
+                self.close_connection = True
+                try:
+                    server._MockColoniesServer__handle_pubsub(self.rfile, self.wfile)
+                except (ConnectionError, OSError):
+                    pass
+
+        return Handler
+
+    # Pubsub
+
+    def __handle_pubsub(self, rfile, wfile):
+        while True:
+            opcode, data = ws_read_frame(rfile)
+            if opcode == 0x8:
+                return
+            if opcode == 0x9:
+                ws_write_frame(wfile, data, opcode=0xa)
+                continue
+            if opcode in (0x1, 0x2):
+                break
+
+        rpc = self.serializer.loads(data)
+        msg = self.serializer.loads(base64.b64decode(rpc["payload"]))
+        write_lock = threading.Lock()
+
+        def write(data, opcode=0x1):
+            with write_lock:
+                ws_write_frame(wfile, data, opcode)
+
+        def send(payload, error=False):
+            write(self.__reply(msg["msgtype"], payload, error))
+
+        # Keep reading while the subscription waits for events, so a client
+        # closing the socket ends the subscription instead of waiting for the
+        # next event or the timeout.
+        listener = Listener(None)
+
+        def read():
+            try:
+                while True:
+                    opcode, data = ws_read_frame(rfile)
+                    if opcode == 0x8:
+                        break
+                    if opcode == 0x9:
+                        write(data, opcode=0xa)
+            except (ConnectionError, OSError, struct.error):
+                pass
+            listener.events.put(CLOSED)
+
+        threading.Thread(target=read, daemon=True).start()
+
+        if not isinstance(msg.get("timeout", 0), int):
+            # the server unmarshals the timeout into an int
+            send({"status": 400, "message": "timeout must be an integer"}, True)
+        elif msg["msgtype"] == "subscribeprocessmsg":
+            self.__subscribe_process(msg, listener, send)
+        elif msg["msgtype"] == "subscribeprocessesmsg":
+            self.__subscribe_processes(msg, listener, send)
+        elif msg["msgtype"] == "subscribechannelmsg":
+            self.__subscribe_channel(msg, listener, send)
+        else:
+            send({"status": 400, "message": "unsupported message type: " + msg["msgtype"]}, True)
+        write(b"", opcode=0x8)
+
+    def __add_listener(self, listener, match):
+        listener.match = match
+        with self.lock:
+            self.listeners.add(listener)
+
+    def __remove_listener(self, listener):
+        with self.lock:
+            self.listeners.discard(listener)
+
+    def __notify(self, kind, obj):
+        if kind == "process":
+            obj = dict(obj)
+        for listener in list(self.listeners):
+            if listener.match(kind, obj):
+                listener.events.put(obj)
+
+    def __subscribe_process(self, msg, listener, send):
+        processid = msg["processid"]
+        state = msg["state"]
+        self.__add_listener(listener, lambda kind, p: kind == "process" and p["processid"] == processid and p["state"] == state)
+        try:
+            with self.lock:
+                process = self.processes.get(processid)
+                if process is None:
+                    send({"status": 404, "message": "process not found"}, True)
+                    return
+                if process["state"] == state:
+                    send(process)
+                    return
+            try:
+                event = listener.events.get(timeout=max(msg.get("timeout", 0), 0))
+                if event is not CLOSED:
+                    send(event)
+            except queue.Empty:
+                send({"status": 408, "message": "timeout"}, True)
+        finally:
+            self.__remove_listener(listener)
+
+    def __subscribe_processes(self, msg, listener, send):
+        colonyname = msg.get("colonyname", "")
+        executortype = msg.get("executortype", "")
+        state = msg["state"]
+
+        def match(kind, p):
+            if kind != "process" or p["state"] != state:
+                return False
+            conditions = p["spec"]["conditions"]
+            if colonyname != "" and conditions.get("colonyname") != colonyname:
+                return False
+            return executortype == "" or conditions.get("executortype") == executortype
+
+        self.__add_listener(listener, match)
+        deadline = time.monotonic() + msg.get("timeout", 0)
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    send({"status": 408, "message": "timeout"}, True)
+                    return
+                try:
+                    event = listener.events.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                if event is CLOSED:
+                    return
+                send(event)
+        finally:
+            self.__remove_listener(listener)
+
+    def __subscribe_channel(self, msg, listener, send):
+        key = (msg["processid"], msg["name"])
+        afterseq = msg.get("afterseq", 0)
+        self.__add_listener(listener, lambda kind, e: kind == "channel" and e[0] == key)
+        deadline = time.monotonic() + msg.get("timeout", 0)
+        try:
+            with self.lock:
+                entries = [e for e in self.channels.get(key, []) if e["sequence"] > afterseq]
+            if len(entries) > 0:
+                send(entries)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    send([])
+                    return
+                try:
+                    event = listener.events.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                if event is CLOSED:
+                    return
+                if event[1]["sequence"] > afterseq:
+                    send([event[1]])
+        finally:
+            self.__remove_listener(listener)
+
+    # Colonies and executors
+
+    def __add_colony(self, msg, caller):
+        colony = dict(msg["colony"])
+        with self.lock:
+            if colony["name"] in self.colonies:
+                raise RPCError(409, "colony with name " + colony["name"] + " already exists")
+            self.colonies[colony["name"]] = colony
+        return colony
+
+    def __remove_colony(self, msg, caller):
+        colonyname = msg["colonyname"]
+        with self.lock:
+            if self.colonies.pop(colonyname, None) is None:
+                raise RPCError(404, "colony not found")
+            for key in [k for k in self.executors if k[0] == colonyname]:
+                del self.executors[key]
+            for processid in [p["processid"] for p in self.processes.values() if p["spec"]["conditions"].get("colonyname") == colonyname]:
+                self.__delete_process(processid)
+            for graphid in [g["processgraphid"] for g in self.processgraphs.values() if g["colonyname"] == colonyname]:
+                del self.processgraphs[graphid]
+            for key in [k for k in self.files if k[0] == colonyname]:
+                del self.files[key]
+            self.logs = [log for log in self.logs if log["colonyname"] != colonyname]
+        return None
+
+    def __get_colonies(self, msg, caller):
+        with self.lock:
+            return list(self.colonies.values())
+
+    def __get_colony(self, msg, caller):
+        with self.lock:
+            colony = self.colonies.get(msg["colonyname"])
+        if colony is None:
+            raise RPCError(404, "colony not found")
+        return colony
+
+    def __get_colony_stats(self, msg, caller):
+        colonyname = msg["colonyname"]
+        counts = [0, 0, 0, 0]
+        graph_counts = [0, 0, 0, 0]
+        with self.lock:
+            for p in self.processes.values():
+                if p["spec"]["conditions"].get("colonyname") == colonyname:
+                    counts[p["state"]] += 1
+            for g in self.processgraphs.values():
+                if g["colonyname"] == colonyname:
+                    graph_counts[g["state"]] += 1
+            executors = len([k for k in self.executors if k[0] == colonyname])
+        return {
+            "executors": executors,
+            "waitingprocesses": counts[WAITING],
+            "runningprocesses": counts[RUNNING],
+            "successfulprocesses": counts[SUCCESSFUL],
+            "failedprocesses": counts[FAILED],
+            "waitingworkflows": graph_counts[WAITING],
+            "runningworkflows": graph_counts[RUNNING],
+            "successfulworkflows": graph_counts[SUCCESSFUL],
+            "failedworkflows": graph_counts[FAILED]
+        }
+
+    def __add_executor(self, msg, caller):
+        executor = dict(msg["executor"])
+        executor.setdefault("state", 0)
+        executor["commissiontime"] = timestamp()
+        executor["lastheardfromtime"] = timestamp()
+        key = (executor["colonyname"], executor["executorname"])
+        with self.lock:
+            if key in self.executors:
+                raise RPCError(409, "executor with name " + executor["executorname"] + " already exists")
+            self.executors[key] = executor
+        return executor
+
+    def __find_executor(self, colonyname, executorname):
+        executor = self.executors.get((colonyname, executorname))
+        if executor is None:
+            raise RPCError(404, "executor not found")
+        return executor
+
+    def __approve_executor(self, msg, caller):
+        with self.lock:
+            self.__find_executor(msg["colonyname"], msg["executorname"])["state"] = 1
+        return None
+
+    def __reject_executor(self, msg, caller):
+        with self.lock:
+            self.__find_executor(msg["colonyname"], msg["executorname"])["state"] = 2
+        return None
+
+    def __remove_executor(self, msg, caller):
+        with self.lock:
+            self.__find_executor(msg["colonyname"], msg["executorname"])
+            del self.executors[(msg["colonyname"], msg["executorname"])]
+        return None
+
+    def __get_executors(self, msg, caller):
+        with self.lock:
+            return [e for k, e in self.executors.items() if k[0] == msg["colonyname"]]
+
+    def __get_executor(self, msg, caller):
+        with self.lock:
+            return self.__find_executor(msg["colonyname"], msg["executorname"])
+
+    def __caller_executor(self, caller):
+        if caller is None:
+            return None
+        for executor in self.executors.values():
+            if executor["executorid"] == caller:
+                return executor
+        return None
+
+    def __add_user(self, msg, caller):
+        user = dict(msg["user"])
+        key = (user["colonyname"], user["name"])
+        with self.lock:
+            if key in self.users:
+                raise RPCError(409, "user with name " + user["name"] + " already exists")
+            self.users[key] = user
+        return user
+
+    def __get_users(self, msg, caller):
+        with self.lock:
+            return [u for k, u in self.users.items() if k[0] == msg["colonyname"]]
+
+    def __remove_user(self, msg, caller):
+        with self.lock:
+            if self.users.pop((msg["colonyname"], msg["name"]), None) is None:
+                raise RPCError(404, "user not found")
+        return None
+
+    def __add_function(self, msg, caller):
+        fun = dict(msg["fun"])
+        fun["functionid"] = hashlib.sha256((fun["colonyname"] + fun["executorname"] + fun["funcname"]).encode("utf-8")).hexdigest()
+        with self.lock:
+            self.functions[fun["functionid"]] = fun
+        return fun
+
+    def __get_functions(self, msg, caller):
+        executorname = msg.get("executorname")
+        with self.lock:
+            return [f for f in self.functions.values()
+                    if f["colonyname"] == msg["colonyname"] and (executorname is None or f["executorname"] == executorname)]
+
+    # Processes
+
+    def __create_process(self, spec, caller):
+        now = time.time()
+        spec = dict(spec)
+        spec.setdefault("conditions", {})
+        process = {
+            "processid": generate_id(),
+            "initiatorid": caller or "",
+            "initiatorname": "",
+            "assignedexecutorid": "",
+            "isassigned": False,
+            "state": WAITING,
+            "prioritytime": int(now * 1e9) - spec.get("priority", 0) * 60 * 1000000000,
+            "submissiontime": timestamp(now),
+            "starttime": ZERO_TIME,
+            "endtime": ZERO_TIME,
+            "waitdeadline": ZERO_TIME,
+            "execdeadline": ZERO_TIME,
+            "retries": 0,
+            "attributes": [],
+            "spec": spec,
+            "waitforparents": False,
+            "parents": [],
+            "children": [],
+            "processgraphid": "",
+            "in": [],
+            "out": [],
+            "errors": []
+        }
+        if spec.get("maxwaittime", 0) > 0:
+            process["waitdeadline"] = timestamp(now + spec["maxwaittime"])
+        return process
+
+    def __enqueue(self, process):
+        colonyname = process["spec"]["conditions"].get("colonyname", "")
+        entry = (process["prioritytime"], next(self.seq), process["processid"])
+        bisect.insort(self.queues.setdefault(colonyname, []), entry)
+        self.lock.notify_all()
+
+    def __set_state(self, process, state):
+        process["state"] = state
+        self.__notify("process", process)
+        if process["processgraphid"] != "":
+            self.__update_processgraph(process["processgraphid"])
+        self.lock.notify_all()
+
+    def __submit_funcspec(self, msg, caller):
+        process = self.__create_process(msg["spec"], caller)
+        with self.lock:
+            self.processes[process["processid"]] = process
+            self.__enqueue(process)
+            self.__notify("process", process)
+        return process
+
+    def __submit_workflow(self, msg, caller):
+        spec = msg["spec"]
+        colonyname = spec["colonyname"]
+        now = timestamp()
+        processes = []
+        by_name = {}
+        for funcspec in spec.get("functionspecs", []):
+            process = self.__create_process(funcspec, caller)
+            processes.append(process)
+            by_name[funcspec.get("nodename", "")] = process
+
+        graphid = generate_id()
+        roots = []
+        for process in processes:
+            process["processgraphid"] = graphid
+            for dependency in process["spec"]["conditions"].get("dependencies") or []:
+                parent = by_name.get(dependency)
+                if parent is None:
+                    raise RPCError(400, "unknown dependency: " + dependency)
+                process["parents"].append(parent["processid"])
+                parent["children"].append(process["processid"])
+            if len(process["parents"]) > 0:
+                process["waitforparents"] = True
+            else:
+                roots.append(process["processid"])
+
+        graph = {
+            "processgraphid": graphid,
+            "initiatorid": caller or "",
+            "initiatorname": "",
+            "colonyname": colonyname,
+            "rootprocessids": roots,
+            "state": WAITING,
+            "submissiontime": now,
+            "starttime": ZERO_TIME,
+            "endtime": ZERO_TIME,
+            "processids": [p["processid"] for p in processes],
+            "nodes": [],
+            "edges": []
+        }
+
+        with self.lock:
+            self.processgraphs[graphid] = graph
+            for process in processes:
+                self.processes[process["processid"]] = process
+                self.__enqueue(process)
+                self.__notify("process", process)
+        return graph
+
+    def __assignable(self, process, executor):
+        if process["state"] != WAITING or process["waitforparents"]:
+            return False
+        if executor is None:
+            return True
+        conditions = process["spec"]["conditions"]
+        if conditions.get("executortype", "") != executor["executortype"]:
+            return False
+        executornames = conditions.get("executornames")
+        return not executornames or executor["executorname"] in executornames
+
+    def __assign(self, msg, caller):
+        colonyname = msg["colonyname"]
+        deadline = time.monotonic() + msg.get("timeout", 0)
+        with self.lock:
+            executor = self.__caller_executor(caller)
+            while True:
+                entries = self.queues.get(colonyname, [])
+                for i, entry in enumerate(entries):
+                    process = self.processes.get(entry[2])
+                    if process is None or process["state"] != WAITING:
+                        continue
+                    if self.__assignable(process, executor):
+                        del entries[i]
+                        return self.__start(process, caller)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RPCError(404, "failed to assign process, no process available")
+                self.lock.wait(remaining)
+
+    def __start(self, process, caller):
+        now = time.time()
+        process["isassigned"] = True
+        process["assignedexecutorid"] = caller or ""
+        process["starttime"] = timestamp(now)
+        maxexectime = process["spec"].get("maxexectime", 0)
+        if maxexectime > 0:
+            process["execdeadline"] = timestamp(now + maxexectime)
+            self.running[process["processid"]] = now + maxexectime
+        self.__set_state(process, RUNNING)
+        return process
+
+    def __find_process(self, processid):
+        process = self.processes.get(processid)
+        if process is None:
+            raise RPCError(404, "process with id " + processid + " not found")
+        return process
+
+    def __get_process(self, msg, caller):
+        with self.lock:
+            return self.__find_process(msg["processid"])
+
+    def __get_processes(self, msg, caller):
+        colonyname = msg["colonyname"]
+        state = msg.get("state", -1)
+        graphid = msg.get("processgraphid", "")
+        with self.lock:
+            processes = [p for p in self.processes.values()
+                         if p["spec"]["conditions"].get("colonyname") == colonyname
+                         and (state == -1 or p["state"] == state)
+                         and (graphid == "" or p["processgraphid"] == graphid)]
+        return processes[:msg.get("count", len(processes))]
+
+    def __delete_process(self, processid):
+        process = self.processes.pop(processid, None)
+        self.running.pop(processid, None)
+        return process
+
+    def __remove_process(self, msg, caller):
+        with self.lock:
+            self.__find_process(msg["processid"])
+            self.__delete_process(msg["processid"])
+        return None
+
+    def __remove_all_processes(self, msg, caller):
+        state = msg.get("state", -1)
+        with self.lock:
+            for p in list(self.processes.values()):
+                if p["spec"]["conditions"].get("colonyname") == msg["colonyname"] and (state == -1 or p["state"] == state):
+                    self.__delete_process(p["processid"])
+        return None
+
+    def __finish(self, process, state):
+        process["endtime"] = timestamp()
+        self.running.pop(process["processid"], None)
+        self.__set_state(process, state)
+        if state == SUCCESSFUL:
+            for childid in process["children"]:
+                child = self.processes.get(childid)
+                if child is None:
+                    continue
+                parents = [self.processes.get(parentid) for parentid in child["parents"]]
+                if all(parent is not None and parent["state"] == SUCCESSFUL for parent in parents):
+                    child["in"] = [value for parent in parents for value in parent["out"]]
+                    child["waitforparents"] = False
+                    self.lock.notify_all()
+
+    def __close_successful(self, msg, caller):
+        with self.lock:
+            process = self.__find_process(msg["processid"])
+            if process["state"] != RUNNING:
+                raise RPCError(400, "process is not running")
+            process["out"] = msg.get("out") or []
+            self.__finish(process, SUCCESSFUL)
+        return None
+
+    def __close_failed(self, msg, caller):
+        with self.lock:
+            process = self.__find_process(msg["processid"])
+            if process["state"] != RUNNING:
+                raise RPCError(400, "process is not running")
+            process["errors"] = msg.get("errors") or []
+            self.__finish(process, FAILED)
+        return None
+
+    def __set_output(self, msg, caller):
+        with self.lock:
+            process = self.__find_process(msg["processid"])
+            process["out"] = msg.get("out") or []
+        return None
+
+    def __reaper(self):
+        while not self.stopped.wait(0.1):
+            now = time.time()
+            with self.lock:
+                for processid, deadline in list(self.running.items()):
+                    if deadline > now:
+                        continue
+                    process = self.processes[processid]
+                    if process["retries"] < process["spec"].get("maxretries", 0):
+                        del self.running[processid]
+                        process["retries"] += 1
+                        process["isassigned"] = False
+                        process["assignedexecutorid"] = ""
+                        process["execdeadline"] = ZERO_TIME
+                        self.__set_state(process, WAITING)
+                        self.__enqueue(process)
+                    else:
+                        process["errors"] = ["process exceeded max exec time"]
+                        self.__finish(process, FAILED)
+
+    # Process graphs
+
+    def __update_processgraph(self, graphid):
+        graph = self.processgraphs.get(graphid)
+        if graph is None:
+            return
+        states = [self.processes[i]["state"] for i in graph["processids"] if i in self.processes]
+        if FAILED in states:
+            state = FAILED
+        elif all(s == SUCCESSFUL for s in states):
+            state = SUCCESSFUL
+        elif any(s != WAITING for s in states):
+            state = RUNNING
+        else:
+            state = WAITING
+        if state != WAITING and graph["starttime"] == ZERO_TIME:
+            graph["starttime"] = timestamp()
+        if state in (SUCCESSFUL, FAILED) and graph["endtime"] == ZERO_TIME:
+            graph["endtime"] = timestamp()
+        graph["state"] = state
+
+    def __get_processgraph(self, msg, caller):
+        with self.lock:
+            graph = self.processgraphs.get(msg["processgraphid"])
+        if graph is None:
+            raise RPCError(404, "process graph not found")
+        return graph
+
+    def __get_processgraphs(self, msg, caller):
+        state = msg.get("state")
+        with self.lock:
+            graphs = [g for g in self.processgraphs.values()
+                      if g["colonyname"] == msg["colonyname"] and (state is None or g["state"] == state)]
+        return graphs[:msg.get("count", len(graphs))]
+
+    def __remove_processgraph(self, msg, caller):
+        with self.lock:
+            graph = self.processgraphs.pop(msg["processgraphid"], None)
+            if graph is None:
+                raise RPCError(404, "process graph not found")
+            for processid in graph["processids"]:
+                self.__delete_process(processid)
+        return None
+
+    def __remove_all_processgraphs(self, msg, caller):
+        state = msg.get("state")
+        with self.lock:
+            for graph in list(self.processgraphs.values()):
+                if graph["colonyname"] == msg["colonyname"] and (state is None or graph["state"] == state):
+                    del self.processgraphs[graph["processgraphid"]]
+                    for processid in graph["processids"]:
+                        self.__delete_process(processid)
+        return None
+
+    # Attributes and logs
+
+    def __add_attribute(self, msg, caller):
+        attribute = dict(msg["attribute"])
+        attribute["attributeid"] = hashlib.sha256((attribute["targetid"] + attribute["key"] + str(attribute["attributetype"])).encode("utf-8")).hexdigest()
+        with self.lock:
+            process = self.__find_process(attribute["targetid"])
+            if attribute["attributeid"] in self.attributes:
+                raise RPCError(409, "attribute already exists")
+            self.attributes[attribute["attributeid"]] = attribute
+            process["attributes"].append(attribute)
+        return attribute
+
+    def __get_attribute(self, msg, caller):
+        with self.lock:
+            attribute = self.attributes.get(msg["attributeid"])
+        if attribute is None:
+            raise RPCError(404, "attribute not found")
+        return attribute
+
+    def __add_log(self, msg, caller):
+        with self.lock:
+            process = self.__find_process(msg["processid"])
+            executor = self.__caller_executor(caller)
+            ts = max(time.time_ns(), self.last_log_timestamp + 1)
+            self.last_log_timestamp = ts
+            log = {
+                "processid": process["processid"],
+                "colonyname": process["spec"]["conditions"].get("colonyname", ""),
+                "executorname": executor["executorname"] if executor is not None else "",
+                "message": msg["message"],
+                "timestamp": ts
+            }
+            self.logs.append(log)
+            self.__notify("log", log)
+        return None
+
+    def __get_logs(self, msg, caller):
+        processid = msg.get("processid", "")
+        executorname = msg.get("executorname", "")
+        since = msg.get("since", 0)
+        count = msg.get("count", 100)
+        with self.lock:
+            i = bisect.bisect_right([log["timestamp"] for log in self.logs], since)
+            logs = []
+            for log in self.logs[i:]:
+                if log["colonyname"] != msg["colonyname"]:
+                    continue
+                if processid != "" and log["processid"] != processid:
+                    continue
+                if processid == "" and log["executorname"] != executorname:
+                    continue
+                logs.append(log)
+                if len(logs) >= count:
+                    break
+        return logs
+
+    # Channels
+
+    def __channel_append(self, msg, caller):
+        key = (msg["processid"], msg["name"])
+        with self.lock:
+            process = self.__find_process(msg["processid"])
+            if msg["name"] not in (process["spec"].get("channels") or []):
+                raise RPCError(404, "channel " + msg["name"] + " not found")
+            payload = msg.get("payload") or []
+            if isinstance(payload, list):
+                payload = bytes(payload)
+            else:
+                payload = base64.b64decode(payload)
+            entry = {
+                "sequence": msg["sequence"],
+                "inreplyto": msg.get("inreplyto", 0),
+                "timestamp": timestamp(),
+                "senderid": caller or "",
+                "payload": base64.b64encode(payload).decode("ascii"),
+                "type": msg.get("payloadtype", "")
+            }
+            self.channels.setdefault(key, []).append(entry)
+            self.__notify("channel", (key, entry))
+        return None
+
+    def __channel_read(self, msg, caller):
+        key = (msg["processid"], msg["name"])
+        with self.lock:
+            process = self.__find_process(msg["processid"])
+            if msg["name"] not in (process["spec"].get("channels") or []):
+                raise RPCError(404, "channel " + msg["name"] + " not found")
+            entries = [e for e in self.channels.get(key, []) if e["sequence"] > msg.get("afterseq", 0)]
+        limit = msg.get("limit", 0)
+        if limit > 0:
+            entries = entries[:limit]
+        return entries
+
+    # Files and snapshots
+
+    def __add_file(self, msg, caller):
+        f = dict(msg["file"])
+        f["fileid"] = generate_id()
+        f["added"] = timestamp()
+        key = (f["colonyname"], f["label"], f["name"])
+        with self.lock:
+            revisions = self.files.setdefault(key, [])
+            f["sequencenr"] = len(revisions) + 1
+            revisions.append(f)
+        return f
+
+    def __find_files(self, msg):
+        colonyname = msg["colonyname"]
+        fileid = msg.get("fileid")
+        if fileid:
+            for key, revisions in self.files.items():
+                for f in revisions:
+                    if f["fileid"] == fileid and key[0] == colonyname:
+                        return key, [f]
+            return None, []
+        key = (colonyname, msg.get("label"), msg.get("name"))
+        return key, self.files.get(key, [])
+
+    def __get_file(self, msg, caller):
+        with self.lock:
+            _, revisions = self.__find_files(msg)
+            if len(revisions) == 0:
+                raise RPCError(404, "file not found")
+            if msg.get("latest", True):
+                return [revisions[-1]]
+            return list(revisions)
+
+    def __get_files(self, msg, caller):
+        with self.lock:
+            return sorted(set(key[2] for key in self.files if key[0] == msg["colonyname"] and key[1] == msg["label"]))
+
+    def __get_file_labels(self, msg, caller):
+        name = msg.get("name", "")
+        exact = msg.get("exact", False)
+        labels = {}
+        with self.lock:
+            for key in self.files:
+                if key[0] != msg["colonyname"]:
+                    continue
+                if name != "" and ((exact and key[1] != name) or (not exact and not key[1].startswith(name))):
+                    continue
+                labels[key[1]] = labels.get(key[1], 0) + 1
+        return [{"name": label, "files": count} for label, count in sorted(labels.items())]
+
+    def __remove_file(self, msg, caller):
+        with self.lock:
+            key, revisions = self.__find_files(msg)
+            if len(revisions) == 0:
+                raise RPCError(404, "file not found")
+            if msg.get("fileid"):
+                self.files[key] = [f for f in self.files[key] if f["fileid"] != msg["fileid"]]
+                if len(self.files[key]) == 0:
+                    del self.files[key]
+            else:
+                del self.files[key]
+        return None
+
+    def __create_snapshot(self, msg, caller):
+        colonyname = msg["colonyname"]
+        label = msg["label"]
+        with self.lock:
+            fileids = [revisions[-1]["fileid"] for key, revisions in sorted(self.files.items())
+                       if key[0] == colonyname and key[1] == label]
+            snapshot = {
+                "snapshotid": generate_id(),
+                "colonyname": colonyname,
+                "label": label,
+                "name": msg["name"],
+                "fileids": fileids,
+                "added": timestamp()
+            }
+            self.snapshots[snapshot["snapshotid"]] = snapshot
+        return snapshot
+
+    def __get_snapshots(self, msg, caller):
+        with self.lock:
+            return [s for s in self.snapshots.values() if s["colonyname"] == msg["colonyname"]]
+
+    def __get_snapshot(self, msg, caller):
+        with self.lock:
+            for s in self.snapshots.values():
+                if s["colonyname"] != msg["colonyname"]:
+                    continue
+                if (msg.get("snapshotid") and s["snapshotid"] == msg["snapshotid"]) or (msg.get("name") and s["name"] == msg["name"]):
+                    return s
+        raise RPCError(404, "snapshot not found")
+
+    # Crons and generators
+
+    def __add_cron(self, msg, caller):
+        cron = dict(msg["cron"])
+        cron["cronid"] = generate_id()
+        with self.lock:
+            self.crons[cron["cronid"]] = cron
+        return cron
+
+    def __get_cron(self, msg, caller):
+        with self.lock:
+            cron = self.crons.get(msg["cronid"])
+        if cron is None:
+            raise RPCError(404, "cron not found")
+        return cron
+
+    def __get_crons(self, msg, caller):
+        with self.lock:
+            crons = [c for c in self.crons.values() if c["colonyname"] == msg["colonyname"]]
+        return crons[:msg.get("count", len(crons))]
+
+    def __remove_cron(self, msg, caller):
+        with self.lock:
+            if self.crons.pop(msg["cronid"], None) is None:
+                raise RPCError(404, "cron not found")
+        return None
+
+    def __run_cron(self, msg, caller):
+        cron = self.__get_cron(msg, caller)
+        return self.__submit_workflow({"spec": self.serializer.loads(cron["workflowspec"])}, caller)
+
+    def __add_generator(self, msg, caller):
+        generator = dict(msg["generator"])
+        generator["generatorid"] = generate_id()
+        with self.lock:
+            self.generators[generator["generatorid"]] = generator
+        return generator
+
+    def __get_generator(self, msg, caller):
+        with self.lock:
+            generator = self.generators.get(msg["generatorid"])
+        if generator is None:
+            raise RPCError(404, "generator not found")
+        return generator
+
+    def __get_generators(self, msg, caller):
+        with self.lock:
+            generators = [g for g in self.generators.values() if g["colonyname"] == msg["colonyname"]]
+        return generators[:msg.get("count", len(generators))]
+
+    def __remove_generator(self, msg, caller):
+        with self.lock:
+            if self.generators.pop(msg["generatorid"], None) is None:
+                raise RPCError(404, "generator not found")
+        return None
+
+    # Blueprints: a spec change bumps the generation, is recorded in the
+    # history and submits a "reconcile" process to the handler's executor type
+
+    def __add_blueprint_definition(self, msg, caller):
+        definition = dict(msg["blueprintdefinition"])
+        definition["blueprintdefinitionid"] = generate_id()
+        key = (definition["metadata"]["colonyname"], definition["metadata"]["name"])
+        with self.lock:
+            if key in self.blueprint_definitions:
+                raise RPCError(409, "blueprint definition already exists")
+            self.blueprint_definitions[key] = definition
+        return definition
+
+    def __get_blueprint_definition(self, msg, caller):
+        with self.lock:
+            definition = self.blueprint_definitions.get((msg["colonyname"], msg["name"]))
+        if definition is None:
+            raise RPCError(404, "blueprint definition not found")
+        return definition
+
+    def __get_blueprint_definitions(self, msg, caller):
+        with self.lock:
+            return [d for key, d in self.blueprint_definitions.items() if key[0] == msg["colonyname"]]
+
+    def __remove_blueprint_definition(self, msg, caller):
+        with self.lock:
+            if self.blueprint_definitions.pop((msg["namespace"], msg["name"]), None) is None:
+                raise RPCError(404, "blueprint definition not found")
+        return None
+
+    def __record_blueprint(self, blueprint, changetype, caller):
+        entry = {
+            "historyid": generate_id(),
+            "blueprintid": blueprint["blueprintid"],
+            "kind": blueprint["kind"],
+            "namespace": blueprint["metadata"]["colonyname"],
+            "name": blueprint["metadata"]["name"],
+            "generation": blueprint["metadata"]["generation"],
+            "spec": blueprint.get("spec"),
+            "status": blueprint.get("status"),
+            "changetype": changetype,
+            "timestamp": timestamp(),
+        }
+        self.blueprint_history.setdefault(blueprint["blueprintid"], []).append(entry)
+
+    def __submit_reconcile(self, blueprint, action, caller, force=False):
+        executortype = (blueprint.get("handler") or {}).get("executortype", "")
+        if executortype == "":
+            return None
+        spec = {
+            "nodename": "reconcile",
+            "funcname": "reconcile",
+            "args": [],
+            "kwargs": {"kind": blueprint["kind"], "blueprintname": blueprint["metadata"]["name"], "action": action,
+                       "force": str(force).lower()},
+            "conditions": {"colonyname": blueprint["metadata"]["colonyname"], "executortype": executortype},
+        }
+        return self.__submit_funcspec({"spec": spec}, caller)
+
+    def __find_blueprint(self, colonyname, name):
+        blueprint = self.blueprints.get((colonyname, name))
+        if blueprint is None:
+            raise RPCError(404, "blueprint not found")
+        return blueprint
+
+    def __add_blueprint(self, msg, caller):
+        blueprint = dict(msg["blueprint"])
+        metadata = dict(blueprint["metadata"])
+        key = (metadata["colonyname"], metadata["name"])
+        with self.lock:
+            if not any(k[0] == key[0] and d.get("kind") == blueprint.get("kind")
+                       for k, d in self.blueprint_definitions.items()):
+                raise RPCError(400, "no blueprint definition for kind " + str(blueprint.get("kind")))
+            if key in self.blueprints:
+                raise RPCError(409, "blueprint already exists")
+            metadata["generation"] = 1
+            blueprint["metadata"] = metadata
+            blueprint["blueprintid"] = generate_id()
+            blueprint.setdefault("status", {})
+            self.blueprints[key] = blueprint
+            self.__record_blueprint(blueprint, "create", caller)
+        self.__submit_reconcile(blueprint, "create", caller)
+        return blueprint
+
+    def __get_blueprint(self, msg, caller):
+        with self.lock:
+            return self.__find_blueprint(msg["namespace"], msg["name"])
+
+    def __get_blueprints(self, msg, caller):
+        with self.lock:
+            return [b for key, b in self.blueprints.items() if key[0] == msg["namespace"]
+                    and (not msg.get("kind") or b["kind"] == msg["kind"])
+                    and (not msg.get("locationname") or b["metadata"].get("locationname") == msg["locationname"])]
+
+    def __update_blueprint(self, msg, caller):
+        update = msg["blueprint"]
+        with self.lock:
+            old = self.__find_blueprint(update["metadata"]["colonyname"], update["metadata"]["name"])
+            changed = update.get("spec") != old.get("spec") or msg.get("forcegeneration", False)
+            blueprint = dict(old)
+            blueprint.update({key: value for key, value in update.items() if key not in ("blueprintid", "status")})
+            metadata = dict(update["metadata"])
+            metadata["generation"] = old["metadata"]["generation"] + (1 if changed else 0)
+            blueprint["metadata"] = metadata
+            self.blueprints[(metadata["colonyname"], metadata["name"])] = blueprint
+            if changed:
+                self.__record_blueprint(blueprint, "update", caller)
+        if changed:
+            self.__submit_reconcile(blueprint, "update", caller)
+        return blueprint
+
+    def __update_blueprint_status(self, msg, caller):
+        with self.lock:
+            blueprint = dict(self.__find_blueprint(msg["colonyname"], msg["blueprintname"]))
+            blueprint["status"] = msg["status"]
+            self.blueprints[(msg["colonyname"], msg["blueprintname"])] = blueprint
+        return None
+
+    def __reconcile_blueprint(self, msg, caller):
+        with self.lock:
+            blueprint = self.__find_blueprint(msg["namespace"], msg["name"])
+        return self.__submit_reconcile(blueprint, "reconcile", caller, force=msg.get("force", False))
+
+    def __get_blueprint_history(self, msg, caller):
+        with self.lock:
+            history = list(reversed(self.blueprint_history.get(msg["blueprintid"], [])))
+        if msg.get("limit"):
+            history = history[:msg["limit"]]
+        return history
+
+    def __remove_blueprint(self, msg, caller):
+        with self.lock:
+            blueprint = self.__find_blueprint(msg["namespace"], msg["name"])
+            del self.blueprints[(msg["namespace"], msg["name"])]
+            self.__record_blueprint(blueprint, "delete", caller)
+        self.__submit_reconcile(blueprint, "delete", caller)
+        return None
+
+    # S3 stand-in
+
+    def __s3_handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def split(self):
+                path = urlsplit(self.path).path.lstrip("/")
+                bucket, _, key = path.partition("/")
+                return bucket, key
+
+            def reply(self, status, body=b"", headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def read_body(self):
+                if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                    body = b""
+                    while True:
+                        size = int(self.rfile.readline().split(b";")[0], 16)
+                        if size == 0:
+                            while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                                pass
+                            break
+                        body += self.rfile.read(size)
+                        self.rfile.readline()
+                else:
+                    body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if "aws-chunked" in self.headers.get("Content-Encoding", ""):
+                    body = decode_aws_chunked(body)
+                return body
+
+            def do_HEAD(self):
+                self.do_GET()
+
+            def do_GET(self):
+                bucket, key = self.split()
+                with server.s3_lock:
+                    objects = server.buckets.get(bucket)
+                    data = None if objects is None or key == "" else objects.get(key)
+                if objects is None:
+                    self.reply(404, b"<Error><Code>NoSuchBucket</Code></Error>")
+                elif key == "":
+                    self.reply(200)
+                elif data is None:
+                    self.reply(404, b"<Error><Code>NoSuchKey</Code></Error>")
+                else:
+                    etag = '"' + hashlib.md5(data).hexdigest() + '"'
+                    headers = {"ETag": etag, "Content-Type": "application/octet-stream", "Accept-Ranges": "bytes"}
+                    byte_range = self.headers.get("Range")
+                    if byte_range is not None and byte_range.startswith("bytes="):
+                        start, _, end = byte_range[len("bytes="):].partition("-")
+                        start = int(start)
+                        end = int(end) if end else len(data) - 1
+                        headers["Content-Range"] = "bytes %d-%d/%d" % (start, end, len(data))
+                        self.reply(206, data[start:end + 1], headers)
+                    else:
+                        self.reply(200, data, headers)
+
+            def do_PUT(self):
+                bucket, key = self.split()
+                body = self.read_body()
+                with server.s3_lock:
+                    if key == "":
+                        server.buckets.setdefault(bucket, {})
+                    else:
+                        server.buckets.setdefault(bucket, {})[key] = body
+                self.reply(200, b"", {"ETag": '"' + hashlib.md5(body).hexdigest() + '"'})
+
+            def do_DELETE(self):
+                bucket, key = self.split()
+                with server.s3_lock:
+                    server.buckets.get(bucket, {}).pop(key, None)
+                self.reply(204)
+
+        return Handler
+
+def decode_aws_chunked(body):
+    data = b""
+    pos = 0
+    while pos < len(body):
+        end = body.index(b"\r\n", pos)
+        size = int(body[pos:end].split(b";")[0], 16)
+        if size == 0:
+            break
+        data += body[end + 2:end + 2 + size]
+        pos = end + 2 + size + 2
+    return data
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory Colonies server for tests and benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=50080)
+    parser.add_argument("--s3-port", type=int, default=9000)
+    parser.add_argument("--authenticate", action="store_true")
+    args = parser.parse_args()
+
+    server = MockColoniesServer(args.host, args.port, args.s3_port, authenticate=args.authenticate).start()
+    print("Colonies mock server listening on", args.host + ":" + str(server.port), "S3 on port", server.s3_port)
+    for name, value in server.s3_env().items():
+        print("export " + name + "=" + value)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
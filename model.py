@@ -1,7 +1,10 @@
 from datetime import datetime
 
-from typing import List, Dict, Optional
-from pydantic import BaseModel, Field, field_validator
+from typing import Any, List, Dict, Optional
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
+
+from offload import has_refs
+from codec import has_blobs
 
 class Gpu(BaseModel):
     name: str = ""
@@ -76,7 +79,7 @@ class Process(BaseModel):
     input: List[str | int | float] | None = Field(alias="in")
     output: List[str | int | float] | None = Field(alias="out")
     errors: List[str]
-    
+
     def __init__(self, **data):
         if 'input' in data:
             data['in'] = data.pop('input')
@@ -84,6 +87,57 @@ class Process(BaseModel):
             data['out'] = data.pop('output')
         super().__init__(**data)
 
+    @classmethod
+    def with_resolver(cls, data, resolver):
+        """Return a Process whose offloaded references and codec blobs are resolved on first access.
+
+        Args:
+            data: The process as returned by the server
+            resolver: Function resolver(values) returning the resolved values
+
+        Returns:
+            A LazyProcess if the input or output of data holds references or
+            blobs, else a plain Process
+        """
+        pending = set()
+        for name, alias in (("input", "in"), ("output", "out")):
+            values = data.get(alias, data.get(name))
+            if has_refs(values) or has_blobs(values):
+                pending.add(name)
+        if len(pending) == 0:
+            return cls(**data)
+        process = LazyProcess(**data)
+        process._resolver = resolver
+        process._pending = pending
+        return process
+
+
+class LazyProcess(Process):
+    """A Process whose input or output is resolved by the client on first access.
+
+    Pickling resolves what is still pending, the resolver itself is not
+    pickled.
+    """
+
+    _resolver: Any = PrivateAttr(default=None)
+    # names of the fields that are not resolved yet
+    _pending: Any = PrivateAttr(default_factory=set)
+
+    def __getattribute__(self, name):
+        if name == "input" or name == "output":
+            private = super().__getattribute__("__pydantic_private__")
+            if name in private["_pending"]:
+                self.__dict__[name] = private["_resolver"](self.__dict__[name])
+                private["_pending"].discard(name)
+        return super().__getattribute__(name)
+
+    def __getstate__(self):
+        for name in list(self.__pydantic_private__["_pending"]):
+            getattr(self, name)
+        state = super().__getstate__()
+        state["__pydantic_private__"] = dict(state["__pydantic_private__"], _resolver=None, _pending=set())
+        return state
+
 
 class Workflow(BaseModel):
     colonyname: str
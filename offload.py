@@ -0,0 +1,78 @@
+import json
+import threading
+from collections import OrderedDict
+
+REF_PREFIX = "colonies-ref:"
+
+def make_ref(colonyname, fileid, size):
+    """Return the compact reference stored in place of an offloaded payload.
+
+    Args:
+        colonyname: Name of the colony the payload file belongs to
+        fileid: ID of the file holding the JSON encoded payload
+        size: Size of the encoded payload in bytes
+    """
+    return REF_PREFIX + json.dumps({"colonyname": colonyname, "fileid": fileid, "size": size}, separators=(",", ":"))
+
+def parse_ref(value):
+    """Return the reference dict if value is an offloaded payload reference, otherwise None."""
+    if isinstance(value, str) and value.startswith(REF_PREFIX):
+        return json.loads(value[len(REF_PREFIX):])
+    return None
+
+def has_refs(values):
+    if not values:
+        return False
+    for value in values:
+        if isinstance(value, str) and value.startswith(REF_PREFIX):
+            return True
+    return False
+
+def resolve_refs(values, fetch):
+    """Replace each reference in values with the payload it points to.
+
+    A child process gets the outputs of all its parents concatenated into its
+    input, so references can be mixed with plain values, and each reference
+    expands to the list of values it was created from.
+
+    Args:
+        values: List of values, possibly containing references
+        fetch: Function fetch(ref) returning the payload list of a reference dict
+    """
+    resolved = []
+    for value in values:
+        ref = parse_ref(value)
+        if ref is None:
+            resolved.append(value)
+        else:
+            resolved.extend(fetch(ref))
+    return resolved
+
+class PayloadCache:
+    """Thread-safe LRU cache of resolved payloads, bounded by encoded size."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, values, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (values, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
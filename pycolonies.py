@@ -2,14 +2,31 @@ import requests
 import json 
 from model import Process, FuncSpec, Workflow, ProcessGraph, Conditions, Gpu, S3Object, Reference, File
 import base64
-from websocket import create_connection
+from websocket import create_connection, WebSocketException
 import inspect
 import os
 import ctypes
 from crypto import Crypto
+from serializer import Serializer, get_serializer
+from offload import PayloadCache, make_ref, resolve_refs
+from memo import ResultCache
+from codec import get_codec, has_blobs, encode_values, decode_values, encode_kwargs
+from instrumentation import RPCEvent
+from retry import RetryPolicy
+from errors import (ColoniesConnectionError, ColoniesTransportError, ColoniesTimeoutError, ColoniesError,
+                    ColoniesAuthError, ColoniesNotFoundError, ColoniesConflictError, ColoniesServerError,
+                    ColoniesRateLimitError, ColoniesProcessError, error_from_reply)
 import boto3
+import urllib3
 import hashlib
+import math
 import uuid
+import queue
+import select
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
 
 def colonies_client(native_crypto=False):
@@ -28,13 +45,206 @@ def colonies_client(native_crypto=False):
 
     return client, colonyname, colony_prvkey, executorname, prvkey
 
-class ColoniesConnectionError(Exception):
-    pass
+def iter_pages(fetch, cursor, advance):
+    """Iterate over a paginated listing, prefetching the next page.
+
+    Args:
+        fetch: Function fetch(cursor) returning the page (a list) at cursor
+        cursor: Cursor of the first page
+        advance: Function advance(cursor, page) returning the cursor of the
+                 next page, or None when the listing is exhausted
+
+    Yields:
+        Items in page order. The next page is requested on a background
+        thread while the caller consumes the current one, so at most two of
+        the pages returned by fetch are held at a time; fetch itself may
+        need more, see offset_pages.
+    """
+    pool = ThreadPoolExecutor(max_workers=1)
+    try:
+        future = pool.submit(fetch, cursor)
+        while future is not None:
+            page = future.result() or []
+            cursor = advance(cursor, page)
+            if cursor is not None:
+                future = pool.submit(fetch, cursor)
+            else:
+                future = None
+            for item in page:
+                yield item
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def offset_pages(list_fn, page_size):
+    """Emulate offset pagination for listings that only accept a count.
+
+    The server has no offset, so page n is read by listing the first
+    (n + 1) * page_size entries and dropping those already yielded. Reading
+    N entries therefore transfers about N * N / (2 * page_size) of them, and
+    the last request holds the whole listing in memory; a larger page_size
+    means fewer, larger requests. Entries added or removed at the head of
+    the listing while iterating shift the offsets, so entries can be
+    skipped or yielded twice.
+
+    Args:
+        list_fn: Function list_fn(count) returning the first count entries
+        page_size: Number of entries per page
+
+    Returns:
+        A (fetch, advance) pair for iter_pages, using the offset as cursor
+    """
+    def fetch(offset):
+        entries = list_fn(offset + page_size) or []
+        return entries[offset:]
+
+    def advance(offset, page):
+        if len(page) < page_size:
+            return None
+        return offset + page_size
+
+    return fetch, advance
+
+def log_key(entry):
+    return (entry["timestamp"], entry.get("processid"), entry.get("executorname"), entry.get("message"))
+
+def since_pages(list_fn, page_size):
+    """Cursor pagination for log listings using the since timestamp.
+
+    Entries sharing the timestamp of the last entry of a page are fetched
+    again with the next page and skipped if already yielded, as in
+    tail_pages, so none are lost at page boundaries.
+
+    Args:
+        list_fn: Function list_fn(count, since) returning entries after since
+        page_size: Number of entries per page
+
+    Returns:
+        A (fetch, advance) pair for iter_pages, using (since, keys of the
+        entries yielded at since) as cursor; start with (since, frozenset())
+    """
+    def fetch(cursor):
+        since, seen = cursor
+        page = list_fn(page_size + len(seen), since - 1 if len(seen) > 0 else since) or []
+        return [entry for entry in page if entry["timestamp"] != since or log_key(entry) not in seen]
+
+    def advance(cursor, page):
+        if len(page) < page_size:
+            return None
+        since, seen = cursor
+        last = page[-1]["timestamp"]
+        keys = frozenset(log_key(entry) for entry in page if entry["timestamp"] == last)
+        return (last, keys | seen if last == since else keys)
+
+    return fetch, advance
+
+def tail_pages(list_fn, since, page_size, follow=True, finished=None, poll_interval=0.1, max_poll_interval=5.0,
+               timeout=None):
+    """Follow a log listing, yielding new entries as they are added.
+
+    Entries sharing the timestamp of the last yielded entry are fetched
+    again and skipped if already seen, so no entry is lost or repeated when
+    several have the same timestamp. Only those entries are remembered, so
+    memory use is bounded by the page size plus the longest run of entries
+    with the same timestamp. The poll interval doubles while
+    nothing new arrives, up to max_poll_interval, and drops back to
+    poll_interval when entries arrive.
+
+    Args:
+        list_fn: Function list_fn(count, since) returning entries after since
+        since: Only yield entries with a timestamp after since
+        page_size: Number of entries per request
+        follow: If False, stop when all current entries have been yielded
+        finished: Function returning True when no more entries will be added,
+                  the listing is then read one last time
+        poll_interval: Seconds between polls while entries arrive
+        max_poll_interval: Maximum seconds between polls
+        timeout: Stop following after this many seconds, None to follow until
+                 finished returns True
+
+    Yields:
+        Entries in timestamp order
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    cursor = since
+    seen = set()
+    interval = poll_interval
+    last_read = False
+
+    while True:
+        # refetch the entries at the cursor timestamp along with a full page of new ones
+        count = page_size + len(seen)
+        page = list_fn(count, cursor - 1 if len(seen) > 0 else cursor) or []
+        new = [entry for entry in page if entry["timestamp"] != cursor or log_key(entry) not in seen]
+        if len(page) >= count and len(new) == 0:
+            # the server capped the page below the seen entries, skip past them
+            count = page_size
+            page = list_fn(count, cursor) or []
+            new = page
+        for entry in new:
+            if entry["timestamp"] != cursor:
+                cursor = entry["timestamp"]
+                seen = set()
+            seen.add(log_key(entry))
+            yield entry
+
+        if len(page) >= count:
+            interval = poll_interval
+            continue
+        if not follow or last_read:
+            return
+        if len(new) > 0:
+            interval = poll_interval
+        else:
+            if finished is not None and finished():
+                last_read = True
+                continue
+            interval = min(interval * 2, max_poll_interval)
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            interval = min(interval, remaining)
+        time.sleep(interval)
+
+# seconds between checks of the cancelled event of Colonies.wait
+CANCEL_INTERVAL = 0.1
+
+# function -> (__code__, base64 encoded source, arg names), dropped with the function
+code_cache = weakref.WeakKeyDictionary()
+code_cache_lock = threading.Lock()
+
+def encoded_code(func):
+    """Return the base64 encoded source and the comma separated arg names of a function.
+
+    The result is cached per function object and recomputed if the function's
+    __code__ has been replaced.
+    """
+    code_object = getattr(func, "__code__", None)
+    try:
+        with code_cache_lock:
+            entry = code_cache.get(func)
+    except TypeError:
+        # not weak referenceable
+        entry = None
+    if entry is not None and entry[0] is code_object:
+        return entry[1], entry[2]
+
+    code = inspect.getsource(func)
+    code_base64 = base64.b64encode(code.encode("ascii")).decode("ascii")
+    args_spec_str = ','.join(inspect.getfullargspec(func).args)
+    try:
+        with code_cache_lock:
+            code_cache[func] = (code_object, code_base64, args_spec_str)
+    except TypeError:
+        pass
+    return code_base64, args_spec_str
+
+def func_spec(func, args, colonyname, executortype, executorname=None, priority=1, maxexectime=-1, maxretries=-1, maxwaittime=-1, code=None, kwargs=None, fs=None, codec=None):
+    if codec is not None:
+        # args and kwargs of any type, packed into a blob decoded by the executor
+        args = encode_values(args, codec)
+        kwargs = encode_kwargs(kwargs, codec)
 
-class ColoniesError(Exception):
-    pass
-    
-def func_spec(func, args, colonyname, executortype, executorname=None, priority=1, maxexectime=-1, maxretries=-1, maxwaittime=-1, code=None, kwargs=None, fs=None):
     if isinstance(func, str):
         func_spec = FuncSpec(
             nodename=func,
@@ -58,14 +268,8 @@ def func_spec(func, args, colonyname, executortype, executorname=None, priority=
             func_spec.env["code"] = code_base64
 
     else:
-        code = inspect.getsource(func)
-        code_bytes = code.encode("ascii")
-        code_base64_bytes = base64.b64encode(code_bytes)
-        code_base64 = code_base64_bytes.decode("ascii")
-
+        code_base64, args_spec_str = encoded_code(func)
         funcname = func.__name__
-        args_spec = inspect.getfullargspec(func)
-        args_spec_str = ','.join(args_spec.args)
 
         func_spec = FuncSpec(
             nodename=funcname,
@@ -91,14 +295,230 @@ def func_spec(func, args, colonyname, executortype, executorname=None, priority=
 
     return func_spec
 
+def copy_tree(value):
+    """Copy the dicts and lists of a serialized model, sharing only the immutable leaves."""
+    if isinstance(value, dict):
+        return {key: copy_tree(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_tree(item) for item in value]
+    return value
+
+class FuncSpecTemplate:
+    """Function spec whose invariant parts are built and serialized once.
+
+    Submitting many processes of the same function only differs in args and
+    kwargs, so the template dumps the rest of the spec once and dump() only
+    fills in the args and kwargs of each submission.
+
+    Args:
+        func: Function or function name, as for func_spec
+        colonyname: Name of the colony
+        executortype: Type of the executors running the function
+        codec: If set, args and kwargs are packed with this codec
+        **kwargs: Other func_spec parameters, e.g. priority or maxexectime
+    """
+
+    def __init__(self, func, colonyname, executortype, codec=None, **kwargs):
+        self.codec = codec
+        self.template = func_spec(func, [], colonyname, executortype, **kwargs)
+        self.dumped = self.template.model_dump(by_alias=True)
+
+    def dump(self, args, kwargs=None):
+        """Return the serialized spec for the given args and kwargs, ready for submit_func_spec."""
+        if self.codec is not None:
+            args = encode_values(args, self.codec)
+            kwargs = encode_kwargs(kwargs, self.codec)
+        dumped = copy_tree(self.dumped)
+        dumped["args"] = list(args)
+        dumped["kwargs"] = dict(kwargs) if kwargs is not None else dumped["kwargs"]
+        return dumped
+
+    def spec(self, args, kwargs=None) -> FuncSpec:
+        """Return a FuncSpec for the given args and kwargs, e.g. to add to a workflow."""
+        return FuncSpec(**self.dump(args, kwargs))
+
+# errors after which a process subscription is renewed instead of closed
+RESUBSCRIBE_ERRORS = (ColoniesTransportError, ColoniesTimeoutError, WebSocketException, OSError)
+
+class ProcessSubscription:
+    """Stream of process state transitions received over the pubsub socket.
+
+    Each subscribed state is read by its own thread into a bounded queue.
+    With overflow="block" a full queue stops the reader threads, which in turn
+    stops reading from the socket so the server is throttled by TCP flow
+    control. With overflow="drop" the oldest undelivered event is discarded
+    and counted in dropped.
+
+    Broken connections and subscriptions ended by the server's timeout are
+    resubscribed. Any other error, e.g. a ColoniesAuthError, closes the
+    subscription and is raised by get and by iteration.
+    """
+
+    def __init__(self, connect, decode, states, maxqueue=1000, overflow="block", filter=None):
+        if overflow not in ("block", "drop"):
+            raise ValueError("overflow must be 'block' or 'drop'")
+        self.connect = connect
+        self.decode = decode
+        self.overflow = overflow
+        self.filter = filter
+        self.queue = queue.Queue(maxsize=maxqueue)
+        self.dropped = 0
+        self.error = None
+        self.closed = threading.Event()
+        self.lock = threading.Lock()
+        self.sockets = set()
+        self.threads = []
+        for state in states:
+            t = threading.Thread(target=self.__reader, args=(state,), daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def __reader(self, state):
+        backoff = 0.1
+        while not self.closed.is_set():
+            try:
+                ws = self.connect(state)
+            except RESUBSCRIBE_ERRORS:
+                self.closed.wait(backoff)
+                backoff = min(backoff * 2, 5)
+                continue
+            except Exception as err:
+                self.__fail(err)
+                return
+
+            started = time.monotonic()
+            with self.lock:
+                self.sockets.add(ws)
+            try:
+                while not self.closed.is_set():
+                    data = ws.recv()
+                    if data == "" or data == b"":
+                        # the server closed the socket
+                        break
+                    process = self.decode(data)
+                    if self.filter is None or self.filter(process):
+                        self.__put(process)
+            except RESUBSCRIBE_ERRORS:
+                # the server ends the subscription on timeout, or the connection broke, resubscribe
+                pass
+            except Exception as err:
+                if not self.closed.is_set():
+                    self.__fail(err)
+                return
+            finally:
+                with self.lock:
+                    self.sockets.discard(ws)
+                ws.close()
+
+            # resubscribe immediately after a long-lived subscription, back off if it failed right away
+            if time.monotonic() - started > 1:
+                backoff = 0.1
+            else:
+                self.closed.wait(backoff)
+                backoff = min(backoff * 2, 5)
+
+    def __fail(self, err):
+        with self.lock:
+            if self.error is None:
+                self.error = err
+        self.close()
+
+    def __put(self, process):
+        if self.overflow == "drop":
+            while True:
+                try:
+                    self.queue.put_nowait(process)
+                    return
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        with self.lock:
+                            self.dropped += 1
+                    except queue.Empty:
+                        pass
+        else:
+            while not self.closed.is_set():
+                try:
+                    self.queue.put(process, timeout=0.5)
+                    return
+                except queue.Full:
+                    pass
+
+    def get(self, timeout=None):
+        """Return the next process event, or None if timeout expires or the subscription is closed.
+
+        Raises:
+            The error that closed the subscription, e.g. ColoniesAuthError
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.closed.is_set():
+            if deadline is None:
+                wait = 0.5
+            else:
+                wait = min(0.5, deadline - time.monotonic())
+                if wait <= 0:
+                    return None
+            try:
+                return self.queue.get(timeout=wait)
+            except queue.Empty:
+                pass
+        if self.error is not None:
+            raise self.error
+        return None
+
+    def __iter__(self):
+        while True:
+            process = self.get()
+            if process is None:
+                return
+            yield process
+
+    def close(self):
+        self.closed.set()
+        with self.lock:
+            sockets = list(self.sockets)
+        for ws in sockets:
+            ws.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 class Colonies:
     WAITING = 0
     RUNNING = 1
     SUCCESSFUL = 2
     FAILED = 3
     
-    def __init__(self, host, port, tls=False, native_crypto=False):
+    def __init__(self, host, port, tls=False, native_crypto=False, serializer=None, offload_threshold=None, offload_label="/.pycolonies/payloads", retry=True, request_timeout=None, codec=None, code_registry=False, code_label="/.pycolonies/code", memo=None):
         self.native_crypto = native_crypto
+        if retry is True:
+            self.retry = RetryPolicy()
+        elif retry is False:
+            self.retry = None
+        else:
+            self.retry = retry
+        self.request_timeout = request_timeout
+        if isinstance(serializer, Serializer):
+            self.serializer = serializer
+        else:
+            self.serializer = get_serializer(serializer)
+        self.offload_threshold = offload_threshold
+        self.offload_label = offload_label
+        self.payload_cache = PayloadCache()
+        self.codec = get_codec(codec) if codec is not None else None
+        self.code_registry = code_registry
+        self.code_label = code_label
+        self.code_cache = PayloadCache(max_bytes=16 * 1024 * 1024)
+        # base64 encoded code -> SHA-256 of the source, and the (colony, hash) pairs known to be uploaded
+        self.code_hashes = {}
+        self.published_code = set()
+        self.code_lock = threading.Lock()
+        self.memo = ResultCache() if memo is True else memo or None
+        self.pre_rpc_hooks = []
+        self.post_rpc_hooks = []
         if tls:
             self.url = "https://" + host + ":" + str(port) + "/api"
             self.host = host
@@ -110,70 +530,275 @@ class Colonies:
             self.port = port
             self.tls = False 
     
+    def add_rpc_hook(self, pre=None, post=None):
+        """Register functions called around every RPC call.
+
+        Both get an RPCEvent: pre hooks before the request is sent, post hooks
+        after the reply has been parsed or the call has failed. Hooks run on
+        the calling thread and should return quickly.
+
+        Args:
+            pre: Function pre(event), or None
+            post: Function post(event), or None, e.g. an RPCMetrics instance
+        """
+        if pre is not None:
+            self.pre_rpc_hooks.append(pre)
+        if post is not None:
+            self.post_rpc_hooks.append(post)
+
+    def remove_rpc_hook(self, pre=None, post=None):
+        if pre is not None:
+            self.pre_rpc_hooks.remove(pre)
+        if post is not None:
+            self.post_rpc_hooks.remove(post)
+
     def __rpc(self, msg, prvkey):
-        payload = str(base64.b64encode(json.dumps(msg).encode('utf-8')), "utf-8")
+        attempt = 0
+        while True:
+            try:
+                payload = self.__rpc_once(msg, prvkey)
+            except ColoniesConnectionError as err:
+                if self.retry is None or not self.retry.should_retry(msg["msgtype"], err, attempt):
+                    raise
+                time.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            if self.retry is not None:
+                self.retry.success()
+            return payload
+
+    def __timeout(self, msg):
+        if self.request_timeout is None:
+            return None
+        # long polling calls are held by the server for up to msg["timeout"] seconds
+        return self.request_timeout + max(msg.get("timeout", 0), 0)
+
+    def __rpc_once(self, msg, prvkey):
+        msgtype = msg["msgtype"]
+        t0 = time.perf_counter()
+        payload = base64.b64encode(self.serializer.dumps(msg)).decode("ascii")
+        t1 = time.perf_counter()
         crypto = Crypto(native=self.native_crypto)
         signature = crypto.sign(payload, prvkey)
+        t2 = time.perf_counter()
 
         rpc = {
-            "payloadtype" : msg["msgtype"],
+            "payloadtype" : msgtype,
             "payload" : payload,
             "signature" : signature
         }
 
-        rpc_json = json.dumps(rpc) 
+        rpc_json = self.serializer.dumps(rpc)
+        t3 = time.perf_counter()
+
+        event = None
+        if len(self.pre_rpc_hooks) > 0 or len(self.post_rpc_hooks) > 0:
+            event = RPCEvent(msgtype, len(rpc_json), (t1 - t0) + (t3 - t2), t2 - t1)
+            try:
+                for hook in self.pre_rpc_hooks:
+                    hook(event)
+            except ColoniesConnectionError as err:
+                # e.g. rejected by a rate limiter, the post hooks still see the call
+                event.wait = time.perf_counter() - t3
+                event.error = err
+                for hook in self.post_rpc_hooks:
+                    hook(event)
+                raise
+            # a blocking pre hook, such as a rate limiter, is not network time
+            sent = time.perf_counter()
+            event.wait = sent - t3
+        else:
+            sent = t3
+
+        reply = None
+        t4 = None
+        error = None
         try:
-            reply = requests.post(url = self.url, data=rpc_json, verify=True)
-            
-            reply_msg_json = json.loads(reply.content)
-            err_detected = False
-            if reply_msg_json["error"] == True:
-                err_detected = True 
-            base64_payload = reply_msg_json["payload"]
-            payload_bytes = base64.b64decode(base64_payload)
-            payload = json.loads(payload_bytes)
-            if err_detected:
-                raise ColoniesConnectionError(payload["message"])
+            reply = requests.post(url = self.url, data=rpc_json, verify=True, timeout=self.__timeout(msg))
+            t4 = time.perf_counter()
+
+            reply_msg_json = self.serializer.loads(reply.content)
+            payload = self.serializer.loads(base64.b64decode(reply_msg_json["payload"]))
+            if reply_msg_json["error"] == True or reply.status_code != 200:
+                status = reply.status_code if reply.status_code != 200 else payload.get("status")
+                error = error_from_reply(status, payload["message"], msgtype)
+        except requests.exceptions.ConnectTimeout as err:
+            error = ColoniesTransportError(err, msgtype, connect_failed=True)
+        except requests.exceptions.Timeout as err:
+            error = ColoniesTimeoutError(err, msgtype=msgtype)
         except requests.exceptions.ConnectionError as err:
-            raise ColoniesConnectionError(err)
+            reason = getattr(err.args[0], "reason", None) if len(err.args) > 0 else None
+            error = ColoniesTransportError(err, msgtype, connect_failed=isinstance(reason, urllib3.exceptions.ConnectTimeoutError))
+        except requests.exceptions.RequestException as err:
+            error = ColoniesTransportError(err, msgtype)
         except Exception as err:
-            raise ColoniesConnectionError(err)
+            # the reply could not be decoded, e.g. an HTML error page from a proxy
+            if reply is not None and reply.status_code != 200:
+                error = error_from_reply(reply.status_code, reply.text[:200], msgtype)
+            else:
+                error = ColoniesTransportError("invalid reply: " + str(err), msgtype)
 
-        if reply.status_code == 200:
-            return payload
-        else:
-            raise ColoniesError(payload["message"])
+        if event is not None:
+            t5 = time.perf_counter()
+            if t4 is None:
+                event.network = t5 - sent
+            else:
+                event.network = t4 - sent
+                event.parse = t5 - t4
+            if reply is not None:
+                event.status_code = reply.status_code
+                event.response_size = len(reply.content)
+            event.error = error
+            for hook in self.post_rpc_hooks:
+                hook(event)
+
+        if error is not None:
+            raise error
+        return payload
     
-    def wait(self, process: Process, timeout, prvkey) -> Process:
-        state = 2
-        msg = {
-            "processid": process.processid,
-            "executortype": process.spec.conditions.executortype,
-            "state": state,
-            "timeout": timeout,
-            "colonyname": process.spec.conditions.colonyname,
-            "msgtype": "subscribeprocessmsg"
-        }
+    def wait(self, process: Process, timeout, prvkey, cancelled=None) -> Process:
+        """Wait until a process has finished, successfully or not.
+
+        Subscribes to both the SUCCESSFUL and FAILED state on the pubsub
+        socket and returns the process carried by the first event. If the
+        WebSocket cannot be used, the process is polled with exponentially
+        increasing intervals instead.
 
+        Args:
+            process: The process to wait for
+            timeout: Maximum number of seconds to wait
+            prvkey: Private key for authentication
+            cancelled: Optional threading.Event, the sockets are closed and
+                       process is returned as given soon after it is set
+
+        Returns:
+            The finished process, or its current state if timeout expired
+        """
+        if self.memo is not None and self.memo.is_served(process.processid):
+            # a memoized result, the process may no longer exist
+            return process
+        deadline = time.monotonic() + timeout
+        sockets = []
+        try:
+            for state in (Colonies.SUCCESSFUL, Colonies.FAILED):
+                msg = {
+                    "processid": process.processid,
+                    "executortype": process.spec.conditions.executortype,
+                    "state": state,
+                    # the server only accepts whole seconds
+                    "timeout": max(1, math.ceil(timeout)),
+                    "colonyname": process.spec.conditions.colonyname,
+                    "msgtype": "subscribeprocessmsg"
+                }
+                sockets.append(self.__subscribe(msg, prvkey))
+        except Exception:
+            for ws in sockets:
+                ws.close()
+            return self.__poll_wait(process, deadline, prvkey, cancelled)
+
+        try:
+            while len(sockets) > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if cancelled is not None:
+                    if cancelled.is_set():
+                        return process
+                    remaining = min(remaining, CANCEL_INTERVAL)
+                ready = [ws for ws in sockets if hasattr(ws.sock, "pending") and ws.sock.pending() > 0]
+                if len(ready) == 0:
+                    readable, _, _ = select.select([ws.sock for ws in sockets], [], [], remaining)
+                    ready = [ws for ws in sockets if ws.sock in readable]
+                for ws in ready:
+                    reply_msg = self.serializer.loads(ws.recv())
+                    payload = self.serializer.loads(base64.b64decode(reply_msg["payload"]))
+                    if reply_msg.get("error"):
+                        sockets.remove(ws)
+                        ws.close()
+                    else:
+                        return self.__process(payload, prvkey)
+        except Exception:
+            return self.__poll_wait(process, deadline, prvkey, cancelled)
+        finally:
+            for ws in sockets:
+                ws.close()
+
+        return self.get_process(process.processid, prvkey)
+
+    def __poll_wait(self, process, deadline, prvkey, cancelled=None, interval=0.05, max_interval=2.0):
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                return process
+            process = self.get_process(process.processid, prvkey)
+            if process.state == Colonies.SUCCESSFUL or process.state == Colonies.FAILED:
+                return process
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return process
+            if cancelled is not None:
+                cancelled.wait(min(interval, remaining))
+            else:
+                time.sleep(min(interval, remaining))
+            interval = min(interval * 2, max_interval)
+
+    def __subscribe(self, msg, prvkey):
         rpcmsg = {
             "payloadtype": msg["msgtype"],
             "payload": "",
             "signature": ""
         }
 
-        rpcmsg["payload"] = str(base64.b64encode(json.dumps(msg).encode('utf-8')), "utf-8")
-        crypto = Crypto()
+        rpcmsg["payload"] = base64.b64encode(self.serializer.dumps(msg)).decode("ascii")
+        crypto = Crypto(native=self.native_crypto)
         rpcmsg["signature"] = crypto.sign(rpcmsg["payload"], prvkey) 
 
         if self.tls:
             ws = create_connection("wss://" + self.host + ":" + str(self.port) + "/pubsub")
         else:
             ws = create_connection("ws://" + self.host + ":" + str(self.port) + "/pubsub")
-        ws.send(json.dumps(rpcmsg))
-        ws.recv()
-        ws.close()
+        ws.send(self.serializer.dumps(rpcmsg))
+        return ws
 
-        return self.get_process(process.processid, prvkey)
+    def subscribe_processes(self, colonyname, prvkey, executortype="", states=None, timeout=60, maxqueue=1000, overflow="block", filter=None):
+        """Subscribe to process state transitions in a colony.
+
+        Args:
+            colonyname: Name of the colony
+            prvkey: Private key for authentication
+            executortype: Executor type to subscribe to
+            states: States to report (default: WAITING, RUNNING, SUCCESSFUL and FAILED)
+            timeout: Server-side subscription timeout in seconds, subscriptions
+                     are renewed automatically when it expires
+            maxqueue: Maximum number of undelivered events
+            overflow: "block" to stop reading from the server when the queue
+                      is full, or "drop" to discard the oldest events
+            filter: Optional function filter(process) selecting which events to deliver
+
+        Returns:
+            A ProcessSubscription, iterate over it to receive Process objects as
+            they change state, and close it when done
+        """
+        if states is None:
+            states = [Colonies.WAITING, Colonies.RUNNING, Colonies.SUCCESSFUL, Colonies.FAILED]
+
+        def connect(state):
+            msg = {
+                "executortype": executortype,
+                "state": state,
+                "timeout": timeout,
+                "colonyname": colonyname,
+                "msgtype": "subscribeprocessesmsg"
+            }
+            return self.__subscribe(msg, prvkey)
+
+        def decode(data):
+            reply_msg = self.serializer.loads(data)
+            payload = self.serializer.loads(base64.b64decode(reply_msg["payload"]))
+            if reply_msg.get("error"):
+                raise error_from_reply(payload.get("status"), payload.get("message", "Process subscription error"), "subscribeprocessesmsg")
+            return self.__process(payload, prvkey)
+
+        return ProcessSubscription(connect, decode, states, maxqueue=maxqueue, overflow=overflow, filter=filter)
 
     def add_colony(self, colony, prvkey):
         msg = {
@@ -259,20 +884,72 @@ class Colonies:
         return self.__rpc(msg, prvkey)
                 
     def submit_func_spec(self, spec: FuncSpec, prvkey) -> Process:
+        """Submit a function spec.
+
+        Args:
+            spec: FuncSpec, or a spec serialized with FuncSpecTemplate.dump
+            prvkey: Private key for authentication
+        """
+        spec = spec if isinstance(spec, dict) else spec.model_dump(by_alias=True)
+        if self.code_registry:
+            spec = self.publish_code(spec, prvkey)
+        memo_path = None
+        if self.memo is not None and self.memo.enabled(spec):
+            memo_path, process = self.__memo_lookup(spec, prvkey)
+            if process is not None:
+                return process
         msg = {
                 "msgtype": "submitfuncspecmsg",
-                "spec": spec.model_dump(by_alias=True)
+                "spec": spec
             }
         response = self.__rpc(msg, prvkey)
-        return Process(**response)
+        process = self.__process(response, prvkey)
+        if memo_path is not None:
+            self.memo.submitted(spec["conditions"]["colonyname"], memo_path, process)
+        return process
     
+    def map(self, func, iterable, colonyname, executortype, prvkey, chunksize=1, max_inflight=32, ordered=True,
+            timeout=3600, **kwargs):
+        """Run a function over the items of an iterable, see fanout.map."""
+        # fanout builds on this module, so it is imported on first use
+        import fanout
+        return fanout.map(self, func, iterable, colonyname, executortype, prvkey, chunksize=chunksize,
+                          max_inflight=max_inflight, ordered=ordered, timeout=timeout, **kwargs)
+
+    def map_reduce(self, mapper, reducer, iterable, colonyname, executortype, prvkey, chunksize=1, max_inflight=32,
+                   timeout=3600, on_partial=None, **kwargs):
+        """Map chunks of an iterable and reduce the outputs in one workflow, see fanout.map_reduce."""
+        import fanout
+        return fanout.map_reduce(self, mapper, reducer, iterable, colonyname, executortype, prvkey,
+                                 chunksize=chunksize, max_inflight=max_inflight, timeout=timeout,
+                                 on_partial=on_partial, **kwargs)
+
+    def speculate(self, processes, prvkey, quantile=0.9, slowdown=1.5, max_copies=1, timeout=3600, poll_interval=1.0):
+        """Wait for processes, running copies of the stragglers, see fanout.speculate."""
+        import fanout
+        return fanout.speculate(self, processes, prvkey, quantile=quantile, slowdown=slowdown, max_copies=max_copies,
+                                timeout=timeout, poll_interval=poll_interval)
+
     def submit_workflow(self, workflow: Workflow, prvkey) -> ProcessGraph:
+        spec = workflow.model_dump(by_alias=True)
+        if self.code_registry:
+            spec["functionspecs"] = [self.publish_code(funcspec, prvkey) for funcspec in spec["functionspecs"]]
+        memo_path = None
+        if self.memo is not None and all(self.memo.enabled(funcspec) for funcspec in spec["functionspecs"]):
+            memo_path = self.memo.workflow_path(spec)
+            graph = self.__memo_lookup_graph(spec["colonyname"], memo_path, prvkey)
+            if graph is not None:
+                return graph
         msg = {
                 "msgtype": "submitworkflowspecmsg",
-                "spec": workflow.model_dump(by_alias=True)
+                "spec": spec
             }
         response = self.__rpc(msg, prvkey)
-        return ProcessGraph(**response)
+        graph = ProcessGraph(**response)
+        if memo_path is not None:
+            # the graph is reused as long as it exists and has not failed
+            self.__memo_store(spec["colonyname"], memo_path, {"processgraphid": graph.processgraphid}, prvkey)
+        return graph
 
     def assign(self, colonyname, timeout, prvkey) -> Process:
         msg = {
@@ -281,7 +958,7 @@ class Colonies:
             "colonyname": colonyname
         }
         response = self.__rpc(msg, prvkey)
-        return Process(**response)
+        return self.__process(response, prvkey)
   
     def list_processes(self, colonyname, count, state, prvkey):
         msg = {
@@ -291,6 +968,28 @@ class Colonies:
             "state": state
         }
         return self.__rpc(msg, prvkey)
+
+    def iter_processes(self, colonyname, state, prvkey, page_size=100):
+        """Iterate over all processes in a given state.
+
+        The server cannot list processes from an offset, so each page
+        re-lists all processes before it, see offset_pages: iterating over
+        N processes transfers about N * N / (2 * page_size) of them and the
+        last request holds all of them. Prefer list_processes with a large
+        count for one full listing, and iter_process_log for logs.
+
+        Args:
+            colonyname: Name of the colony
+            state: Process state (0=waiting, 1=running, 2=success, 3=failed)
+            prvkey: Private key for authentication
+            page_size: Number of processes fetched per request
+
+        Yields:
+            Process dicts, the next page being fetched in the background
+        """
+        list_fn = lambda count: self.list_processes(colonyname, count, state, prvkey)
+        fetch, advance = offset_pages(list_fn, page_size)
+        return iter_pages(fetch, 0, advance)
     
     def get_process(self, processid, prvkey) -> Process:
         msg = {
@@ -298,7 +997,7 @@ class Colonies:
             "processid": processid
         }
         response = self.__rpc(msg, prvkey)
-        return Process(**response)
+        return self.__process(response, prvkey)
     
     def remove_process(self, processid, prvkey):
         msg = {
@@ -307,11 +1006,251 @@ class Colonies:
         }
         return self.__rpc(msg, prvkey)
     
-    def close(self, processid, output, prvkey):
+    def __process(self, response, prvkey):
+        process = Process.with_resolver(response, lambda values: self.__resolve_payload(values, prvkey))
+        if self.memo is not None and process.state in (Colonies.SUCCESSFUL, Colonies.FAILED):
+            key = self.memo.finished(process.processid)
+            if key is not None and process.state == Colonies.SUCCESSFUL:
+                self.__memo_store(key[0], key[1], {"process": response}, prvkey)
+        return process
+
+    def store_result(self, process: Process, output, prvkey):
+        """Memoize the output of a process closed by an executor, see the memo parameter of the client.
+
+        Executors call this after closing a process, so results are stored
+        also when the submitter never reads them back. Only processes
+        without input and dependencies are stored, as the output of any
+        other process depends on more than its spec.
+
+        Args:
+            process: Process that was closed
+            output: Output the process was closed with
+            prvkey: Private key for authentication
+        """
+        spec = process.spec.model_dump(by_alias=True)
+        if self.memo is None or not self.memo.enabled(spec) or process.input or spec["conditions"].get("dependencies"):
+            return
+        response = process.model_dump(mode="json", by_alias=True)
+        response.update({"state": Colonies.SUCCESSFUL, "out": output})
+        self.__memo_store(spec["conditions"]["colonyname"], self.memo.path(spec), {"process": response}, prvkey)
+
+    def __memo_lookup(self, spec, prvkey):
+        colonyname = spec["conditions"]["colonyname"]
+        path = self.memo.path(spec)
+        entry = self.memo.get(colonyname, path)
+        if entry is None:
+            process = self.memo.running(colonyname, path)
+            if process is not None:
+                self.memo.count(coalesced=True)
+                return path, process
+            entry = self.__memo_download(colonyname, path, prvkey)
+        if entry is None:
+            self.memo.count()
+            return path, None
+        self.memo.count(hit=True)
+        self.memo.serve(entry["process"]["processid"])
+        return path, self.__process(entry["process"], prvkey)
+
+    def __memo_lookup_graph(self, colonyname, path, prvkey):
+        entry = self.memo.get(colonyname, path) or self.__memo_download(colonyname, path, prvkey)
+        if entry is not None:
+            try:
+                graph = self.get_processgraph(entry["processgraphid"], prvkey)
+                if graph.state != Colonies.FAILED:
+                    self.memo.count(hit=True)
+                    return graph
+            except ColoniesNotFoundError:
+                pass
+            self.memo.remove(colonyname, path)
+        self.memo.count()
+        return None
+
+    def __memo_file(self, path):
+        # a path relative to the memo label -> (label, filename) of the file API
+        directory, filename = path.rsplit("/", 1)
+        return self.memo.label + "/" + directory, filename
+
+    def __memo_download(self, colonyname, path, prvkey):
+        label, filename = self.__memo_file(path)
+        try:
+            files = self.get_file(colonyname, prvkey, label=label, filename=filename)
+        except ColoniesNotFoundError:
+            return None
+        if len(files) == 0:
+            return None
+        entry = self.serializer.loads(self.download_data(colonyname, prvkey, fileid=files[0]["fileid"]))
+        if time.time() - entry["stored"] > self.memo.ttl:
+            return None
+        self.memo.put(colonyname, path, entry)
+        return entry
+
+    def __memo_store(self, colonyname, path, entry, prvkey):
+        entry = dict(entry, stored=time.time())
+        self.memo.put(colonyname, path, entry)
+        label, filename = self.__memo_file(path)
+        try:
+            self.upload_data(colonyname, prvkey, filename=filename, data=self.serializer.dumps(entry), label=label)
+        except Exception:
+            # storing is best effort, the result is still cached by this client
+            pass
+
+    def invalidate_results(self, colonyname, prvkey, spec=None, funcname=None, workflows=False):
+        """Remove memoized results, see the memo parameter of the client.
+
+        Args:
+            colonyname: Name of the colony
+            prvkey: Private key for authentication
+            spec: FuncSpec or serialized spec whose result is removed
+            funcname: Remove the results of the function with exactly this name
+            workflows: Remove the results of all workflows; all results are
+                       removed if neither spec, funcname nor workflows is given
+
+        Returns:
+            Number of stored results removed
+        """
+        if spec is not None:
+            paths = [self.memo.path(spec if isinstance(spec, dict) else spec.model_dump(by_alias=True))]
+        else:
+            if funcname is not None:
+                directories = ["functions/" + funcname]
+            elif workflows:
+                directories = ["workflows"]
+            else:
+                prefix = self.memo.label + "/"
+                directories = [label["name"][len(prefix):]
+                               for label in self.get_file_labels(colonyname, prvkey, name=prefix) or []]
+            paths = [directory + "/" + filename for directory in directories
+                     for filename in self.get_files(self.memo.label + "/" + directory, colonyname, prvkey) or []]
+        removed = 0
+        for path in paths:
+            self.memo.remove(colonyname, path)
+            label, filename = self.__memo_file(path)
+            try:
+                self.delete_file(colonyname, prvkey, label=label, filename=filename)
+                removed += 1
+            except ColoniesNotFoundError:
+                pass
+        if spec is None:
+            self.memo.remove(colonyname, funcname=funcname, workflows=workflows)
+        return removed
+
+    def __offload_payload(self, processid, values, prvkey, colonyname):
+        if self.codec is not None and values and not has_blobs(values):
+            values = encode_values(values, self.codec)
+        if self.offload_threshold is None or not values:
+            return values
+
+        data = self.serializer.dumps(values)
+        if len(data) <= self.offload_threshold:
+            return values
+
+        if colonyname is None:
+            colonyname = self.get_process(processid, prvkey).spec.conditions.colonyname
+        f = self.upload_data(colonyname, prvkey, filename=processid + ".json", data=data, label=self.offload_label)
+        self.payload_cache.put(f["fileid"], values, len(data))
+        return [make_ref(colonyname, f["fileid"], len(data))]
+
+    def __resolve_payload(self, values, prvkey):
+        def fetch(ref):
+            values = self.payload_cache.get(ref["fileid"])
+            if values is None:
+                data = self.download_data(ref["colonyname"], prvkey, fileid=ref["fileid"])
+                values = self.serializer.loads(data)
+                self.payload_cache.put(ref["fileid"], values, len(data))
+            return values
+
+        # blobs are only decoded with the codec this client was created with
+        return decode_values(resolve_refs(values, fetch), [self.codec] if self.codec is not None else None)
+
+    def publish_code(self, spec, prvkey):
+        """Move the code of a function spec to the code registry.
+
+        The source is uploaded through the file API, named by its SHA-256, the
+        first time it is seen, and the returned spec carries only the hash in
+        env["code_sha256"]. Executors get the source back with get_code.
+        Clients created with code_registry=True do this on every submit.
+
+        Args:
+            spec: FuncSpec, or a spec serialized with FuncSpecTemplate.dump
+            prvkey: Private key for authentication
+
+        Returns:
+            The serialized spec without the code
+        """
+        spec = spec if isinstance(spec, dict) else spec.model_dump(by_alias=True)
+        env = spec.get("env") or {}
+        code_base64 = env.get("code")
+        if code_base64 is None:
+            return spec
+
+        colonyname = spec["conditions"]["colonyname"]
+        with self.code_lock:
+            digest = self.code_hashes.get(code_base64)
+            published = (colonyname, digest) in self.published_code
+        if digest is None or not published:
+            source = base64.b64decode(code_base64)
+            digest = hashlib.sha256(source).hexdigest()
+            try:
+                uploaded = len(self.get_file(colonyname, prvkey, label=self.code_label, filename=digest)) > 0
+            except ColoniesNotFoundError:
+                uploaded = False
+            if not uploaded:
+                self.upload_data(colonyname, prvkey, filename=digest, data=source, label=self.code_label)
+            self.code_cache.put(digest, source.decode("utf-8"), len(source))
+            with self.code_lock:
+                if len(self.code_hashes) >= 4096:
+                    self.code_hashes.clear()
+                self.code_hashes[code_base64] = digest
+                self.published_code.add((colonyname, digest))
+
+        env = {key: value for key, value in env.items() if key != "code"}
+        env["code_sha256"] = digest
+        spec = dict(spec)
+        spec["env"] = env
+        return spec
+
+    def get_code(self, spec: FuncSpec, prvkey):
+        """Return the source code of a function spec, or None if it has no code.
+
+        Code moved to the code registry is downloaded once per hash, checked
+        against the hash and cached.
+
+        Args:
+            spec: FuncSpec of an assigned process
+            prvkey: Private key for authentication
+
+        Raises:
+            ColoniesError: The downloaded code does not match its hash
+        """
+        if "code" in spec.env:
+            return base64.b64decode(spec.env["code"]).decode("utf-8")
+        digest = spec.env.get("code_sha256")
+        if digest is None:
+            return None
+
+        source = self.code_cache.get(digest)
+        if source is None:
+            data = self.download_data(spec.conditions.colonyname, prvkey, label=self.code_label, filename=digest)
+            if hashlib.sha256(data).hexdigest() != digest:
+                raise ColoniesError("code " + digest + " does not match its hash")
+            source = data.decode("utf-8")
+            self.code_cache.put(digest, source, len(data))
+        return source
+
+    def close(self, processid, output, prvkey, colonyname=None):
+        """Close a process as successful.
+
+        Args:
+            processid: ID of the process
+            output: List of output values
+            prvkey: Private key for authentication
+            colonyname: Colony of the process, only used when the output is
+                        offloaded; looked up with get_process if not given
+        """
         msg = {
             "msgtype": "closesuccessfulmsg",
             "processid": processid,
-            "out": output
+            "out": self.__offload_payload(processid, output, prvkey, colonyname)
         }
 
         return self.__rpc(msg, prvkey)
@@ -325,11 +1264,11 @@ class Colonies:
 
         return self.__rpc(msg, prvkey)
     
-    def set_output(self, processid, arr, prvkey):
+    def set_output(self, processid, arr, prvkey, colonyname=None):
         msg = {
             "msgtype": "setoutputmsg",
             "processid": processid,
-            "out": arr 
+            "out": self.__offload_payload(processid, arr, prvkey, colonyname)
         }
 
         return self.__rpc(msg, prvkey)
@@ -390,6 +1329,26 @@ class Colonies:
             msg["state"] = state
         return self.__rpc(msg, prvkey)
 
+    def iter_processgraphs(self, colonyname, prvkey, state=None, page_size=100):
+        """Iterate over all process graphs in a colony.
+
+        Process graphs have no server-side offset either, so this costs
+        about N * N / (2 * page_size) transferred graphs for N graphs and
+        the last request holds all of them, see offset_pages.
+
+        Args:
+            colonyname: Name of the colony
+            prvkey: Private key for authentication
+            state: Optional state filter (0=waiting, 1=running, 2=success, 3=failed)
+            page_size: Number of process graphs fetched per request
+
+        Yields:
+            Process graph dicts, the next page being fetched in the background
+        """
+        list_fn = lambda count: self.get_processgraphs(colonyname, count, prvkey, state=state)
+        fetch, advance = offset_pages(list_fn, page_size)
+        return iter_pages(fetch, 0, advance)
+
     def remove_processgraph(self, processgraphid, prvkey):
         """Remove a process graph (workflow).
 
@@ -565,6 +1524,92 @@ class Colonies:
         }
         return self.__rpc(msg, prvkey)
 
+    def iter_process_log(self, colonyname, processid, prvkey, since=-1, page_size=100):
+        """Iterate over the logs of a process, one page at a time.
+
+        Args:
+            colonyname: Name of the colony
+            processid: ID of the process
+            prvkey: Private key for authentication
+            since: Only return log entries with a timestamp after since
+            page_size: Number of log entries fetched per request
+
+        Yields:
+            Log entries in timestamp order, the next page being fetched in the background
+        """
+        list_fn = lambda count, since: self.get_process_log(colonyname, processid, count, since, prvkey)
+        fetch, advance = since_pages(list_fn, page_size)
+        return iter_pages(fetch, (since, frozenset()), advance)
+
+    def iter_executor_log(self, colonyname, executorname, prvkey, since=-1, page_size=100):
+        """Iterate over the logs of an executor, one page at a time.
+
+        Args:
+            colonyname: Name of the colony
+            executorname: Name of the executor
+            prvkey: Private key for authentication
+            since: Only return log entries with a timestamp after since
+            page_size: Number of log entries fetched per request
+
+        Yields:
+            Log entries in timestamp order, the next page being fetched in the background
+        """
+        list_fn = lambda count, since: self.get_executor_log(colonyname, executorname, count, since, prvkey)
+        fetch, advance = since_pages(list_fn, page_size)
+        return iter_pages(fetch, (since, frozenset()), advance)
+
+    def tail_process_log(self, colonyname, processid, prvkey, follow=True, since=-1, page_size=100, poll_interval=0.1,
+                         max_poll_interval=5.0, timeout=None):
+        """Yield the log entries of a process, following new ones as they are added.
+
+        Args:
+            colonyname: Name of the colony
+            processid: ID of the process
+            prvkey: Private key for authentication
+            follow: If True, keep yielding new entries until the process has
+                    finished and its last entries have been read
+            since: Only return log entries with a timestamp after since
+            page_size: Number of log entries fetched per request
+            poll_interval: Seconds between polls while entries arrive
+            max_poll_interval: Maximum seconds between polls when the log is idle
+            timeout: Stop following after this many seconds
+
+        Yields:
+            Log entries in timestamp order
+        """
+        def finished():
+            try:
+                return self.get_process(processid, prvkey).state in (Colonies.SUCCESSFUL, Colonies.FAILED)
+            except ColoniesNotFoundError:
+                return True
+
+        list_fn = lambda count, since: self.get_process_log(colonyname, processid, count, since, prvkey)
+        return tail_pages(list_fn, since, page_size, follow=follow, finished=finished, poll_interval=poll_interval,
+                          max_poll_interval=max_poll_interval, timeout=timeout)
+
+    def tail_executor_log(self, colonyname, executorname, prvkey, follow=True, since=-1, page_size=100,
+                          poll_interval=0.1, max_poll_interval=5.0, timeout=None):
+        """Yield the log entries of an executor, following new ones as they are added.
+
+        Args:
+            colonyname: Name of the colony
+            executorname: Name of the executor
+            prvkey: Private key for authentication
+            follow: If True, keep yielding new entries until timeout expires
+                    or the generator is closed
+            since: Only return log entries with a timestamp after since
+            page_size: Number of log entries fetched per request
+            poll_interval: Seconds between polls while entries arrive
+            max_poll_interval: Maximum seconds between polls when the log is idle
+            timeout: Stop following after this many seconds
+
+        Yields:
+            Log entries in timestamp order
+        """
+        list_fn = lambda count, since: self.get_executor_log(colonyname, executorname, count, since, prvkey)
+        return tail_pages(list_fn, since, page_size, follow=follow, poll_interval=poll_interval,
+                          max_poll_interval=max_poll_interval, timeout=timeout)
+
     def sync(self, dir, label, keeplocal, colonyname, prvkey):
         libname = os.environ.get("CFSLIB")
         if libname == None:
@@ -626,6 +1671,25 @@ class Colonies:
                 "count": count
             }
         return self.__rpc(msg, prvkey)
+
+    def iter_crons(self, colonyname, prvkey, page_size=100):
+        """Iterate over all crons in a colony.
+
+        Each page re-lists the crons before it, see offset_pages, so N crons
+        cost about N * N / (2 * page_size) transferred crons and the last
+        request holds all of them.
+
+        Args:
+            colonyname: Name of the colony
+            prvkey: Private key for authentication
+            page_size: Number of crons fetched per request
+
+        Yields:
+            Cron dicts, the next page being fetched in the background
+        """
+        list_fn = lambda count: self.get_crons(colonyname, count, prvkey)
+        fetch, advance = offset_pages(list_fn, page_size)
+        return iter_pages(fetch, 0, advance)
     
     def del_cron(self, cronid, prvkey):
         msg = {
@@ -670,6 +1734,25 @@ class Colonies:
         }
         return self.__rpc(msg, prvkey)
 
+    def iter_generators(self, colonyname, prvkey, page_size=100):
+        """Iterate over all generators in a colony.
+
+        Each page re-lists the generators before it, see offset_pages, so N
+        generators cost about N * N / (2 * page_size) transferred generators
+        and the last request holds all of them.
+
+        Args:
+            colonyname: Name of the colony
+            prvkey: Private key for authentication
+            page_size: Number of generators fetched per request
+
+        Yields:
+            Generator dicts, the next page being fetched in the background
+        """
+        list_fn = lambda count: self.get_generators(colonyname, prvkey, count=count)
+        fetch, advance = offset_pages(list_fn, page_size)
+        return iter_pages(fetch, 0, advance)
+
     def get_generator(self, generatorid, prvkey):
         """Get a specific generator by ID.
 
@@ -1206,36 +2289,21 @@ class Colonies:
             "msgtype": "subscribechannelmsg"
         }
 
-        rpcmsg = {
-            "payloadtype": msg["msgtype"],
-            "payload": "",
-            "signature": ""
-        }
-
-        rpcmsg["payload"] = str(base64.b64encode(json.dumps(msg).encode('utf-8')), "utf-8")
-        crypto = Crypto()
-        rpcmsg["signature"] = crypto.sign(rpcmsg["payload"], prvkey)
-
-        if self.tls:
-            ws = create_connection("wss://" + self.host + ":" + str(self.port) + "/pubsub")
-        else:
-            ws = create_connection("ws://" + self.host + ":" + str(self.port) + "/pubsub")
-
-        ws.send(json.dumps(rpcmsg))
+        ws = self.__subscribe(msg, prvkey)
 
         all_entries = []
         try:
             while True:
                 data = ws.recv()
-                reply_msg = json.loads(data)
+                reply_msg = self.serializer.loads(data)
 
                 if reply_msg.get("error"):
                     payload_bytes = base64.b64decode(reply_msg["payload"])
-                    error_msg = json.loads(payload_bytes)
-                    raise ColoniesError(error_msg.get("message", "Channel subscription error"))
+                    error_msg = self.serializer.loads(payload_bytes)
+                    raise error_from_reply(error_msg.get("status"), error_msg.get("message", "Channel subscription error"), "subscribechannelmsg")
 
                 payload_bytes = base64.b64decode(reply_msg["payload"])
-                entries = json.loads(payload_bytes)
+                entries = self.serializer.loads(payload_bytes)
 
                 # Decode payloads in entries - could be array of ints or base64 string
                 if entries:
@@ -1472,3 +2540,8 @@ class Colonies:
         if limit is not None:
             msg["limit"] = limit
         return self.__rpc(msg, prvkey)
+
+    def apply_blueprints(self, manifests, prvkey, concurrency=8, informer=None):
+        """Create or update the blueprints whose manifests changed, see blueprints.apply_blueprints."""
+        import blueprints
+        return blueprints.apply_blueprints(self, manifests, prvkey, concurrency=concurrency, informer=informer)
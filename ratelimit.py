@@ -0,0 +1,239 @@
+import threading
+import time
+
+from errors import ColoniesConnectionError, ColoniesRateLimitError, ColoniesServerError, ColoniesTimeoutError
+
+# Replies meaning the server is overloaded
+OVERLOAD_STATUS = {429, 503, 504}
+
+class TokenBucket:
+    """Token bucket refilled with rate tokens per second, holding at most burst tokens.
+
+    A caller finding the bucket empty reserves the next tokens and sleeps
+    until they have been refilled, so waiting callers are served in the
+    order they arrived and the rate is never exceeded.
+
+    Args:
+        rate: Tokens added per second
+        burst: Size of the bucket, defaults to one second worth of tokens
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = float(burst) if burst is not None else max(1.0, self.rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def __refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, tokens=1, max_wait=None):
+        """Take tokens and return the seconds to wait before using them.
+
+        Returns:
+            The wait in seconds, or None without taking any tokens if the
+            wait would be longer than max_wait
+        """
+        with self.lock:
+            self.__refill(time.monotonic())
+            wait = 0.0 if self.tokens >= tokens else (tokens - self.tokens) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self.tokens -= tokens
+            return wait
+
+    def acquire(self, tokens=1, timeout=None):
+        """Wait until tokens are available and take them.
+
+        Returns:
+            False if they would not be available within timeout seconds
+        """
+        wait = self.reserve(tokens, timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.__refill(time.monotonic())
+            self.rate = float(rate)
+
+class RateLimiter:
+    """Pre RPC hook limiting the calls of a client per msgtype.
+
+    Usage:
+        limiter = RateLimiter({"submitfuncspecmsg": 100})
+        limiter.attach(colonies)
+
+    Calls over the rate wait on the calling thread before they are sent.
+    With a timeout, calls that would wait longer are rejected instead, which
+    keeps latency bounded when a batch job submits faster than the server
+    can take.
+
+    Args:
+        rates: {msgtype: calls per second}, other msgtypes are not limited
+        burst: Calls allowed at once after an idle period, per msgtype,
+               defaults to one second worth of calls
+        timeout: Maximum seconds a call waits, None to wait as long as needed
+
+    Raises:
+        ColoniesRateLimitError: From the limited call, if it would have to
+                                wait longer than timeout
+    """
+
+    def __init__(self, rates, burst=None, timeout=None):
+        self.timeout = timeout
+        self.buckets = {msgtype: TokenBucket(rate, burst) for msgtype, rate in rates.items()}
+        self.counters = {msgtype: {"calls": 0, "throttled": 0, "rejected": 0, "waited": 0.0} for msgtype in rates}
+        self.colonies = None
+        self.lock = threading.Lock()
+
+    def attach(self, colonies):
+        """Register the limiter with the RPC hooks of a client."""
+        self.colonies = colonies
+        colonies.add_rpc_hook(pre=self)
+
+    def detach(self):
+        self.colonies.remove_rpc_hook(pre=self)
+        self.colonies = None
+
+    def __call__(self, event):
+        bucket = self.buckets.get(event.msgtype)
+        if bucket is None:
+            return
+        wait = bucket.reserve(1, self.timeout)
+        with self.lock:
+            counters = self.counters[event.msgtype]
+            counters["calls"] += 1
+            if wait is None:
+                counters["rejected"] += 1
+            elif wait > 0:
+                counters["throttled"] += 1
+                counters["waited"] += wait
+        if wait is None:
+            raise ColoniesRateLimitError("rate limit of " + event.msgtype + " exceeded", msgtype=event.msgtype)
+        if wait > 0:
+            time.sleep(wait)
+
+    def rate(self, msgtype):
+        """Return the current rate of a msgtype in calls per second, or None if it is not limited."""
+        bucket = self.buckets.get(msgtype)
+        return None if bucket is None else bucket.rate
+
+    def stats(self):
+        """Return {msgtype: {"rate", "calls", "throttled", "rejected", "waited"}} of the limited msgtypes."""
+        with self.lock:
+            return {msgtype: dict(counters, rate=self.buckets[msgtype].rate)
+                    for msgtype, counters in self.counters.items()}
+
+class AdaptiveRateLimiter(RateLimiter):
+    """RateLimiter lowering its rates while the server is saturated.
+
+    At most every interval seconds the limiter reads the number of waiting
+    processes with stats(colonyname) and looks at the latency of the
+    limited calls and at overload replies since the last check. If the
+    queue is longer than max_queue, the latency above target_latency or the
+    server replied overloaded, all rates are multiplied by decrease.
+    Otherwise they grow by increase times their maximum, up to the rates
+    given. Backing off early keeps the server's queue short, so throughput
+    stays high instead of collapsing under the load.
+
+    Args:
+        rates: {msgtype: maximum calls per second}
+        colonyname: Colony whose queue is watched
+        prvkey: Private key used to read the colony stats
+        max_queue: Number of waiting processes above which the server counts
+                   as saturated, None to ignore the queue
+        target_latency: Network latency in seconds of the limited calls above
+                        which the server counts as saturated, None to ignore it
+        interval: Seconds between adjustments
+        decrease: Factor applied to the rates when saturated
+        increase: Fraction of the maximum rates added otherwise
+        min_ratio: Lowest rate as a fraction of the maximum rate
+        **kwargs: Passed on to RateLimiter
+    """
+
+    def __init__(self, rates, colonyname, prvkey, max_queue=1000, target_latency=0.5, interval=5.0, decrease=0.5,
+                 increase=0.1, min_ratio=0.05, **kwargs):
+        super().__init__(rates, **kwargs)
+        self.max_rates = dict(rates)
+        self.colonyname = colonyname
+        self.prvkey = prvkey
+        self.max_queue = max_queue
+        self.target_latency = target_latency
+        self.interval = interval
+        self.decrease = decrease
+        self.increase = increase
+        self.min_ratio = min_ratio
+        self.queue_depth = None
+        self.latency = None
+        self.overloaded = 0
+        self.saturated = False
+        self.adjusted = time.monotonic()
+        self.adjust_lock = threading.Lock()
+
+    def attach(self, colonies):
+        self.colonies = colonies
+        colonies.add_rpc_hook(pre=self, post=self.observe)
+
+    def detach(self):
+        self.colonies.remove_rpc_hook(pre=self, post=self.observe)
+        self.colonies = None
+
+    def observe(self, event):
+        """Post hook recording the latency and overload replies of the limited calls."""
+        if event.msgtype not in self.buckets:
+            return
+        with self.lock:
+            if event.error is not None:
+                if isinstance(event.error, (ColoniesServerError, ColoniesTimeoutError)) or \
+                        event.status_code in OVERLOAD_STATUS:
+                    self.overloaded += 1
+                return
+            if self.latency is None:
+                self.latency = event.network
+            else:
+                self.latency = 0.8 * self.latency + 0.2 * event.network
+
+    def __call__(self, event):
+        if event.msgtype in self.buckets and time.monotonic() - self.adjusted >= self.interval:
+            # one caller adjusts, the others go on with the current rates;
+            # the stats call below comes back through this hook and skips too
+            if self.adjust_lock.acquire(blocking=False):
+                try:
+                    self.adjusted = time.monotonic()
+                    self.adjust()
+                finally:
+                    self.adjust_lock.release()
+        super().__call__(event)
+
+    def adjust(self):
+        """Read the queue depth and lower or raise the rates."""
+        if self.max_queue is not None and self.colonies is not None:
+            try:
+                self.queue_depth = self.colonies.stats(self.colonyname, self.prvkey).get("waitingprocesses")
+            except ColoniesConnectionError:
+                self.queue_depth = None
+
+        with self.lock:
+            saturated = self.overloaded > 0
+            if self.max_queue is not None and self.queue_depth is not None and self.queue_depth > self.max_queue:
+                saturated = True
+            if self.target_latency is not None and self.latency is not None and self.latency > self.target_latency:
+                saturated = True
+            self.overloaded = 0
+            self.saturated = saturated
+
+        for msgtype, bucket in self.buckets.items():
+            max_rate = self.max_rates[msgtype]
+            if saturated:
+                rate = max(max_rate * self.min_ratio, bucket.rate * self.decrease)
+            else:
+                rate = min(max_rate, bucket.rate + max_rate * self.increase)
+            bucket.set_rate(rate)
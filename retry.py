@@ -0,0 +1,94 @@
+import random
+import threading
+
+from errors import ColoniesRateLimitError, ColoniesTimeoutError, ColoniesTransportError
+
+# Messages that only read state, so repeating them cannot change anything on
+# the server even if the first attempt reached it.
+IDEMPOTENT_MSGTYPES = {
+    "getcoloniesmsg", "getcolonymsg", "getcolonystatsmsg",
+    "getexecutorsmsg", "getexecutormsg", "getfunctionsmsg",
+    "getprocessmsg", "getprocessesmsg", "getprocessgraphmsg", "getprocessgraphsmsg",
+    "getattributemsg", "getlogsmsg", "channelreadmsg",
+    "getfilemsg", "getfilesmsg", "getfilelabelsmsg", "getsnapshotmsg", "getsnapshotsmsg",
+    "getcronmsg", "getcronsmsg", "getgeneratormsg", "getgeneratorsmsg", "getusersmsg",
+    "getblueprintdefinitionmsg", "getblueprintdefinitionsmsg", "getblueprintmsg", "getblueprintsmsg",
+    "getblueprinthistorymsg",
+}
+
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+class RetryBudget:
+    """Token bucket limiting retries to a fraction of the traffic.
+
+    Every failed attempt takes a token and every successful call gives back
+    ratio tokens. Retries are only allowed while more than half of the
+    tokens are left, so when the server is struggling the client falls back
+    to roughly one retry per 1/ratio successful calls instead of multiplying
+    the load.
+
+    Args:
+        max_tokens: Size of the bucket
+        ratio: Tokens returned per successful call
+    """
+
+    def __init__(self, max_tokens=10, ratio=0.1):
+        self.max_tokens = max_tokens
+        self.ratio = ratio
+        self.tokens = max_tokens
+        self.lock = threading.Lock()
+
+    def success(self):
+        with self.lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def failure(self):
+        """Record a failed attempt and return True if it may be retried."""
+        with self.lock:
+            self.tokens = max(0, self.tokens - 1)
+            return self.tokens > self.max_tokens / 2
+
+class RetryPolicy:
+    """Decides which failed RPC calls are retried and how long to wait in between.
+
+    Calls that failed before a connection was established are always safe to
+    retry. Other transport failures, timeouts and 429/502/503/504 replies are
+    only retried for idempotent messages. Delays use full jitter: a random
+    time between zero and an exponentially growing cap.
+
+    Args:
+        max_attempts: Maximum number of attempts per call, including the first
+        base_delay: Cap of the first delay in seconds
+        max_delay: Maximum cap of the delay in seconds
+        budget: RetryBudget shared by all calls of a client, None for no budget
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.05, max_delay=2.0, budget=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = RetryBudget() if budget is None else budget
+
+    def retryable(self, msgtype, err):
+        if isinstance(err, ColoniesRateLimitError):
+            # a local decision, retrying would only spend the budget
+            return False
+        if isinstance(err, ColoniesTransportError) and err.connect_failed:
+            return True
+        if msgtype not in IDEMPOTENT_MSGTYPES:
+            return False
+        return isinstance(err, (ColoniesTransportError, ColoniesTimeoutError)) or err.status in RETRYABLE_STATUS
+
+    def should_retry(self, msgtype, err, attempt):
+        """Return True if a call that failed with err on the given attempt (0-based) should be retried."""
+        if not self.retryable(msgtype, err):
+            return False
+        if not self.budget.failure():
+            return False
+        return attempt + 1 < self.max_attempts
+
+    def success(self):
+        self.budget.success()
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
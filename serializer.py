@@ -0,0 +1,93 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+class Serializer:
+    """JSON encoder/decoder used for the RPC envelope and payload.
+
+    dumps returns UTF-8 encoded bytes, which is what both base64 and the HTTP
+    body need, and loads accepts bytes or str, so no str/bytes conversions
+    are needed around the calls.
+    """
+    name = ""
+
+    def dumps(self, obj) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data):
+        raise NotImplementedError
+
+class StdlibSerializer(Serializer):
+    name = "json"
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+class UjsonSerializer(Serializer):
+    name = "ujson"
+
+    def dumps(self, obj) -> bytes:
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode("utf-8")
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+class OrjsonSerializer(Serializer):
+    name = "orjson"
+
+    def dumps(self, obj) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+def available_serializers():
+    """Return the names of the JSON backends that can be used, fastest first."""
+    names = []
+    if orjson is not None:
+        names.append(OrjsonSerializer.name)
+    if ujson is not None:
+        names.append(UjsonSerializer.name)
+    names.append(StdlibSerializer.name)
+    return names
+
+def get_serializer(name=None) -> Serializer:
+    """Return a serializer for the given backend.
+
+    Args:
+        name: "orjson", "ujson" or "json". If None, the PYCOLONIES_JSON
+              environment variable is used, and if that is not set either,
+              the fastest installed backend is selected.
+
+    Returns:
+        A Serializer instance
+    """
+    if name is None:
+        name = os.getenv("PYCOLONIES_JSON")
+    if name is None:
+        name = available_serializers()[0]
+
+    if name == OrjsonSerializer.name:
+        if orjson is None:
+            raise ValueError("orjson is not installed")
+        return OrjsonSerializer()
+    elif name == UjsonSerializer.name:
+        if ujson is None:
+            raise ValueError("ujson is not installed")
+        return UjsonSerializer()
+    elif name == StdlibSerializer.name:
+        return StdlibSerializer()
+    else:
+        raise ValueError("unknown JSON backend: " + name)
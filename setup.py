@@ -10,7 +10,7 @@ setuptools.setup(
     author_email="johan.kristiansson@ri.se",
     description="Colonies Python SDK",
     long_description=long_description,
-    py_modules=["pycolonies", "crypto", "cfs", "model"],
+    py_modules=["pycolonies", "crypto", "cfs", "model", "serializer", "offload", "mockserver", "instrumentation", "errors", "retry", "executor", "logs", "fanout", "codec", "memo", "ratelimit", "blueprints"],
     long_description_content_type="text/markdown",
     url="https://github.com/colonyos/pycolonies",
     packages=setuptools.find_packages(),
@@ -0,0 +1,334 @@
+import unittest
+import sys
+import os
+import threading
+import time
+import json
+import tempfile
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycolonies import Colonies
+from blueprints import BlueprintInformer, Reconciler, blueprint_hash, load_manifests
+from mock_testcase import MockServerTestCase
+
+
+class BlueprintTestCase(MockServerTestCase):
+    colony_prefix = "blueprints"
+
+    def setUp(self):
+        super().setUp()
+        self.prvkey = self.crypto.prvkey()
+        for kind in ("HomeDevice", "Container"):
+            definition = {"kind": kind, "metadata": {"name": kind.lower() + "-def", "colonyname": self.colonyname},
+                          "spec": {"names": {"kind": kind}}}
+            self.colonies.add_blueprint_definition(definition, self.prvkey)
+        self.rpcs = []
+        self.colonies.add_rpc_hook(pre=lambda event: self.rpcs.append(event.msgtype))
+
+    def blueprint(self, name, kind="HomeDevice", location="", **spec):
+        return {
+            "kind": kind,
+            "metadata": {"name": name, "colonyname": self.colonyname, "locationname": location},
+            "handler": {"executortype": "home-reconciler"},
+            "spec": spec,
+        }
+
+
+class TestMockBlueprints(BlueprintTestCase):
+    def test_generation(self):
+        blueprint = self.blueprint("light", power=True)
+        self.assertEqual(self.colonies.add_blueprint(blueprint, self.prvkey)["metadata"]["generation"], 1)
+        # unchanged spec
+        self.assertEqual(self.colonies.update_blueprint(blueprint, self.prvkey)["metadata"]["generation"], 1)
+        blueprint["spec"]["power"] = False
+        updated = self.colonies.update_blueprint(blueprint, self.prvkey)
+        self.assertEqual(updated["metadata"]["generation"], 2)
+        self.assertEqual(self.colonies.update_blueprint(blueprint, self.prvkey, force_generation=True)
+                         ["metadata"]["generation"], 3)
+
+        self.colonies.update_blueprint_status(self.colonyname, "light", {"power": False}, self.prvkey)
+        current = self.colonies.get_blueprint(self.colonyname, "light", self.prvkey)
+        self.assertEqual(current["status"], {"power": False})
+        self.assertEqual(current["metadata"]["generation"], 3)
+
+        history = self.colonies.get_blueprint_history(updated["blueprintid"], self.prvkey, limit=2)
+        self.assertEqual([entry["generation"] for entry in history], [3, 2])
+
+        # each spec change submitted a reconcile process for the handler
+        processes = self.colonies.list_processes(self.colonyname, 10, 0, self.prvkey)
+        self.assertEqual(len(processes), 3)
+        spec = processes[0]["spec"]
+        self.assertEqual(spec["funcname"], "reconcile")
+        self.assertEqual(spec["kwargs"]["blueprintname"], "light")
+        self.assertEqual(spec["conditions"]["executortype"], "home-reconciler")
+
+    def test_filters(self):
+        self.colonies.add_blueprint(self.blueprint("light", location="home"), self.prvkey)
+        self.colonies.add_blueprint(self.blueprint("web", kind="Container", location="dc"), self.prvkey)
+        self.assertEqual(len(self.colonies.get_blueprints(self.colonyname, self.prvkey)), 2)
+        self.assertEqual([bp["metadata"]["name"] for bp in
+                          self.colonies.get_blueprints(self.colonyname, self.prvkey, kind="Container")], ["web"])
+        self.assertEqual([bp["metadata"]["name"] for bp in
+                          self.colonies.get_blueprints(self.colonyname, self.prvkey, location="home")], ["light"])
+        with self.assertRaises(Exception):
+            self.colonies.add_blueprint(self.blueprint("x", kind="Unknown"), self.prvkey)
+
+
+class TestBlueprintInformer(BlueprintTestCase):
+    def informer(self, **kwargs):
+        informer = BlueprintInformer(self.colonies, self.colonyname, self.prvkey, resync_interval=None, **kwargs)
+        self.events = []
+        informer.add_handler(on_add=lambda bp: self.events.append(("add", bp["metadata"]["name"])),
+                             on_update=lambda old, new: self.events.append(
+                                 ("update", new["metadata"]["name"], old["metadata"]["generation"],
+                                  new["metadata"]["generation"])),
+                             on_delete=lambda bp: self.events.append(("delete", bp["metadata"]["name"])))
+        return informer.start()
+
+    def test_resync(self):
+        light = self.blueprint("light", location="home", power=True)
+        self.colonies.add_blueprint(light, self.prvkey)
+        self.colonies.add_blueprint(self.blueprint("thermostat", location="home", temp=20), self.prvkey)
+        self.colonies.add_blueprint(self.blueprint("web", kind="Container", location="dc"), self.prvkey)
+        informer = self.informer()
+        self.assertEqual(sorted(self.events), [("add", "light"), ("add", "thermostat"), ("add", "web")])
+        self.assertEqual(len(informer), 3)
+
+        self.events.clear()
+        self.colonies.update_blueprint_status(self.colonyname, "thermostat", {"temp": 19}, self.prvkey)
+        light["spec"]["power"] = False
+        self.colonies.update_blueprint(light, self.prvkey)
+        self.colonies.remove_blueprint(self.colonyname, "web", self.prvkey)
+        self.rpcs.clear()
+        informer.resync()
+        self.assertEqual(self.rpcs, ["getblueprintsmsg"])
+        # the status change did not bump the generation, but is cached
+        self.assertEqual(sorted(self.events), [("delete", "web"), ("update", "light", 1, 2)])
+        self.assertEqual(informer.get("thermostat")["status"], {"temp": 19})
+
+        self.assertEqual([bp["metadata"]["name"] for bp in informer.list(kind="HomeDevice", location="home")],
+                         ["light", "thermostat"])
+        self.assertEqual(informer.list(kind="Container"), [])
+        self.assertIsNone(informer.get("web"))
+
+    def test_refresh(self):
+        light = self.blueprint("light", power=True)
+        self.colonies.add_blueprint(light, self.prvkey)
+        informer = self.informer()
+        self.events.clear()
+
+        self.assertIsNotNone(informer.refresh("light"))
+        self.assertEqual(self.events, [])
+        for brightness in (10, 20, 30):
+            light["spec"]["brightness"] = brightness
+            self.colonies.update_blueprint(light, self.prvkey)
+        informer.refresh("light")
+        self.assertEqual(self.events, [("update", "light", 1, 4)])
+        self.assertEqual([entry["spec"]["brightness"] for entry in informer.history("light", since=1)],
+                         [10, 20, 30])
+
+        self.colonies.remove_blueprint(self.colonyname, "light", self.prvkey)
+        self.assertIsNone(informer.refresh("light"))
+        self.assertEqual(self.events[-1], ("delete", "light"))
+
+    def test_kind_filter(self):
+        self.colonies.add_blueprint(self.blueprint("light"), self.prvkey)
+        self.colonies.add_blueprint(self.blueprint("web", kind="Container"), self.prvkey)
+        informer = self.informer(kind="Container")
+        self.assertEqual(self.events, [("add", "web")])
+        self.assertIsNone(informer.refresh("light"))
+        self.assertEqual(len(informer), 1)
+
+
+class TestReconciler(BlueprintTestCase):
+    def setUp(self):
+        super().setUp()
+        self.calls = []
+        self.deleted = []
+
+    def handler(self, blueprint):
+        self.calls.append((blueprint["metadata"]["name"], blueprint["metadata"]["generation"]))
+        return {"synced": True, "power": blueprint["spec"].get("power")}
+
+    def reconciler(self, handler=None, **kwargs):
+        reconciler = Reconciler(self.colonies, self.colonyname, self.prvkey, handler or self.handler,
+                                on_delete=self.deleted.append, assign_timeout=0.2, status_interval=60, **kwargs)
+        self.addCleanup(reconciler.stop)
+        return reconciler.start()
+
+    def wait_idle(self):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            stats = self.colonies.stats(self.colonyname, self.prvkey)
+            if stats["waitingprocesses"] + stats["runningprocesses"] == 0:
+                return
+            time.sleep(0.05)
+        self.fail("reconcile processes did not finish")
+
+    def test_reconcile(self):
+        for name in ("light", "heater", "fan"):
+            self.colonies.add_blueprint(self.blueprint(name, power=True), self.prvkey)
+        reconciler = self.reconciler(workers=2)
+        self.wait_idle()
+        self.assertEqual(sorted(self.calls), [("fan", 1), ("heater", 1), ("light", 1)])
+        processes = self.colonies.list_processes(self.colonyname, 10, Colonies.SUCCESSFUL, self.prvkey)
+        self.assertEqual(sorted(process["out"][0] for process in processes), ["reconciled"] * 3)
+
+        # statuses are written by the next flush
+        self.assertEqual(self.colonies.get_blueprint(self.colonyname, "light", self.prvkey).get("status"), {})
+        self.rpcs.clear()
+        reconciler.flush()
+        self.assertEqual(self.rpcs, ["updateblueprintstatusmsg"] * 3)
+        self.assertEqual(self.colonies.get_blueprint(self.colonyname, "light", self.prvkey)["status"],
+                         {"synced": True, "power": True})
+
+        # an unchanged status is not written again
+        self.colonies.reconcile_blueprint(self.colonyname, "light", self.prvkey, force=True)
+        self.wait_idle()
+        self.rpcs.clear()
+        reconciler.flush()
+        self.assertEqual(self.rpcs, [])
+        self.assertEqual(self.calls[-1], ("light", 1))
+
+        self.colonies.remove_blueprint(self.colonyname, "heater", self.prvkey)
+        self.wait_idle()
+        self.assertEqual(self.deleted, ["heater"])
+
+    def test_collapse(self):
+        light = self.blueprint("light", power=True)
+        self.colonies.add_blueprint(light, self.prvkey)
+        for brightness in range(5):
+            light["spec"]["brightness"] = brightness
+            self.colonies.update_blueprint(light, self.prvkey)
+        self.colonies.reconcile_blueprint(self.colonyname, "light", self.prvkey)
+        reconciler = self.reconciler(workers=4)
+        self.wait_idle()
+        # every run reads the latest generation, later runs find it reconciled
+        self.assertEqual(self.calls, [("light", 6)])
+        stats = reconciler.stats()
+        self.assertEqual(stats["processes"], 7)
+        self.assertEqual(stats["reconciled"], 1)
+        self.assertEqual(stats["pending"], 0)
+        processes = self.colonies.list_processes(self.colonyname, 10, Colonies.SUCCESSFUL, self.prvkey)
+        self.assertEqual(len(processes), 7)
+
+        # a forced reconcile runs the handler again
+        self.colonies.reconcile_blueprint(self.colonyname, "light", self.prvkey, force=True)
+        self.wait_idle()
+        self.assertEqual(self.calls, [("light", 6), ("light", 6)])
+
+    def test_serialized(self):
+        running = {}
+        overlaps = []
+        lock = threading.Lock()
+
+        def handler(blueprint):
+            name = blueprint["metadata"]["name"]
+            with lock:
+                running[name] = running.get(name, 0) + 1
+                overlaps.append(sum(running.values()))
+                if running[name] > 1:
+                    overlaps.append(-1)
+            time.sleep(0.05)
+            with lock:
+                running[name] -= 1
+            return None
+
+        blueprints = [self.blueprint("device-" + str(i), power=True) for i in range(4)]
+        for blueprint in blueprints:
+            self.colonies.add_blueprint(blueprint, self.prvkey)
+        reconciler = self.reconciler(handler, workers=3)
+        for blueprint in blueprints * 2:
+            blueprint["spec"]["power"] = not blueprint["spec"]["power"]
+            self.colonies.update_blueprint(blueprint, self.prvkey)
+        self.wait_idle()
+        self.assertNotIn(-1, overlaps)
+        self.assertLessEqual(max(overlaps), 3)
+        self.assertEqual(reconciler.stats()["failed"], 0)
+
+    def test_failure(self):
+        def handler(blueprint):
+            raise RuntimeError("device offline")
+
+        self.colonies.add_blueprint(self.blueprint("light", power=True), self.prvkey)
+        self.reconciler(handler)
+        self.wait_idle()
+        processes = self.colonies.list_processes(self.colonyname, 10, Colonies.FAILED, self.prvkey)
+        self.assertEqual(len(processes), 1)
+        self.assertEqual(processes[0]["errors"], ["device offline"])
+
+
+class TestApplyBlueprints(BlueprintTestCase):
+    def manifests(self, count, **spec):
+        return [self.blueprint("device-" + str(i), location="home", index=i, **spec) for i in range(count)]
+
+    def test_apply(self):
+        manifests = self.manifests(20, power=True)
+        report = self.colonies.apply_blueprints(manifests, self.prvkey, concurrency=4)
+        self.assertEqual(len(report["created"]), 20)
+        self.assertEqual(report["failed"], {})
+
+        self.rpcs.clear()
+        report = self.colonies.apply_blueprints(manifests, self.prvkey)
+        self.assertEqual(len(report["unchanged"]), 20)
+        self.assertEqual(self.rpcs, ["getblueprintsmsg"])
+
+        manifests[3]["spec"]["power"] = False
+        manifests[7]["handler"] = {"executortype": "other-reconciler"}
+        manifests.append(self.blueprint("device-new"))
+        self.rpcs.clear()
+        report = self.colonies.apply_blueprints(manifests, self.prvkey)
+        self.assertEqual(sorted(report["updated"]), ["device-3", "device-7"])
+        self.assertEqual(report["created"], ["device-new"])
+        self.assertEqual(len(report["unchanged"]), 18)
+        self.assertEqual(sorted(self.rpcs), ["addblueprintmsg", "getblueprintsmsg", "updateblueprintmsg",
+                                             "updateblueprintmsg"])
+        self.assertEqual(self.colonies.get_blueprint(self.colonyname, "device-3", self.prvkey)["metadata"]
+                         ["generation"], 2)
+
+    def test_informer(self):
+        manifests = self.manifests(3)
+        self.colonies.apply_blueprints(manifests, self.prvkey)
+        informer = BlueprintInformer(self.colonies, self.colonyname, self.prvkey, resync_interval=None).start()
+        self.rpcs.clear()
+        report = self.colonies.apply_blueprints(manifests, self.prvkey, informer=informer)
+        self.assertEqual(len(report["unchanged"]), 3)
+        self.assertEqual(self.rpcs, [])
+
+        # a stale cache falls back to an update when the add conflicts
+        self.colonies.add_blueprint(self.blueprint("late"), self.prvkey)
+        report = self.colonies.apply_blueprints([self.blueprint("late", power=True)], self.prvkey, informer=informer)
+        self.assertEqual(report["updated"], ["late"])
+
+    def test_failed(self):
+        report = self.colonies.apply_blueprints([self.blueprint("x", kind="Unknown"), self.blueprint("ok")],
+                                                self.prvkey)
+        self.assertEqual(report["created"], ["ok"])
+        self.assertEqual(list(report["failed"]), ["x"])
+        with self.assertRaises(ValueError):
+            self.colonies.apply_blueprints([self.blueprint("ok"), self.blueprint("ok")], self.prvkey)
+
+    def test_hash(self):
+        a = self.blueprint("light", power=True, mode="auto")
+        b = self.blueprint("light", mode="auto", power=True)
+        b["metadata"]["generation"] = 4
+        b["status"] = {"power": True}
+        self.assertEqual(blueprint_hash(a), blueprint_hash(b))
+        b["spec"]["power"] = False
+        self.assertNotEqual(blueprint_hash(a), blueprint_hash(b))
+
+    def test_load_manifests(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "a.json"), "w") as f:
+                json.dump(self.blueprint("a"), f)
+            with open(os.path.join(directory, "b.json"), "w") as f:
+                json.dump([self.blueprint("b"), self.blueprint("c")], f)
+            with open(os.path.join(directory, "README"), "w") as f:
+                f.write("not a manifest")
+            self.assertEqual([bp["metadata"]["name"] for bp in load_manifests(directory)], ["a", "b", "c"])
+
+
+if __name__ == '__main__':
+    unittest.main()
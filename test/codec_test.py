@@ -0,0 +1,140 @@
+import unittest
+import sys
+import os
+import pickle
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codec import (Codec, PickleCodec, available_codecs, get_codec, decode_values, encode_values, decode_kwargs,
+                   encode_kwargs, blob_codec, KWARGS_KEY)
+from pycolonies import Colonies, func_spec
+from executor import Executor
+from mock_testcase import MockServerTestCase
+
+
+class FakeMsgpack(Codec):
+    name = "msgpack"
+
+
+class Exploit:
+    def __reduce__(self):
+        return (exec, ("import builtins; builtins.exploited = True",))
+
+
+class TestCodec(unittest.TestCase):
+    def test_pickle_roundtrip(self):
+        codec = PickleCodec()
+        obj = {"series": [0.1, 0.2, 0.3], "name": "ndvi", "raw": b"\x00\x01", "nested": (1, [2, {"a": None}])}
+        self.assertEqual(codec.decode(codec.encode(obj)), obj)
+
+    def test_pickle_out_of_band(self):
+        codec = PickleCodec()
+        data = bytearray(range(256)) * 64
+        encoded = codec.encode([pickle.PickleBuffer(data)])
+        # the buffer is appended once instead of being copied into the pickle stream
+        self.assertLess(len(encoded), len(data) + 200)
+        decoded = codec.decode(encoded)
+        self.assertEqual(bytes(decoded[0]), bytes(data))
+
+    def test_get_codec(self):
+        self.assertIn("pickle", available_codecs())
+        self.assertEqual(get_codec("pickle").name, "pickle")
+        self.assertEqual(get_codec().name, available_codecs()[0])
+        with self.assertRaises(ValueError):
+            get_codec("xml")
+
+    def test_values(self):
+        values = [0.5, {"a": [1, 2]}, None]
+        encoded = encode_values(values, "pickle")
+        self.assertEqual(len(encoded), 1)
+        self.assertIsInstance(encoded[0], str)
+        self.assertEqual(blob_codec(encoded), "pickle")
+        self.assertEqual(decode_values(encoded, ["pickle"]), values)
+        # outputs of several parents concatenated into the input of a child
+        self.assertEqual(decode_values(["plain"] + encoded + [3], ["pickle"]), ["plain"] + values + [3])
+        self.assertEqual(decode_values(["a", 1], ["pickle"]), ["a", 1])
+
+    def test_allowed(self):
+        encoded = encode_values([1], "pickle")
+        # nothing is decoded unless the receiver chose a codec
+        self.assertEqual(decode_values(encoded, None), encoded)
+        self.assertEqual(decode_kwargs(encode_kwargs({"a": 1}, "pickle"), []), encode_kwargs({"a": 1}, "pickle"))
+        with self.assertRaises(ValueError):
+            decode_values(encoded, [FakeMsgpack()])
+
+    def test_kwargs(self):
+        kwargs = {"polygon": [[1.5, 2.5], [3.5, 4.5]], "time": 1700000000}
+        encoded = encode_kwargs(kwargs, "pickle")
+        self.assertEqual(list(encoded), [KWARGS_KEY])
+        self.assertEqual(decode_kwargs(encoded, ["pickle"]), kwargs)
+        self.assertEqual(decode_kwargs({"a": "b"}, ["pickle"]), {"a": "b"})
+
+    def test_func_spec(self):
+        spec = func_spec("calc_ts", [[0.1, 0.2]], "colony", "des-executor", kwargs={"polygon": [(1.0, 2.0)]},
+                         codec="pickle")
+        self.assertEqual(decode_values(spec.args, ["pickle"]), [[0.1, 0.2]])
+        self.assertEqual(decode_kwargs(spec.kwargs, ["pickle"]), {"polygon": [(1.0, 2.0)]})
+
+
+class TestCodecExecutor(MockServerTestCase):
+    colony_prefix = "codec"
+
+    def setUp(self):
+        super().setUp()
+        self.prvkey = self.crypto.prvkey()
+        self.executor = Executor(self.colonies, self.colonyname, "executor", "des-executor", self.prvkey,
+                                 colony_prvkey=self.colony_prvkey, assign_timeout=0.2, codec="pickle")
+        self.executor.register()
+
+        @self.executor.function()
+        def calc_ts(scale, polygon=None):
+            return {"ndvi": [scale * x for x, _ in polygon]}
+
+        self.executor.start()
+        self.addCleanup(self.executor.drain, 0)
+
+    def test_roundtrip(self):
+        spec = func_spec("calc_ts", [0.5], self.colonyname, "des-executor", kwargs={"polygon": [(1.0, 2.0), (3.0, 4.0)]},
+                         codec="pickle")
+        colonies = self.server.client(codec="pickle")
+        process = colonies.submit_func_spec(spec, self.prvkey)
+        process = colonies.wait(process, 5, self.prvkey)
+        self.assertEqual(process.state, Colonies.SUCCESSFUL)
+        self.assertEqual(process.output, [{"ndvi": [0.5, 1.5]}])
+
+    def test_client_codec(self):
+        self.executor.drain(0)
+        colonies = self.server.client(codec="pickle")
+        spec = func_spec("other", [], self.colonyname, "des-executor")
+        colonies.submit_func_spec(spec, self.prvkey)
+        process = colonies.assign(self.colonyname, 1, self.prvkey)
+        colonies.close(process.processid, [[0.1, 0.2], {"a": 1}], self.prvkey)
+        self.assertEqual(colonies.get_process(process.processid, self.prvkey).output, [[0.1, 0.2], {"a": 1}])
+        # a client without a codec leaves the blob alone
+        process = self.colonies.get_process(process.processid, self.prvkey)
+        self.assertEqual(blob_codec(process.output), "pickle")
+
+    def test_untrusted(self):
+        import builtins
+        self.addCleanup(lambda: builtins.__dict__.pop("exploited", None))
+        self.executor.drain(0)
+        executor = Executor(self.colonies, self.colonyname, "plain", "plain-executor", self.prvkey,
+                            handler=lambda process: process.spec.args, assign_timeout=0.2)
+        executor.start()
+        self.addCleanup(executor.drain, 0)
+
+        @executor.function()
+        def echo(value):
+            return value
+
+        blob = encode_values([Exploit()], "pickle")
+        spec = func_spec("echo", blob, self.colonyname, "plain-executor")
+        process = self.colonies.wait(self.colonies.submit_func_spec(spec, self.prvkey), 5, self.prvkey)
+        self.assertEqual(process.state, Colonies.SUCCESSFUL)
+        self.assertEqual(process.output, blob)
+        self.assertFalse(hasattr(builtins, "exploited"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,7 @@ import string
 import random
 import sys
 import os
+import time
 
 # Prioritize local source over installed package
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -225,6 +226,49 @@ class TestColonies(unittest.TestCase):
 
         self.colonies.del_colony(colonyname, self.server_prv)
 
+    def test_iter_processes(self):
+        _, _, colonyname, colony_prvkey = self.add_test_colony()
+        _, _, executorname, executor_prvkey = self.add_test_executor(
+            colonyname, colony_prvkey
+        )
+        self.colonies.approve_executor(colonyname, executorname, colony_prvkey)
+
+        submitted = set()
+        for _ in range(5):
+            submitted.add(self.submit_test_funcspec(colonyname, executor_prvkey).processid)
+
+        processes = self.colonies.iter_processes(
+            colonyname, Colonies.WAITING, executor_prvkey, page_size=2
+        )
+        self.assertEqual({process["processid"] for process in processes}, submitted)
+
+        self.colonies.del_colony(colonyname, self.server_prv)
+
+    def test_subscribe_processes(self):
+        _, _, colonyname, colony_prvkey = self.add_test_colony()
+        _, _, executorname, executor_prvkey = self.add_test_executor(
+            colonyname, colony_prvkey
+        )
+        self.colonies.approve_executor(colonyname, executorname, colony_prvkey)
+
+        with self.colonies.subscribe_processes(
+            colonyname, executor_prvkey, executortype="test-executor-type",
+            states=[Colonies.RUNNING, Colonies.SUCCESSFUL]
+        ) as sub:
+            time.sleep(0.5)
+            submitted_process = self.submit_test_funcspec(colonyname, executor_prvkey)
+            self.colonies.assign(colonyname, 10, executor_prvkey)
+            self.colonies.close(submitted_process.processid, [], executor_prvkey)
+
+            states = set()
+            while len(states) < 2:
+                process = sub.get(timeout=10)
+                self.assertIsNotNone(process)
+                self.assertEqual(process.processid, submitted_process.processid)
+                states.add(process.state)
+
+        self.colonies.del_colony(colonyname, self.server_prv)
+
     def test_get_process(self):
         _, _, colonyname, colony_prvkey = self.add_test_colony()
         _, _, executorname, executor_prvkey = self.add_test_executor(
@@ -297,6 +341,43 @@ class TestColonies(unittest.TestCase):
 
         self.colonies.del_colony(colonyname, self.server_prv)
 
+    def test_close_process_offload(self):
+        _, _, colonyname, colony_prvkey = self.add_test_colony()
+        _, _, executorname, executor_prvkey = self.add_test_executor(
+            colonyname, colony_prvkey
+        )
+        self.colonies.approve_executor(colonyname, executorname, colony_prvkey)
+
+        colonies = Colonies(test_colony_host, 50080, tls=False, native_crypto=False, offload_threshold=100)
+        submitted_process = self.submit_test_funcspec(colonyname, executor_prvkey)
+        colonies.assign(colonyname, 10, executor_prvkey)
+
+        output = ["result" + str(i) for i in range(100)]
+        colonies.close(submitted_process.processid, output, executor_prvkey, colonyname=colonyname)
+
+        process = self.colonies.get_process(submitted_process.processid, executor_prvkey)
+        self.assertEqual(process.output, output)
+
+        self.colonies.del_colony(colonyname, self.server_prv)
+
+    def test_wait_failed_process(self):
+        _, _, colonyname, colony_prvkey = self.add_test_colony()
+        _, _, executorname, executor_prvkey = self.add_test_executor(
+            colonyname, colony_prvkey
+        )
+        self.colonies.approve_executor(colonyname, executorname, colony_prvkey)
+
+        submitted_process = self.submit_test_funcspec(colonyname, executor_prvkey)
+        self.colonies.assign(colonyname, 10, executor_prvkey)
+        self.colonies.fail(submitted_process.processid, ["error"], executor_prvkey)
+
+        start = time.time()
+        process = self.colonies.wait(submitted_process, 30, executor_prvkey)
+        self.assertLess(time.time() - start, 10)
+        self.assertEqual(process.state, Colonies.FAILED)
+
+        self.colonies.del_colony(colonyname, self.server_prv)
+
     def test_stats(self):
         _, _, colonyname, colony_prvkey = self.add_test_colony()
         _, _, executorname, executor_prvkey = self.add_test_executor(
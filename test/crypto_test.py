@@ -59,6 +59,13 @@ class TestCrypto(unittest.TestCase):
         sig = crypto.sign(data, prvkey)
         self.assertEqual(len(sig), 130)
         self.assertEqual(sig, signature_hex)
+
+    def test_recoverid(self):
+        crypto = Crypto()
+        prvkey = "d6eb959e9aec2e6fdc44b5862b269e987b8a4d6f2baca542d8acaa97ee5e74f6"
+        sig = crypto.sign("hello", prvkey)
+        self.assertEqual(crypto.recoverid("hello", sig), crypto.id(prvkey))
+        self.assertNotEqual(crypto.recoverid("hello!", sig), crypto.id(prvkey))
     
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,405 @@
+import unittest
+import sys
+import os
+import threading
+import time
+import tempfile
+from unittest import mock
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycolonies import Colonies, func_spec
+from pycolonies import ColoniesNotFoundError, ColoniesError
+from model import Fs
+from executor import Executor, FsStager, LeaseManager
+from mock_testcase import MockServerTestCase
+
+
+class ExecutorTestCase(MockServerTestCase):
+    colony_prefix = "executor"
+
+    def setUp(self):
+        super().setUp()
+        self.executor_prvkey = self.add_test_executor()
+
+
+class TestLeaseManager(ExecutorTestCase):
+    def test_heartbeat(self):
+        self.submit()
+        process = self.assign()
+        beats = []
+        with LeaseManager(self.colonies, self.executor_prvkey, interval=0.05, heartbeat=beats.append) as leases:
+            leases.track(process)
+            time.sleep(0.3)
+            leases.release(process.processid)
+            count = len(beats)
+            self.assertGreaterEqual(count, 2)
+            self.assertEqual(beats[0], process.processid)
+
+            time.sleep(0.2)
+            self.assertEqual(len(beats), count)
+
+    def test_default_heartbeat(self):
+        self.submit()
+        process = self.assign()
+        with LeaseManager(self.colonies, self.executor_prvkey, interval=0.05) as leases:
+            leases.track(process)
+            time.sleep(0.2)
+            self.assertIn(process.processid, leases.leases)
+            # heartbeats stay out of the process log
+            self.assertEqual(self.colonies.get_process_log(self.colonyname, process.processid, 100, -1,
+                                                           self.executor_prvkey), [])
+
+            # a process closed by someone else is no longer tracked
+            self.colonies.close(process.processid, [], self.executor_prvkey)
+            time.sleep(0.2)
+            self.assertNotIn(process.processid, leases.leases)
+
+    def test_lease_expires(self):
+        self.submit()
+        process = self.assign()
+        with LeaseManager(self.colonies, self.executor_prvkey, interval=10) as leases:
+            leases.track(process, lease=0.2)
+            process = self.colonies.wait(process, 5, self.executor_prvkey)
+            self.assertEqual(process.state, Colonies.FAILED)
+            self.assertFalse(leases.extend(process.processid, 10))
+
+    def test_extend(self):
+        self.submit()
+        process = self.assign()
+        with LeaseManager(self.colonies, self.executor_prvkey, interval=10) as leases:
+            leases.track(process, lease=0.2)
+            for _ in range(4):
+                time.sleep(0.1)
+                self.assertTrue(leases.extend(process.processid, 0.2))
+            self.assertEqual(self.colonies.get_process(process.processid, self.executor_prvkey).state, Colonies.RUNNING)
+            self.assertGreater(leases.deadline(process.processid), 0)
+
+    def test_lease_from_maxexectime(self):
+        self.submit(maxexectime=60)
+        process = self.assign()
+        leases = LeaseManager(self.colonies, self.executor_prvkey)
+        leases.track(process)
+        self.assertGreater(leases.deadline(process.processid), 59)
+
+    def test_release_closed_process(self):
+        self.submit()
+        process = self.assign()
+        self.colonies.close(process.processid, [], self.executor_prvkey)
+        self.colonies.remove_process(process.processid, self.executor_prvkey)
+        with LeaseManager(self.colonies, self.executor_prvkey, interval=0.05) as leases:
+            leases.track(process)
+            time.sleep(0.2)
+            self.assertNotIn(process.processid, leases.leases)
+
+
+class TestExecutor(ExecutorTestCase):
+    def executor(self, handler, **kwargs):
+        return Executor(self.colonies, self.colonyname, "executor", "test-executor", self.executor_prvkey,
+                        handler=handler, colony_prvkey=self.colony_prvkey, assign_timeout=0.2, **kwargs)
+
+    def test_run_processes(self):
+        def handler(process):
+            if process.spec.funcname == "fail":
+                raise ValueError("bad input")
+            return sum(process.spec.args)
+
+        executor = self.executor(handler, workers=2).start()
+        try:
+            ok = self.colonies.wait(self.submit("sum", [1, 2]), 5, self.executor_prvkey)
+            self.assertEqual(ok.state, Colonies.SUCCESSFUL)
+            self.assertEqual(ok.output, [3])
+
+            failed = self.colonies.wait(self.submit("fail"), 5, self.executor_prvkey)
+            self.assertEqual(failed.state, Colonies.FAILED)
+            self.assertEqual(failed.errors, ["bad input"])
+        finally:
+            executor.drain(grace=0)
+
+    def test_unserializable_output(self):
+        executor = self.executor(lambda process: {1, 2}).start()
+        try:
+            failed = self.colonies.wait(self.submit(), 5, self.executor_prvkey)
+            self.assertEqual(failed.state, Colonies.FAILED)
+            self.assertEqual(len(failed.errors), 1)
+        finally:
+            self.assertEqual(executor.drain(grace=0), [])
+
+    def test_lease_expires(self):
+        release = threading.Event()
+        executor = self.executor(lambda process: release.wait(10), heartbeat_interval=0.05).start()
+        process = self.submit(maxexectime=1)
+        for _ in range(30):
+            if self.colonies.get_process(process.processid, self.executor_prvkey).state == Colonies.FAILED and \
+                    process.processid not in executor.running:
+                break
+            time.sleep(0.1)
+        # the expired process was dropped, so drain neither fails nor reports it again
+        self.assertEqual(executor.drain(grace=0), [])
+        release.set()
+        time.sleep(0.1)
+        self.assertEqual(self.colonies.get_process(process.processid, self.executor_prvkey).state, Colonies.FAILED)
+
+    def test_concurrency(self):
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def handler(process):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(0.1)
+            with lock:
+                active[0] -= 1
+
+        executor = self.executor(handler, workers=2).start()
+        try:
+            processes = [self.submit() for _ in range(6)]
+            for process in processes:
+                self.assertEqual(self.colonies.wait(process, 5, self.executor_prvkey).state, Colonies.SUCCESSFUL)
+            self.assertEqual(active[1], 2)
+        finally:
+            executor.drain(grace=0)
+
+    def test_drain(self):
+        release = threading.Event()
+
+        def handler(process):
+            if process.spec.funcname == "slow":
+                release.wait(10)
+            return process.spec.funcname
+
+        executor = self.executor(handler, workers=2).start()
+        quick = self.submit("quick")
+        slow = self.submit("slow")
+        while self.colonies.get_process(slow.processid, self.executor_prvkey).state != Colonies.RUNNING:
+            time.sleep(0.01)
+
+        start = time.monotonic()
+        stranded = executor.drain(grace=0.3)
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(stranded, [slow.processid])
+        release.set()
+
+        self.assertEqual(self.colonies.get_process(quick.processid, self.executor_prvkey).state, Colonies.SUCCESSFUL)
+        slow = self.colonies.get_process(slow.processid, self.executor_prvkey)
+        self.assertEqual(slow.state, Colonies.FAILED)
+        self.assertEqual(slow.errors, ["executor executor shut down"])
+
+        # no more assigns, and the executor is gone
+        waiting = self.submit("quick")
+        time.sleep(0.3)
+        self.assertEqual(self.colonies.get_process(waiting.processid, self.executor_prvkey).state, Colonies.WAITING)
+        with self.assertRaises(ColoniesNotFoundError):
+            self.colonies.get_executor(self.colonyname, "executor", self.colony_prvkey)
+
+    def test_drain_waits_for_running(self):
+        def handler(process):
+            time.sleep(0.2)
+            return "done"
+
+        executor = self.executor(handler).start()
+        process = self.submit()
+        while self.colonies.get_process(process.processid, self.executor_prvkey).state != Colonies.RUNNING:
+            time.sleep(0.01)
+        self.assertEqual(executor.drain(grace=5), [])
+        self.assertEqual(self.colonies.get_process(process.processid, self.executor_prvkey).output, ["done"])
+
+
+class TestFunctionRegistry(ExecutorTestCase):
+    def executor(self, **kwargs):
+        return Executor(self.colonies, self.colonyname, "executor", "test-executor", self.executor_prvkey,
+                        colony_prvkey=self.colony_prvkey, assign_timeout=0.2, **kwargs)
+
+    def test_dispatch(self):
+        executor = self.executor()
+
+        @executor.function()
+        def add(a, b):
+            return a + b
+
+        @executor.function("echo")
+        def echo_args(*args):
+            return args
+
+        msgtypes = []
+        self.colonies.add_rpc_hook(pre=lambda event: msgtypes.append(event.msgtype))
+        executor.start()
+        try:
+            self.assertEqual(self.colonies.wait(self.submit("add", [1, 2]), 5, self.executor_prvkey).output, [3])
+            self.assertEqual(self.colonies.wait(self.submit("echo", ["a", "b"]), 5, self.executor_prvkey).output, ["a", "b"])
+            self.assertEqual(self.colonies.wait(self.submit("add", [3, 4]), 5, self.executor_prvkey).output, [7])
+            failed = self.colonies.wait(self.submit("unknown"), 5, self.executor_prvkey)
+            self.assertEqual(failed.state, Colonies.FAILED)
+            self.assertEqual(failed.errors, ["function unknown is not registered"])
+        finally:
+            executor.drain(grace=0)
+
+        self.assertEqual(msgtypes.count("addfunctionmsg"), 2)
+        functions = self.colonies.get_functions_by_executor(self.colonyname, "executor", self.executor_prvkey)
+        self.assertEqual(sorted(f["funcname"] for f in functions), ["add", "echo"])
+
+    def test_max_concurrency(self):
+        executor = self.executor(workers=2)
+        release = threading.Event()
+        lock = threading.Lock()
+        active = [0, 0]
+
+        @executor.function(max_concurrency=1)
+        def heavy():
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            release.wait(10)
+            with lock:
+                active[0] -= 1
+
+        @executor.function()
+        def cheap():
+            return "cheap"
+
+        executor.start()
+        try:
+            heavies = [self.submit("heavy") for _ in range(3)]
+            # the queued heavy processes must not keep the cheap one from running
+            for _ in range(3):
+                cheap_process = self.colonies.wait(self.submit("cheap"), 5, self.executor_prvkey)
+                self.assertEqual(cheap_process.output, ["cheap"])
+            release.set()
+            for process in heavies:
+                self.assertEqual(self.colonies.wait(process, 5, self.executor_prvkey).state, Colonies.SUCCESSFUL)
+            self.assertEqual(active[1], 1)
+        finally:
+            release.set()
+            executor.drain(grace=0)
+
+    def test_timeout(self):
+        executor = self.executor()
+        release = threading.Event()
+
+        @executor.function(timeout=0.2)
+        def slow():
+            release.wait(10)
+            return "late"
+
+        executor.start()
+        try:
+            process = self.colonies.wait(self.submit("slow"), 5, self.executor_prvkey)
+            self.assertEqual(process.state, Colonies.FAILED)
+            self.assertEqual(process.errors, ["slow timed out after 0.2 seconds"])
+            release.set()
+        finally:
+            release.set()
+            executor.drain(grace=1)
+
+
+class TestFsStager(ExecutorTestCase):
+    s3 = True
+
+    def setUp(self):
+        super().setUp()
+        cache = tempfile.TemporaryDirectory()
+        self.addCleanup(cache.cleanup)
+        self.stager = FsStager(self.colonies, self.colonyname, self.executor_prvkey, cache.name)
+        self.addCleanup(self.stager.shutdown)
+        self.upload("/data", "a", b"alpha")
+        self.upload("/data", "b", b"beta")
+        self.colonies.create_snapshot(self.colonyname, "/data", "snap", self.executor_prvkey)
+        self.upload("/cfg", "x", b"beta")
+
+    def upload(self, label, filename, data):
+        self.colonies.upload_data(self.colonyname, self.executor_prvkey, filename=filename, data=data, label=label)
+
+    def submit_fs(self, funcname="load", args=[], snapshots=["snap"], dirs=["/cfg"]):
+        spec = func_spec(funcname, args, self.colonyname, "test-executor",
+                         fs=Fs(mount="/cfs", snapshots=snapshots, dirs=dirs))
+        return self.colonies.submit_func_spec(spec, self.executor_prvkey)
+
+    def read(self, path, filename):
+        with open(os.path.join(path, filename), "rb") as f:
+            return f.read()
+
+    def test_stage(self):
+        staged = self.stager.wait(self.submit_fs(), 5)
+        self.assertEqual(staged["mount"], "/cfs")
+        self.assertEqual(self.read(staged["snapshots"]["snap"], "a"), b"alpha")
+        self.assertEqual(self.read(staged["snapshots"]["snap"], "b"), b"beta")
+        self.assertEqual(self.read(staged["dirs"]["/cfg"], "x"), b"beta")
+        # b and x have the same content
+        self.assertEqual(self.stager.stats()["downloaded"], 2)
+
+        again = self.stager.wait(self.submit_fs(), 5)
+        self.assertEqual(again, staged)
+        self.assertEqual(self.stager.stats()["downloaded"], 2)
+
+        # a changed dir is staged into a new directory, the snapshot is not
+        self.upload("/cfg", "x", b"gamma")
+        changed = self.stager.wait(self.submit_fs(), 5)
+        self.assertNotEqual(changed["dirs"]["/cfg"], staged["dirs"]["/cfg"])
+        self.assertEqual(self.read(changed["dirs"]["/cfg"], "x"), b"gamma")
+        self.assertEqual(self.read(staged["dirs"]["/cfg"], "x"), b"beta")
+        self.assertEqual(self.stager.stats()["downloaded"], 3)
+
+    def test_missing_snapshot(self):
+        with self.assertRaises(ColoniesNotFoundError):
+            self.stager.wait(self.submit_fs(snapshots=["missing"]), 5)
+
+    def test_name_collision(self):
+        self.upload("/clash", "a", b"alpha")
+        self.upload("/clash", "b", b"other")
+        get_file = self.colonies.get_file
+
+        def nested(*args, **kwargs):
+            # two different files with one basename, as in a snapshot of nested labels
+            return [dict(f, name="/clash/" + kwargs["filename"] + "/a") for f in get_file(*args, **kwargs)]
+
+        with mock.patch.object(self.colonies, "get_file", side_effect=nested):
+            with self.assertRaises(ColoniesError):
+                self.stager.wait(self.submit_fs(snapshots=[], dirs=["/clash"]), 5)
+        self.assertEqual(os.listdir(os.path.join(self.stager.cache_dir, "tmp")), [])
+
+    def test_failed_download(self):
+        with mock.patch.object(self.colonies, "download_data", side_effect=ColoniesError("unavailable")):
+            with self.assertRaises(ColoniesError):
+                self.stager.wait(self.submit_fs(snapshots=[]), 5)
+        self.assertEqual(os.listdir(os.path.join(self.stager.cache_dir, "tmp")), [])
+        self.assertEqual(os.listdir(os.path.join(self.stager.cache_dir, "dirs")), [])
+
+    def test_prefetch(self):
+        executor = Executor(self.colonies, self.colonyname, "executor", "test-executor", self.executor_prvkey,
+                            colony_prvkey=self.colony_prvkey, assign_timeout=0.2, stager=self.stager, prefetch=1)
+        overlapped = []
+
+        @executor.function()
+        def load(first):
+            if first:
+                # the next process is assigned and staged while this one runs
+                deadline = time.monotonic() + 5
+                while time.monotonic() < deadline:
+                    with self.stager.lock:
+                        futures = list(self.stager.staged.values())
+                    if len(futures) == 2 and all(future.done() for future in futures):
+                        overlapped.append(True)
+                        break
+                    time.sleep(0.01)
+            return self.read(executor.staged_fs()["snapshots"]["snap"], "a").decode()
+
+        first = self.submit_fs(args=[1])
+        second = self.submit_fs(args=[0])
+        missing = self.submit_fs(args=[0], snapshots=["missing"])
+        executor.start()
+        try:
+            for process in (first, second):
+                process = self.colonies.wait(process, 5, self.executor_prvkey)
+                self.assertEqual(process.state, Colonies.SUCCESSFUL)
+                self.assertEqual(process.output, ["alpha"])
+            self.assertEqual(overlapped, [True])
+            self.assertEqual(self.colonies.wait(missing, 5, self.executor_prvkey).state, Colonies.FAILED)
+        finally:
+            executor.drain(grace=1)
+        self.assertEqual(self.stager.staged, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+import sys
+import os
+import threading
+import time
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycolonies import Colonies, ColoniesNotFoundError, ColoniesProcessError, ColoniesTimeoutError
+from executor import Executor
+from fanout import chunks
+from mock_testcase import MockServerTestCase
+
+
+class TestFanOut(MockServerTestCase):
+    colony_prefix = "fanout"
+
+    def setUp(self):
+        super().setUp()
+        self.executor_prvkey = self.crypto.prvkey()
+
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.executor = Executor(self.colonies, self.colonyname, "executor", "test-executor", self.executor_prvkey,
+                                 colony_prvkey=self.colony_prvkey, workers=8, assign_timeout=0.2)
+        self.executor.register()
+
+        @self.executor.function()
+        def double(*xs):
+            with self.lock:
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+            time.sleep(0.02)
+            with self.lock:
+                self.active -= 1
+            if 13 in xs:
+                raise ValueError("unlucky")
+            return [2 * x for x in xs]
+
+        @self.executor.function()
+        def total(*xs):
+            return sum(xs)
+
+        self.slow = {7}
+
+        @self.executor.function()
+        def square(x):
+            with self.lock:
+                straggler = x in self.slow
+                self.slow.discard(x)
+            time.sleep(2 if straggler else 0.02)
+            return x * x
+
+        self.executor.start()
+        self.addCleanup(self.executor.drain, 0)
+
+    def test_chunks(self):
+        self.assertEqual(list(chunks(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunks([], 2)), [])
+
+    def test_map(self):
+        outputs = self.colonies.map("double", range(10), self.colonyname, "test-executor", self.executor_prvkey,
+                                    chunksize=3)
+        self.assertEqual(list(outputs), [2 * x for x in range(10)])
+
+    def test_map_bounded(self):
+        outputs = self.colonies.map("double", range(12), self.colonyname, "test-executor", self.executor_prvkey,
+                                    max_inflight=2, ordered=False)
+        self.assertEqual(sorted(outputs), [2 * x for x in range(12)])
+        self.assertLessEqual(self.max_active, 2)
+
+    def test_map_failed(self):
+        outputs = self.colonies.map("double", range(20), self.colonyname, "test-executor", self.executor_prvkey,
+                                    chunksize=5)
+        with self.assertRaises(ColoniesProcessError) as cm:
+            list(outputs)
+        self.assertEqual(cm.exception.process.errors, ["unlucky"])
+
+    def test_map_removes_unfinished(self):
+        # no executor of this type, the processes never run
+        outputs = self.colonies.map("double", range(6), self.colonyname, "idle-executor", self.executor_prvkey,
+                                    max_inflight=3, timeout=0.5)
+        with self.assertRaises(ColoniesTimeoutError):
+            next(outputs)
+        self.assertEqual(self.colonies.list_processes(self.colonyname, 100, Colonies.WAITING, self.executor_prvkey), [])
+
+        outputs = self.colonies.map("double", range(6), self.colonyname, "test-executor", self.executor_prvkey,
+                                    max_inflight=3)
+        self.assertEqual(next(outputs), 0)
+        outputs.close()
+        time.sleep(0.2)
+        for state in (Colonies.WAITING, Colonies.RUNNING):
+            self.assertEqual(self.colonies.list_processes(self.colonyname, 100, state, self.executor_prvkey), [])
+
+    def test_map_reduce(self):
+        partials = {}
+        result = self.colonies.map_reduce("double", "total", range(10), self.colonyname, "test-executor",
+                                          self.executor_prvkey, chunksize=4,
+                                          on_partial=lambda index, output: partials.update({index: output}))
+        self.assertEqual(result, 90)
+        self.assertEqual(partials, {0: [0, 2, 4, 6], 1: [8, 10, 12, 14], 2: [16, 18]})
+
+        graphs = self.colonies.get_processgraphs(self.colonyname, 10, self.executor_prvkey)
+        self.assertEqual(len(graphs), 1)
+
+    def test_map_reduce_waves(self):
+        result = self.colonies.map_reduce("double", "total", range(10), self.colonyname, "test-executor",
+                                          self.executor_prvkey, chunksize=2, max_inflight=2)
+        self.assertEqual(result, 90)
+        # 5 chunks in workflows of 2 mappers
+        graphs = self.colonies.get_processgraphs(self.colonyname, 10, self.executor_prvkey)
+        self.assertEqual(len(graphs), 3)
+
+    def test_map_reduce_failed(self):
+        with self.assertRaises(ColoniesProcessError):
+            self.colonies.map_reduce("double", "total", range(20), self.colonyname, "test-executor",
+                                     self.executor_prvkey, chunksize=5)
+
+    def test_speculate(self):
+        processes = [self.submit("square", [x]) for x in range(10)]
+        start = time.monotonic()
+        results = self.colonies.speculate(processes, self.executor_prvkey, quantile=0.8, slowdown=2,
+                                          poll_interval=0.05, timeout=10)
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertEqual([process.output for process in results], [[x * x] for x in range(10)])
+        self.assertNotEqual(results[7].processid, processes[7].processid)
+        self.assertEqual(results[6].processid, processes[6].processid)
+        # the straggler was removed
+        with self.assertRaises(ColoniesNotFoundError):
+            self.colonies.get_process(processes[7].processid, self.executor_prvkey)
+
+    def test_speculate_threads(self):
+        processes = [self.submit("square", [x]) for x in range(40)]
+        colonies = self.server.client()
+        msgtypes = []
+        threads = []
+        colonies.add_rpc_hook(pre=lambda event: (msgtypes.append(event.msgtype),
+                                                 threads.append(threading.active_count())))
+        before = threading.active_count()
+        results = colonies.speculate(processes, self.executor_prvkey, quantile=1, poll_interval=0.05, timeout=10)
+        self.assertEqual([process.output for process in results], [[x * x] for x in range(40)])
+        # a subscription and the executor's workers, not a thread per process
+        self.assertLess(max(threads) - before, len(processes) // 2)
+        # processes are read at most once, the rest is listed
+        self.assertLessEqual(msgtypes.count("getprocessmsg"), len(processes))
+
+    def test_speculate_failed(self):
+        processes = [self.submit("double", [x]) for x in (1, 13)]
+        with self.assertRaises(ColoniesProcessError):
+            self.colonies.speculate(processes, self.executor_prvkey, poll_interval=0.05, timeout=10)
+
+
+if __name__ == '__main__':
+    unittest.main()
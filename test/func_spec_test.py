@@ -1,6 +1,27 @@
 import unittest
+import sys
+import os
+import base64
+import inspect
+from unittest import mock
 
-from pycolonies import func_spec
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pycolonies
+from pycolonies import func_spec, FuncSpecTemplate
+from codec import decode_values
+from model import FuncSpec, Workflow
+from errors import ColoniesError
+from mock_testcase import MockServerTestCase
+
+
+def add(a, b, ctx={}):
+    return a + b
+
+
+def sub(a, b):
+    return a - b
 
 
 class TestFuncSpec(unittest.TestCase):
@@ -39,3 +60,134 @@ class TestFuncSpec(unittest.TestCase):
         self.assertEqual(spec.maxwaittime, 100)
 
         self.assertEqual(spec.kwargs, kwargs)
+
+
+class TestFuncSpecCache(unittest.TestCase):
+    def test_cached_per_function(self):
+        def mul(a, b):
+            return a * b
+
+        with mock.patch("pycolonies.inspect.getsource", wraps=pycolonies.inspect.getsource) as getsource:
+            first = func_spec(mul, [1, 2], "colonyname", "python-executor")
+            second = func_spec(mul, [3, 4], "colonyname", "python-executor")
+        self.assertEqual(getsource.call_count, 1)
+        self.assertEqual(first.env, second.env)
+        self.assertEqual(first.env["args_spec"], "a,b")
+        self.assertIn("def mul(a, b):", base64.b64decode(first.env["code"]).decode("ascii"))
+        self.assertEqual(second.args, [3, 4])
+
+    def test_code_change(self):
+        def f(a, b):
+            return a + b
+
+        before = func_spec(f, [], "colonyname", "python-executor")
+        f.__code__ = sub.__code__
+        after = func_spec(f, [], "colonyname", "python-executor")
+        self.assertNotEqual(before.env["code"], after.env["code"])
+        self.assertIn("def sub(a, b):", base64.b64decode(after.env["code"]).decode("ascii"))
+
+    def test_entries_dropped_with_function(self):
+        def tmp():
+            pass
+
+        func_spec(tmp, [], "colonyname", "python-executor")
+        self.assertIn(tmp, pycolonies.code_cache)
+        count = len(pycolonies.code_cache)
+        del tmp
+        self.assertEqual(len(pycolonies.code_cache), count - 1)
+
+
+class TestFuncSpecTemplate(unittest.TestCase):
+    def test_dump(self):
+        template = FuncSpecTemplate(add, "colonyname", "python-executor", maxexectime=10, executorname="exec")
+        expected = func_spec(add, [1, 2], "colonyname", "python-executor", maxexectime=10, executorname="exec",
+                             kwargs={"x": "y"})
+        self.assertEqual(template.dump([1, 2], {"x": "y"}), expected.model_dump(by_alias=True))
+        self.assertEqual(template.spec([1, 2], {"x": "y"}), expected)
+        # dumps do not share the args
+        self.assertEqual(template.dump([3])["args"], [3])
+        # nor the nested dicts and lists
+        dumped = template.dump([1])
+        dumped["env"]["extra"] = "leak"
+        dumped["conditions"]["dependencies"].append("other")
+        self.assertEqual(template.dump([1]), expected.model_dump(by_alias=True) | {"args": [1], "kwargs": None})
+
+    def test_codec(self):
+        template = FuncSpecTemplate("calc", "colonyname", "python-executor", codec="pickle")
+        self.assertEqual(decode_values(template.dump([[0.5, 1.5]])["args"], ["pickle"]), [[0.5, 1.5]])
+
+
+class TestCodeRegistry(MockServerTestCase):
+    colony_prefix = "code"
+    s3 = True
+
+    def setUp(self):
+        super().setUp()
+        self.prvkey = self.crypto.prvkey()
+        self.colonies = self.server.client(code_registry=True)
+        self.uploads = []
+        self.colonies.add_rpc_hook(pre=lambda event: event.msgtype == "addfilemsg" and self.uploads.append(event))
+
+    def test_submit_by_hash(self):
+        template = FuncSpecTemplate(add, self.colonyname, "python-executor")
+        for i in range(3):
+            process = self.colonies.submit_func_spec(template.dump([i, 1]), self.prvkey)
+        self.assertNotIn("code", process.spec.env)
+        self.assertEqual(process.spec.env["args_spec"], "a,b,ctx")
+        self.assertEqual(len(self.uploads), 1)
+        # the template is not modified
+        self.assertIn("code", template.dumped["env"])
+
+        # a fresh client, e.g. an executor, downloads the code once
+        executor = self.server.client()
+        downloads = []
+        executor.add_rpc_hook(pre=lambda event: event.msgtype == "getfilemsg" and downloads.append(event))
+        self.assertEqual(executor.get_code(process.spec, self.prvkey), inspect.getsource(add))
+        self.assertEqual(executor.get_code(process.spec, self.prvkey), inspect.getsource(add))
+        self.assertEqual(len(downloads), 1)
+
+        # another client submitting the same code finds it already uploaded
+        spec = func_spec(add, [1, 2], self.colonyname, "python-executor")
+        self.server.client(code_registry=True).submit_func_spec(spec, self.prvkey)
+        self.assertEqual(len(self.uploads), 1)
+
+    def test_empty_file_list(self):
+        # a server replying with no files instead of 404 has not got the code either
+        spec = func_spec(add, [1, 2], self.colonyname, "python-executor")
+        with mock.patch.object(self.colonies, "get_file", return_value=[]):
+            spec = FuncSpec(**self.colonies.publish_code(spec, self.prvkey))
+        self.assertEqual(len(self.uploads), 1)
+        self.assertEqual(self.server.client().get_code(spec, self.prvkey), inspect.getsource(add))
+
+    def test_workflow(self):
+        workflow = Workflow(colonyname=self.colonyname)
+        workflow.functionspecs.append(func_spec(add, [1, 2], self.colonyname, "python-executor"))
+        spec = func_spec(sub, [], self.colonyname, "python-executor")
+        spec.conditions.dependencies = ["add"]
+        workflow.functionspecs.append(spec)
+        graph = self.colonies.submit_workflow(workflow, self.prvkey)
+        self.assertEqual(len(self.uploads), 2)
+        for processid in graph.processids:
+            process = self.colonies.get_process(processid, self.prvkey)
+            self.assertIn("code_sha256", process.spec.env)
+            self.assertIn("def " + process.spec.funcname, self.colonies.get_code(process.spec, self.prvkey))
+        # the workflow itself keeps the code inline
+        self.assertIn("code", workflow.functionspecs[0].env)
+
+    def test_inline_code(self):
+        spec = func_spec(add, [1, 2], self.colonyname, "python-executor")
+        self.assertEqual(self.server.client().get_code(spec, self.prvkey), inspect.getsource(add))
+        self.assertIsNone(self.colonies.get_code(func_spec("echo", [], self.colonyname, "x"), self.prvkey))
+
+    def test_hash_mismatch(self):
+        spec = func_spec(add, [1, 2], self.colonyname, "python-executor")
+        spec = FuncSpec(**self.colonies.publish_code(spec, self.prvkey))
+        digest = spec.env["code_sha256"]
+        self.colonies.upload_data(self.colonyname, self.prvkey, filename=digest, data=b"def add(): pass\n",
+                                  label="/.pycolonies/code")
+        with self.assertRaises(ColoniesError):
+            self.server.client().get_code(spec, self.prvkey)
+
+
+if __name__ == '__main__':
+    unittest.main()
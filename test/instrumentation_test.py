@@ -0,0 +1,97 @@
+import unittest
+import sys
+import os
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycolonies import ColoniesConnectionError, func_spec
+from instrumentation import Histogram, RPCEvent, RPCMetrics
+from mock_testcase import MockServerTestCase
+
+
+def event(msgtype, network, error=None):
+    e = RPCEvent(msgtype, 100, 0.0001, 0.003)
+    e.network = network
+    e.parse = 0.0001
+    e.response_size = 50
+    e.error = error
+    return e
+
+
+class TestRPCMetrics(unittest.TestCase):
+    def test_histogram_quantile(self):
+        histogram = Histogram((0.001, 0.01, 0.1))
+        for _ in range(90):
+            histogram.observe(0.0005)
+        for _ in range(10):
+            histogram.observe(0.05)
+        self.assertLessEqual(histogram.quantile(0.5), 0.001)
+        self.assertGreater(histogram.quantile(0.99), 0.01)
+        self.assertLessEqual(histogram.quantile(0.99), 0.1)
+        self.assertIsNone(Histogram((1.0,)).quantile(0.5))
+
+    def test_summary(self):
+        metrics = RPCMetrics()
+        metrics(event("assignprocessmsg", 0.02))
+        metrics(event("assignprocessmsg", 0.04, error=Exception("timeout")))
+        summary = metrics.summary()["assignprocessmsg"]
+        self.assertEqual(summary["count"], 2)
+        self.assertEqual(summary["errors"], 1)
+        self.assertAlmostEqual(summary["network"], 0.03)
+        self.assertAlmostEqual(summary["total"], 0.0032 + 0.03)
+
+    def test_prometheus(self):
+        metrics = RPCMetrics(buckets=(0.01, 0.1))
+        metrics(event("submitfuncspecmsg", 0.05))
+        text = metrics.prometheus()
+        self.assertIn('pycolonies_rpc_duration_seconds_bucket{msgtype="submitfuncspecmsg",phase="network",le="0.01"} 0', text)
+        self.assertIn('pycolonies_rpc_duration_seconds_bucket{msgtype="submitfuncspecmsg",phase="network",le="0.1"} 1', text)
+        self.assertIn('pycolonies_rpc_duration_seconds_count{msgtype="submitfuncspecmsg",phase="total"} 1', text)
+        self.assertIn('pycolonies_rpc_request_bytes_total{msgtype="submitfuncspecmsg"} 100', text)
+
+
+class TestRPCHooks(MockServerTestCase):
+    colony_prefix = "hooks"
+
+    def test_hooks(self):
+        colonies = self.colonies
+        prvkey = self.crypto.prvkey()
+        pre_events = []
+        post_events = []
+        colonies.add_rpc_hook(pre=pre_events.append, post=post_events.append)
+
+        colonies.submit_func_spec(func_spec("sum", [], self.colonyname, "test"), prvkey)
+        self.assertEqual(len(pre_events), 1)
+        self.assertEqual(len(post_events), 1)
+        e = post_events[0]
+        self.assertEqual(e.msgtype, "submitfuncspecmsg")
+        self.assertGreater(e.request_size, 0)
+        self.assertGreater(e.response_size, 0)
+        self.assertEqual(e.status_code, 200)
+        self.assertGreater(e.sign, 0)
+        self.assertGreater(e.network, 0)
+        self.assertIsNone(e.error)
+
+        with self.assertRaises(ColoniesConnectionError):
+            colonies.get_process("missing", prvkey)
+        self.assertEqual(post_events[-1].status_code, 404)
+        self.assertIsInstance(post_events[-1].error, ColoniesConnectionError)
+
+        colonies.remove_rpc_hook(pre=pre_events.append, post=post_events.append)
+        colonies.list_colonies(prvkey)
+        self.assertEqual(len(post_events), 2)
+
+    def test_metrics(self):
+        colonies = self.colonies
+        prvkey = self.crypto.prvkey()
+        metrics = RPCMetrics()
+        colonies.add_rpc_hook(post=metrics)
+        for _ in range(3):
+            colonies.list_colonies(prvkey)
+        self.assertEqual(metrics.summary()["getcoloniesmsg"]["count"], 3)
+        self.assertIsNotNone(metrics.quantile("getcoloniesmsg", "network", 0.99))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+import sys
+import os
+import logging
+import threading
+import time
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycolonies import Colonies
+from executor import Executor
+from logs import ColoniesLogHandler
+from mock_testcase import MockServerTestCase
+
+
+class LogsTestCase(MockServerTestCase):
+    colony_prefix = "logs"
+
+    def setUp(self):
+        super().setUp()
+        self.executor_prvkey = self.add_test_executor()
+
+        self.logger = logging.getLogger(self.id())
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.addlogs = []
+        self.colonies.add_rpc_hook(pre=lambda event: event.msgtype == "addlogmsg" and self.addlogs.append(event))
+
+    def assign(self):
+        self.submit("log")
+        return super().assign()
+
+
+class TestColoniesLogHandler(LogsTestCase):
+    def handler(self, **kwargs):
+        handler = ColoniesLogHandler(self.colonies, self.executor_prvkey, **kwargs)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        self.addCleanup(handler.close)
+        return handler
+
+    def messages(self, processid):
+        logs = self.colonies.get_process_log(self.colonyname, processid, 100, -1, self.executor_prvkey)
+        return [log["message"] for log in logs]
+
+    def test_batch(self):
+        process = self.assign()
+        handler = self.handler(flush_interval=10)
+        with handler.process(process.processid):
+            for i in range(50):
+                self.logger.info("epoch %d", i)
+        self.assertEqual(len(self.addlogs), 1)
+        self.assertEqual(self.messages(process.processid), ["\n".join("epoch " + str(i) for i in range(50))])
+
+    def test_flush_interval(self):
+        process = self.assign()
+        self.handler(flush_interval=0.1)
+        self.logger.info("first", extra={"processid": process.processid})
+        self.logger.info("second", extra={"processid": process.processid})
+        time.sleep(0.5)
+        self.assertEqual(self.messages(process.processid), ["first\nsecond"])
+
+    def test_batch_size(self):
+        process = self.assign()
+        handler = self.handler(processid=process.processid, flush_interval=10, batch_size=5)
+        for i in range(5):
+            self.logger.info("line %d", i)
+        time.sleep(0.3)
+        self.assertEqual(len(self.messages(process.processid)), 1)
+        self.logger.info("buffered")
+        handler.close()
+        self.assertEqual(self.messages(process.processid)[-1], "buffered")
+
+    def test_max_bytes(self):
+        process = self.assign()
+        handler = self.handler(flush_interval=10, max_bytes=50)
+        with handler.process(process.processid):
+            for i in range(20):
+                self.logger.info("line number %04d", i)
+        messages = self.messages(process.processid)
+        self.assertGreater(len(messages), 1)
+        for message in messages:
+            self.assertLessEqual(len(message), 50)
+        self.assertEqual("\n".join(messages).split("\n"), ["line number %04d" % i for i in range(20)])
+
+    def test_max_bytes_long_line(self):
+        process = self.assign()
+        handler = self.handler(flush_interval=10, max_bytes=50)
+        line = "x" + "ö" * 40 + "x" * 30
+        with handler.process(process.processid):
+            self.logger.info(line)
+        messages = self.messages(process.processid)
+        self.assertGreater(len(messages), 2)
+        for message in messages:
+            self.assertLessEqual(len(message.encode("utf-8")), 50)
+        self.assertEqual("".join(messages), line)
+
+    def test_overload(self):
+        process = self.assign()
+        handler = self.handler(flush_interval=10, batch_size=1000, max_buffered=40, sample_ratio=5)
+        with handler.process(process.processid):
+            for i in range(100):
+                self.logger.info("line %d", i)
+            self.logger.warning("disk full")
+        lines = "\n".join(self.messages(process.processid)).split("\n")
+        kept = len(lines) - 2
+        self.assertEqual(lines[-2], "disk full")
+        self.assertEqual(lines[-1], str(100 - kept) + " log lines dropped")
+        # 20 lines before sampling starts, then one in five
+        self.assertEqual(kept, 36)
+
+    def test_executor(self):
+        handler = self.handler(flush_interval=10)
+        executor = Executor(self.colonies, self.colonyname, "executor", "test-executor", self.executor_prvkey,
+                            assign_timeout=0.2, log_handler=handler)
+
+        @executor.function()
+        def train():
+            for epoch in range(3):
+                self.logger.info("epoch %d", epoch)
+
+        executor.start()
+        try:
+            process = self.colonies.wait(self.submit("train"), 5, self.executor_prvkey)
+            self.assertEqual(process.state, Colonies.SUCCESSFUL)
+            # flushed before the process was closed
+            self.assertEqual(self.messages(process.processid), ["epoch 0\nepoch 1\nepoch 2"])
+        finally:
+            executor.drain(grace=0)
+
+
+class TestTailLog(LogsTestCase):
+    def test_tail_process_log(self):
+        process = self.assign()
+
+        def run():
+            for i in range(5):
+                self.colonies.add_log(process.processid, "line " + str(i), self.executor_prvkey)
+                time.sleep(0.05)
+            self.colonies.close(process.processid, [], self.executor_prvkey)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        tail = self.colonies.tail_process_log(self.colonyname, process.processid, self.executor_prvkey,
+                                              page_size=2, poll_interval=0.01, timeout=5)
+        self.assertEqual([log["message"] for log in tail], ["line " + str(i) for i in range(5)])
+        thread.join()
+
+        # without follow only the current entries are returned
+        tail = self.colonies.tail_process_log(self.colonyname, process.processid, self.executor_prvkey, follow=False)
+        self.assertEqual(len(list(tail)), 5)
+
+    def test_tail_executor_log(self):
+        process = self.assign()
+        for i in range(3):
+            self.colonies.add_log(process.processid, "line " + str(i), self.executor_prvkey)
+        tail = self.colonies.tail_executor_log(self.colonyname, "executor", self.executor_prvkey, poll_interval=0.01,
+                                               timeout=0.3)
+        self.assertEqual([log["message"] for log in tail], ["line 0", "line 1", "line 2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+import unittest
+import sys
+import os
+import time
+from types import SimpleNamespace
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycolonies import Colonies, func_spec
+from model import Workflow
+from executor import Executor
+from memo import ResultCache, code_digest, spec_key, workflow_key
+from mock_testcase import MockServerTestCase
+
+
+def square(x):
+    return x * x
+
+
+class TestSpecKey(unittest.TestCase):
+    def test_canonical(self):
+        a = func_spec(square, [3], "colony", "python-executor", kwargs={"a": "1", "b": "2"}).model_dump(by_alias=True)
+        b = func_spec(square, [3], "colony", "python-executor", kwargs={"b": "2", "a": "1"}, priority=5)
+        b = b.model_dump(by_alias=True)
+        self.assertEqual(spec_key(a), spec_key(b))
+        c = func_spec(square, [4], "colony", "python-executor").model_dump(by_alias=True)
+        self.assertNotEqual(spec_key(a), spec_key(c))
+
+        # code sent by hash has the same key as inline code
+        env = {key: value for key, value in a["env"].items() if key != "code"}
+        by_hash = dict(a, env=dict(env, code_sha256=code_digest(a["env"]["code"])))
+        self.assertEqual(spec_key(a), spec_key(by_hash))
+
+        # the environment and filesystem are inputs too
+        self.assertNotEqual(spec_key(a), spec_key(dict(a, env=dict(a["env"], threads="4"))))
+        self.assertNotEqual(spec_key(a), spec_key(dict(a, fs={"mount": "/data", "snapshots": [{"label": "/in"}]})))
+
+    def test_workflow_key(self):
+        workflow = Workflow(colonyname="colony")
+        workflow.functionspecs.append(func_spec("gen", [1], "colony", "python-executor"))
+        key = workflow_key(workflow.model_dump(by_alias=True))
+        workflow.functionspecs[0].args = [2]
+        self.assertNotEqual(workflow_key(workflow.model_dump(by_alias=True)), key)
+
+    def test_ttl(self):
+        cache = ResultCache(ttl=10, max_entries=2)
+        cache.put("colony", "a", {"stored": time.time()})
+        cache.put("colony", "old", {"stored": time.time() - 20})
+        self.assertIsNotNone(cache.get("colony", "a"))
+        self.assertIsNone(cache.get("colony", "old"))
+        cache.put("colony", "b", {"stored": time.time()})
+        cache.put("colony", "c", {"stored": time.time()})
+        self.assertIsNone(cache.get("colony", "a"))
+
+
+    def test_pending_expires(self):
+        cache = ResultCache(ttl=10)
+        old = SimpleNamespace(processid="old")
+        cache.submitted("colony", "a", old)
+        cache.pending["old"] = (time.time() - 20,) + cache.pending["old"][1:]
+        cache.submitted("colony", "b", SimpleNamespace(processid="new"))
+        self.assertEqual(list(cache.pending), ["new"])
+        self.assertIsNone(cache.running("colony", "a"))
+        self.assertIsNone(cache.finished("old"))
+        self.assertEqual(cache.finished("new"), ("colony", "b"))
+        self.assertIsNone(cache.running("colony", "b"))
+
+
+class TestMemo(MockServerTestCase):
+    colony_prefix = "memo"
+    s3 = True
+
+    def setUp(self):
+        super().setUp()
+        self.prvkey = self.crypto.prvkey()
+        self.executor = Executor(self.colonies, self.colonyname, "executor", "python-executor", self.prvkey,
+                                 colony_prvkey=self.colony_prvkey, assign_timeout=0.2)
+        self.executor.register()
+        self.calls = []
+
+        @self.executor.function("square")
+        def run(x):
+            self.calls.append(x)
+            return x * x
+
+        @self.executor.function("noise")
+        def noise():
+            self.calls.append(None)
+            return time.time()
+
+        @self.executor.function("square-ts")
+        def square_ts(x):
+            self.calls.append(-x)
+            return x * x
+
+        self.executor.start()
+        self.addCleanup(self.executor.drain, 0)
+
+    def call(self, colonies, func, args):
+        process = colonies.submit_func_spec(func_spec(func, args, self.colonyname, "python-executor"), self.prvkey)
+        process = colonies.wait(process, 5, self.prvkey)
+        self.assertEqual(process.state, Colonies.SUCCESSFUL)
+        return process
+
+    def test_hit(self):
+        colonies = self.server.client(memo=True)
+        first = self.call(colonies, square, [3])
+        second = self.call(colonies, square, [3])
+        self.assertEqual(second.output, [9])
+        self.assertEqual(second.processid, first.processid)
+        self.assertEqual(self.calls, [3])
+        self.call(colonies, square, [4])
+        self.assertEqual(self.calls, [3, 4])
+        self.assertEqual(colonies.memo.stats()["hits"], 1)
+        self.assertEqual(colonies.memo.stats()["misses"], 2)
+        self.assertAlmostEqual(colonies.memo.hit_rate, 1 / 3)
+
+        # the result is shared through the file API with other clients, even
+        # once the process is gone
+        self.colonies.remove_process(first.processid, self.prvkey)
+        other = self.server.client(memo=True)
+        self.assertEqual(self.call(other, square, [3]).output, [9])
+        self.assertEqual(self.calls, [3, 4])
+
+    def test_funcnames(self):
+        colonies = self.server.client(memo=ResultCache(funcnames=["square"]))
+        self.call(colonies, "noise", [])
+        self.call(colonies, "noise", [])
+        self.call(colonies, "square", [2])
+        self.call(colonies, "square", [2])
+        self.assertEqual(self.calls, [None, None, 2])
+
+    def test_coalesce(self):
+        colonies = self.server.client(memo=True)
+        spec = func_spec("square", [5], self.colonyname, "python-executor")
+        first = colonies.submit_func_spec(spec, self.prvkey)
+        second = colonies.submit_func_spec(spec, self.prvkey)
+        self.assertEqual(second.processid, first.processid)
+        self.assertEqual(colonies.wait(second, 5, self.prvkey).output, [25])
+        self.assertEqual(colonies.memo.stats()["coalesced"], 1)
+
+    def test_ttl(self):
+        colonies = self.server.client(memo=ResultCache(ttl=0.2))
+        self.call(colonies, square, [3])
+        time.sleep(0.3)
+        self.call(self.server.client(memo=ResultCache(ttl=0.2)), square, [3])
+        self.assertEqual(self.calls, [3, 3])
+        # the expired local entry is replaced by the result stored by the other client
+        self.call(colonies, square, [3])
+        self.assertEqual(self.calls, [3, 3])
+
+    def test_invalidate(self):
+        colonies = self.server.client(memo=True)
+        self.call(colonies, square, [3])
+        self.call(colonies, square, [4])
+        spec = func_spec(square, [3], self.colonyname, "python-executor")
+        self.assertEqual(colonies.invalidate_results(self.colonyname, self.prvkey, spec=spec), 1)
+        self.call(colonies, square, [3])
+        self.call(colonies, square, [4])
+        self.assertEqual(self.calls, [3, 4, 3])
+        self.assertEqual(colonies.invalidate_results(self.colonyname, self.prvkey, funcname="square"), 2)
+        self.call(colonies, square, [4])
+        self.assertEqual(self.calls, [3, 4, 3, 4])
+
+    def test_invalidate_exact(self):
+        colonies = self.server.client(memo=True)
+        self.call(colonies, "square", [3])
+        self.call(colonies, "square-ts", [3])
+        workflow = Workflow(colonyname=self.colonyname)
+        workflow.functionspecs.append(func_spec("square", [6], self.colonyname, "idle-executor"))
+        colonies.submit_workflow(workflow, self.prvkey)
+
+        # the function name is matched exactly, not as a prefix of another one
+        self.assertEqual(colonies.invalidate_results(self.colonyname, self.prvkey, funcname="square"), 1)
+        self.assertEqual(colonies.invalidate_results(self.colonyname, self.prvkey, funcname="workflow"), 0)
+        self.call(colonies, "square-ts", [3])
+        self.assertEqual(self.calls, [3, -3])
+        self.assertEqual(colonies.invalidate_results(self.colonyname, self.prvkey, workflows=True), 1)
+        self.assertEqual(colonies.invalidate_results(self.colonyname, self.prvkey), 1)
+        self.call(colonies, "square-ts", [3])
+        self.assertEqual(self.calls, [3, -3, -3])
+
+    def test_executor_stores(self):
+        memo_client = self.server.client(memo=True)
+        executor = Executor(memo_client, self.colonyname, "memo-executor", "memo-executor", self.crypto.prvkey(),
+                            colony_prvkey=self.colony_prvkey, assign_timeout=0.2)
+        executor.register()
+
+        @executor.function("square")
+        def run(x):
+            self.calls.append(x)
+            return x * x
+
+        executor.start()
+        self.addCleanup(executor.drain, 0)
+
+        # fire-and-forget: the submitter never reads the process back
+        spec = func_spec("square", [7], self.colonyname, "memo-executor")
+        process = self.colonies.submit_func_spec(spec, self.prvkey)
+        for _ in range(50):
+            if memo_client.memo.stats()["entries"] == 1:
+                break
+            time.sleep(0.1)
+        self.assertEqual(self.colonies.get_process(process.processid, self.prvkey).state, Colonies.SUCCESSFUL)
+
+        other = self.server.client(memo=True)
+        self.assertEqual(other.wait(other.submit_func_spec(spec, self.prvkey), 5, self.prvkey).output, [49])
+        self.assertEqual(other.memo.stats()["hits"], 1)
+        self.assertEqual(self.calls, [7])
+
+    def test_workflow(self):
+        colonies = self.server.client(memo=True)
+        workflow = Workflow(colonyname=self.colonyname)
+        workflow.functionspecs.append(func_spec("square", [6], self.colonyname, "python-executor"))
+        graph = colonies.submit_workflow(workflow, self.prvkey)
+        self.assertEqual(colonies.submit_workflow(workflow, self.prvkey).processgraphid, graph.processgraphid)
+        self.assertEqual(colonies.memo.stats()["hits"], 1)
+
+        colonies.remove_processgraph(graph.processgraphid, self.prvkey)
+        self.assertNotEqual(colonies.submit_workflow(workflow, self.prvkey).processgraphid, graph.processgraphid)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import sys
+import os
+from unittest import mock
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crypto import Crypto
+from pycolonies import func_spec
+from mockserver import MockColoniesServer
+
+
+class MockServerTestCase(unittest.TestCase):
+    """Base of the tests run against one MockColoniesServer per test class.
+
+    Every test gets a client and its own colony, named colony_prefix followed
+    by the test name, so tests of a class do not see each other's processes.
+    Set s3 to point the S3 environment variables at the server during each
+    test.
+    """
+
+    colony_prefix = "test"
+    executortype = "test-executor"
+    s3 = False
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockColoniesServer().start()
+        cls.crypto = Crypto()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        if self.s3:
+            env = mock.patch.dict(os.environ, self.server.s3_env())
+            env.start()
+            self.addCleanup(env.stop)
+        self.colonies = self.server.client()
+        self.colonyname, self.colony_prvkey = self.add_test_colony()
+
+    def add_test_colony(self):
+        colony_prvkey = self.crypto.prvkey()
+        colonyname = self.colony_prefix + "-" + self.id().split(".")[-1]
+        self.colonies.add_colony({"colonyid": self.crypto.id(colony_prvkey), "name": colonyname}, self.crypto.prvkey())
+        return colonyname, colony_prvkey
+
+    def add_test_executor(self, executorname="executor", executortype=None):
+        executor_prvkey = self.crypto.prvkey()
+        executor = {
+            "executorname": executorname,
+            "executorid": self.crypto.id(executor_prvkey),
+            "colonyname": self.colonyname,
+            "executortype": executortype or self.executortype
+        }
+        self.colonies.add_executor(executor, self.colony_prvkey)
+        self.colonies.approve_executor(self.colonyname, executorname, self.colony_prvkey)
+        return executor_prvkey
+
+    def submit(self, funcname="sum", args=[], **kwargs):
+        spec = func_spec(funcname, args, self.colonyname, self.executortype, **kwargs)
+        return self.colonies.submit_func_spec(spec, self.executor_prvkey)
+
+    def assign(self):
+        return self.colonies.assign(self.colonyname, 1, self.executor_prvkey)
@@ -0,0 +1,169 @@
+import unittest
+import base64
+import json
+import requests
+import sys
+import os
+import threading
+import time
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crypto import Crypto
+from pycolonies import Colonies, ColoniesConnectionError, func_spec
+from model import FuncSpec, Conditions, Workflow
+from mockserver import MockColoniesServer
+from mock_testcase import MockServerTestCase
+
+
+class TestMockServer(MockServerTestCase):
+    colony_prefix = "mock"
+    s3 = True
+
+    def setUp(self):
+        super().setUp()
+        self.executor_prvkey = self.add_test_executor()
+
+    def test_submit_assign_close(self):
+        spec = func_spec("sum", [1, 2], self.colonyname, "test-executor")
+        process = self.colonies.submit_func_spec(spec, self.executor_prvkey)
+        self.assertEqual(process.state, Colonies.WAITING)
+
+        assigned = self.colonies.assign(self.colonyname, 1, self.executor_prvkey)
+        self.assertEqual(assigned.processid, process.processid)
+        self.assertEqual(assigned.state, Colonies.RUNNING)
+        self.assertEqual(assigned.assignedexecutorid, self.crypto.id(self.executor_prvkey))
+
+        self.colonies.close(assigned.processid, [3], self.executor_prvkey)
+        process = self.colonies.wait(process, 5, self.executor_prvkey)
+        self.assertEqual(process.state, Colonies.SUCCESSFUL)
+        self.assertEqual(process.output, [3])
+
+        stats = self.colonies.stats(self.colonyname, self.colony_prvkey)
+        self.assertEqual(stats["successfulprocesses"], 1)
+
+    def test_assign_timeout(self):
+        start = time.monotonic()
+        with self.assertRaises(ColoniesConnectionError):
+            self.colonies.assign(self.colonyname, 0.2, self.executor_prvkey)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_assign_matches_executortype(self):
+        other_prvkey = self.add_test_executor("other", "other-executor")
+        spec = func_spec("sum", [], self.colonyname, "test-executor")
+        self.colonies.submit_func_spec(spec, self.executor_prvkey)
+
+        with self.assertRaises(ColoniesConnectionError):
+            self.colonies.assign(self.colonyname, 0.1, other_prvkey)
+        self.colonies.assign(self.colonyname, 1, self.executor_prvkey)
+
+    def test_assign_blocks_until_submit(self):
+        spec = func_spec("sum", [], self.colonyname, "test-executor")
+        timer = threading.Timer(0.1, self.colonies.submit_func_spec, args=(spec, self.executor_prvkey))
+        timer.start()
+        process = self.colonies.assign(self.colonyname, 5, self.executor_prvkey)
+        self.assertEqual(process.spec.funcname, "sum")
+
+    def test_maxexectime_retries(self):
+        spec = func_spec("sum", [], self.colonyname, "test-executor", maxexectime=1, maxretries=1)
+        process = self.colonies.submit_func_spec(spec, self.executor_prvkey)
+        self.colonies.assign(self.colonyname, 1, self.executor_prvkey)
+
+        retried = self.colonies.assign(self.colonyname, 5, self.executor_prvkey)
+        self.assertEqual(retried.processid, process.processid)
+        self.assertEqual(retried.retries, 1)
+
+        process = self.colonies.wait(process, 5, self.executor_prvkey)
+        self.assertEqual(process.state, Colonies.FAILED)
+
+    def test_workflow(self):
+        def spec(nodename, dependencies):
+            return FuncSpec(
+                nodename=nodename,
+                funcname=nodename,
+                conditions=Conditions(colonyname=self.colonyname, executortype="test-executor", dependencies=dependencies)
+            )
+
+        workflow = Workflow(colonyname=self.colonyname, functionspecs=[spec("a", []), spec("b", []), spec("c", ["a", "b"])])
+        graph = self.colonies.submit_workflow(workflow, self.executor_prvkey)
+        self.assertEqual(len(graph.rootprocessids), 2)
+
+        for _ in range(2):
+            process = self.colonies.assign(self.colonyname, 1, self.executor_prvkey)
+            self.assertIn(process.spec.funcname, ["a", "b"])
+            self.colonies.close(process.processid, [process.spec.funcname], self.executor_prvkey)
+
+        process = self.colonies.assign(self.colonyname, 1, self.executor_prvkey)
+        self.assertEqual(process.spec.funcname, "c")
+        self.assertEqual(sorted(process.input), ["a", "b"])
+        self.colonies.close(process.processid, [], self.executor_prvkey)
+
+        graph = self.colonies.get_processgraph(graph.processgraphid, self.executor_prvkey)
+        self.assertEqual(graph.state, Colonies.SUCCESSFUL)
+
+    def test_channels(self):
+        spec = func_spec("chat", [], self.colonyname, "test-executor")
+        spec.channels = ["chat"]
+        process = self.colonies.submit_func_spec(spec, self.executor_prvkey)
+        self.colonies.assign(self.colonyname, 1, self.executor_prvkey)
+
+        self.colonies.channel_append(process.processid, "chat", 1, "hello", self.executor_prvkey)
+        timer = threading.Timer(0.1, self.colonies.channel_append, args=(process.processid, "chat", 2, "world", self.executor_prvkey))
+        timer.start()
+
+        entries = []
+
+        def callback(batch):
+            entries.extend(batch)
+            return len(entries) < 2
+
+        self.colonies.subscribe_channel(process.processid, "chat", self.executor_prvkey, after_seq=0, timeout=2, callback=callback)
+        self.assertEqual([e["sequence"] for e in entries], [1, 2])
+
+        entries = self.colonies.channel_read(process.processid, "chat", 1, 10, self.executor_prvkey)
+        self.assertEqual(len(entries), 1)
+
+    def test_logs(self):
+        spec = func_spec("sum", [], self.colonyname, "test-executor")
+        process = self.colonies.submit_func_spec(spec, self.executor_prvkey)
+        self.colonies.assign(self.colonyname, 1, self.executor_prvkey)
+        for i in range(3):
+            self.colonies.add_log(process.processid, "line " + str(i), self.executor_prvkey)
+
+        logs = self.colonies.get_process_log(self.colonyname, process.processid, 100, -1, self.executor_prvkey)
+        self.assertEqual([log["message"] for log in logs], ["line 0", "line 1", "line 2"])
+        logs = self.colonies.get_process_log(self.colonyname, process.processid, 100, logs[0]["timestamp"], self.executor_prvkey)
+        self.assertEqual(len(logs), 2)
+        logs = self.colonies.get_executor_log(self.colonyname, "executor", 100, -1, self.executor_prvkey)
+        self.assertEqual(len(logs), 3)
+
+    def test_files(self):
+        f = self.colonies.upload_data(self.colonyname, self.executor_prvkey, filename="data.bin", data=b"\x00\x01payload", label="/mock")
+        fileid = f["fileid"]
+        data = self.colonies.download_data(self.colonyname, self.executor_prvkey, fileid=fileid)
+        self.assertEqual(data, b"\x00\x01payload")
+
+        labels = self.colonies.get_file_labels(self.colonyname, self.executor_prvkey)
+        self.assertEqual([label["name"] for label in labels], ["/mock"])
+
+        self.colonies.delete_file(self.colonyname, self.executor_prvkey, fileid=fileid)
+        with self.assertRaises(ColoniesConnectionError):
+            self.colonies.get_file(self.colonyname, self.executor_prvkey, fileid=fileid)
+
+
+class TestMockServerAuthenticate(unittest.TestCase):
+    def test_invalid_signature(self):
+        with MockColoniesServer(authenticate=True) as server:
+            payload = base64.b64encode(json.dumps({"msgtype": "getcoloniesmsg"}).encode("utf-8")).decode("ascii")
+            rpc = {"payloadtype": "getcoloniesmsg", "payload": payload, "signature": "00" * 65}
+            reply = requests.post("http://127.0.0.1:" + str(server.port) + "/api", json=rpc)
+            self.assertEqual(reply.status_code, 403)
+
+            crypto = Crypto()
+            colonies = server.client()
+            self.assertEqual(colonies.list_colonies(crypto.prvkey()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
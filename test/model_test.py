@@ -1,4 +1,9 @@
 import unittest
+import sys
+import os
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from pycolonies import File, Reference, S3Object
 
@@ -18,4 +23,8 @@ class TestModel(unittest.TestCase):
         file_with_single_leading_slash = file_with_auto_appended_slash = File(fileid="id", colonyname="testcolony", label="///filelabel",
                     name="filename", size=100, sequencenr=1, checksum="cheksum", checksumalg="alg", ref=reference)
 
-        assert "/filelabel" == file_with_single_leading_slash.label
\ No newline at end of file
+        assert "/filelabel" == file_with_single_leading_slash.label
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import sys
+import os
+import pickle
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from offload import PayloadCache, make_ref, parse_ref, resolve_refs
+from model import Process, FuncSpec, Conditions
+
+
+def process_dict(input, output):
+    return {
+        "processid": "p1",
+        "initiatorid": "",
+        "initiatorname": "",
+        "assignedexecutorid": "",
+        "isassigned": False,
+        "state": 0,
+        "prioritytime": 0,
+        "submissiontime": "2024-01-01T12:00:00Z",
+        "starttime": "2024-01-01T12:00:00Z",
+        "endtime": "2024-01-01T12:00:00Z",
+        "waitdeadline": "2024-01-01T12:00:00Z",
+        "execdeadline": "2024-01-01T12:00:00Z",
+        "retries": 0,
+        "attributes": None,
+        "spec": FuncSpec(conditions=Conditions(executortype="test")).model_dump(),
+        "parents": [],
+        "children": [],
+        "processgraphid": "",
+        "in": input,
+        "out": output,
+        "errors": []
+    }
+
+
+class TestOffload(unittest.TestCase):
+    def test_ref_roundtrip(self):
+        ref = make_ref("dev", "fileid1", 1234)
+        self.assertEqual(parse_ref(ref), {"colonyname": "dev", "fileid": "fileid1", "size": 1234})
+        self.assertIsNone(parse_ref("hello"))
+        self.assertIsNone(parse_ref(1))
+
+    def test_resolve_mixed_values(self):
+        payloads = {"a": [1, 2], "b": ["x"]}
+        values = [make_ref("dev", "a", 10), "plain", make_ref("dev", "b", 10)]
+        resolved = resolve_refs(values, lambda ref: payloads[ref["fileid"]])
+        self.assertEqual(resolved, [1, 2, "plain", "x"])
+
+    def test_process_resolves_lazily_once(self):
+        fetched = []
+
+        def resolver(values):
+            fetched.append(values)
+            return resolve_refs(values, lambda ref: [3.5, 4.5])
+
+        process = Process.with_resolver(process_dict([make_ref("dev", "a", 10)], [make_ref("dev", "b", 10)]),
+                                        resolver)
+        self.assertEqual(fetched, [])
+        self.assertEqual(process.output, [3.5, 4.5])
+        self.assertEqual(process.output, [3.5, 4.5])
+        self.assertEqual(len(fetched), 1)
+        self.assertEqual(process.input, [3.5, 4.5])
+        self.assertEqual(len(fetched), 2)
+
+    def test_process_without_refs(self):
+        process = Process.with_resolver(process_dict(["a"], [1]),
+                                        lambda values: self.fail("resolver should not be called"))
+        self.assertIs(type(process), Process)
+        self.assertEqual(process.input, ["a"])
+        self.assertEqual(process.output, [1])
+        self.assertEqual(pickle.loads(pickle.dumps(process)), process)
+
+    def test_pickle_resolves(self):
+        process = Process.with_resolver(process_dict(["a"], [make_ref("dev", "b", 10)]),
+                                        lambda values: resolve_refs(values, lambda ref: [1, 2]))
+        copy = pickle.loads(pickle.dumps(process))
+        self.assertEqual(copy.output, [1, 2])
+        self.assertEqual(copy.input, ["a"])
+
+    def test_payload_cache_evicts_lru(self):
+        cache = PayloadCache(max_bytes=10)
+        cache.put("a", [1], 4)
+        cache.put("b", [2], 4)
+        self.assertEqual(cache.get("a"), [1])
+        cache.put("c", [3], 4)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), [1])
+        self.assertEqual(cache.get("c"), [3])
+        cache.put("d", [4], 11)
+        self.assertIsNone(cache.get("d"))
+
+
+if __name__ == '__main__':
+    unittest.main()
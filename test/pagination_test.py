@@ -0,0 +1,101 @@
+import unittest
+import sys
+import os
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycolonies import iter_pages, offset_pages, since_pages, tail_pages
+
+
+class TestPagination(unittest.TestCase):
+    def test_offset_pages(self):
+        entries = list(range(25))
+        counts = []
+
+        def list_fn(count):
+            counts.append(count)
+            return entries[:count]
+
+        fetch, advance = offset_pages(list_fn, 10)
+        self.assertEqual(list(iter_pages(fetch, 0, advance)), entries)
+        self.assertEqual(counts, [10, 20, 30])
+
+    def test_offset_pages_exact_multiple(self):
+        entries = list(range(20))
+        fetch, advance = offset_pages(lambda count: entries[:count], 10)
+        self.assertEqual(list(iter_pages(fetch, 0, advance)), entries)
+
+    def test_offset_pages_empty(self):
+        fetch, advance = offset_pages(lambda count: None, 10)
+        self.assertEqual(list(iter_pages(fetch, 0, advance)), [])
+
+    def test_since_pages(self):
+        logs = [{"timestamp": ts, "message": str(ts)} for ts in range(1, 8)]
+        cursors = []
+
+        def list_fn(count, since):
+            cursors.append(since)
+            return [log for log in logs if log["timestamp"] > since][:count]
+
+        fetch, advance = since_pages(list_fn, 3)
+        self.assertEqual(list(iter_pages(fetch, (-1, frozenset()), advance)), logs)
+        # the entries at the last timestamp of a page are fetched again
+        self.assertEqual(cursors, [-1, 2, 5])
+
+    def test_since_pages_same_timestamps(self):
+        logs = [{"timestamp": ts, "message": str(i)} for i, ts in enumerate([1, 2, 3, 3, 4, 5])]
+        list_fn = lambda count, since: [log for log in logs if log["timestamp"] > since][:count]
+        fetch, advance = since_pages(list_fn, 3)
+        self.assertEqual(list(iter_pages(fetch, (0, frozenset()), advance)), logs)
+
+        logs = [{"timestamp": ts, "message": str(i)} for i, ts in enumerate([1, 1, 1, 1, 1, 2])]
+        self.assertEqual(list(iter_pages(fetch, (0, frozenset()), advance)), logs)
+
+    def test_early_close(self):
+        fetch, advance = offset_pages(lambda count: list(range(count)), 5)
+        pages = iter_pages(fetch, 0, advance)
+        self.assertEqual(next(pages), 0)
+        pages.close()
+
+
+class TestTailPages(unittest.TestCase):
+    def logs(self, timestamps):
+        return [{"timestamp": ts, "message": str(i)} for i, ts in enumerate(timestamps)]
+
+    def test_same_timestamps(self):
+        logs = self.logs([1, 2, 2, 2, 2, 3])
+        list_fn = lambda count, since: [log for log in logs if log["timestamp"] > since][:count]
+        self.assertEqual(list(tail_pages(list_fn, -1, 2, follow=False)), logs)
+
+    def test_follow(self):
+        logs = self.logs([1, 2, 3, 3, 4])
+        visible = [2]
+        state = {"finished": False}
+
+        def list_fn(count, since):
+            # one more entry becomes visible on every poll
+            entries = [log for log in logs[:visible[0]] if log["timestamp"] > since][:count]
+            visible[0] += 1
+            if visible[0] > len(logs):
+                state["finished"] = True
+            return entries
+
+        tail = tail_pages(list_fn, -1, 10, finished=lambda: state["finished"], poll_interval=0.001)
+        self.assertEqual(list(tail), logs)
+
+    def test_adaptive_interval(self):
+        polls = []
+
+        def list_fn(count, since):
+            polls.append(since)
+            return []
+
+        tail = tail_pages(list_fn, -1, 10, poll_interval=0.01, max_poll_interval=0.04, timeout=0.2)
+        self.assertEqual(list(tail), [])
+        # 0.01 + 0.02 + 0.04 + 0.04 + ... instead of a poll every 0.01 seconds
+        self.assertLess(len(polls), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+import sys
+import os
+import time
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from errors import ColoniesRateLimitError, ColoniesServerError
+from instrumentation import RPCEvent
+from ratelimit import TokenBucket, RateLimiter, AdaptiveRateLimiter
+from mock_testcase import MockServerTestCase
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_rate(self):
+        bucket = TokenBucket(20, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            self.assertTrue(bucket.acquire())
+        # the first token is there, the other five take 1/20 s each
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_burst(self):
+        bucket = TokenBucket(1, burst=5)
+        for _ in range(5):
+            self.assertEqual(bucket.reserve(), 0.0)
+        self.assertFalse(bucket.acquire(timeout=0.1))
+        self.assertAlmostEqual(bucket.reserve(), 1.0, places=1)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+
+class RateLimitTestCase(MockServerTestCase):
+    colony_prefix = "ratelimit"
+
+    def setUp(self):
+        super().setUp()
+        self.prvkey = self.executor_prvkey = self.crypto.prvkey()
+
+    def submit(self):
+        return super().submit("noop")
+
+
+class TestRateLimiter(RateLimitTestCase):
+    def test_limit(self):
+        limiter = RateLimiter({"submitfuncspecmsg": 50}, burst=5)
+        limiter.attach(self.colonies)
+        start = time.monotonic()
+        for _ in range(10):
+            self.submit()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        stats = limiter.stats()["submitfuncspecmsg"]
+        self.assertEqual(stats["calls"], 10)
+        self.assertGreater(stats["throttled"], 0)
+
+        # other calls are not limited
+        for _ in range(20):
+            self.colonies.stats(self.colonyname, self.prvkey)
+        self.assertEqual(list(limiter.stats()), ["submitfuncspecmsg"])
+
+        limiter.detach()
+        self.assertEqual(self.colonies.pre_rpc_hooks, [])
+
+    def test_timeout(self):
+        limiter = RateLimiter({"submitfuncspecmsg": 1}, burst=1, timeout=0)
+        limiter.attach(self.colonies)
+        self.submit()
+        with self.assertRaises(ColoniesRateLimitError):
+            self.submit()
+        self.assertEqual(limiter.stats()["submitfuncspecmsg"]["rejected"], 1)
+        self.assertEqual(self.colonies.stats(self.colonyname, self.prvkey)["waitingprocesses"], 1)
+
+    def test_rejection_not_retried(self):
+        limiter = RateLimiter({"getcolonystatsmsg": 1}, burst=1, timeout=0)
+        limiter.attach(self.colonies)
+        events = []
+        self.colonies.add_rpc_hook(post=events.append)
+        tokens = self.colonies.retry.budget.tokens
+        self.colonies.stats(self.colonyname, self.prvkey)
+        with self.assertRaises(ColoniesRateLimitError):
+            self.colonies.stats(self.colonyname, self.prvkey)
+        # an idempotent call, but rejected once without spending the retry budget
+        self.assertEqual(limiter.stats()["getcolonystatsmsg"]["calls"], 2)
+        self.assertGreaterEqual(self.colonies.retry.budget.tokens, tokens)
+        self.assertIsInstance(events[-1].error, ColoniesRateLimitError)
+        self.assertEqual(len(events), 2)
+
+
+class TestAdaptiveRateLimiter(RateLimitTestCase):
+    def limiter(self, **kwargs):
+        limiter = AdaptiveRateLimiter({"submitfuncspecmsg": 1000}, self.colonyname, self.prvkey, interval=0, **kwargs)
+        limiter.attach(self.colonies)
+        self.addCleanup(limiter.detach)
+        return limiter
+
+    def test_queue_depth(self):
+        limiter = self.limiter(max_queue=3, target_latency=None)
+        for _ in range(5):
+            self.submit()
+        # checked before each submission, the fifth one saw four waiting processes
+        self.assertTrue(limiter.saturated)
+        self.assertEqual(limiter.queue_depth, 4)
+        self.assertAlmostEqual(limiter.rate("submitfuncspecmsg"), 500)
+
+        self.colonies.remove_all_processes(self.colonyname, self.prvkey)
+        self.submit()
+        self.assertFalse(limiter.saturated)
+        self.assertAlmostEqual(limiter.rate("submitfuncspecmsg"), 600)
+
+    def test_latency(self):
+        limiter = self.limiter(max_queue=None, target_latency=0.1, min_ratio=0.1)
+        event = RPCEvent("submitfuncspecmsg", 100, 0, 0)
+        event.network = 1.0
+        limiter.observe(event)
+        for _ in range(5):
+            self.submit()
+        self.assertTrue(limiter.saturated)
+        self.assertAlmostEqual(limiter.rate("submitfuncspecmsg"), 100)
+
+    def test_own_wait(self):
+        # waiting in the limiter must not count as server latency
+        limiter = AdaptiveRateLimiter({"getcolonystatsmsg": 10}, self.colonyname, self.prvkey, burst=1, interval=0,
+                                      max_queue=None, target_latency=0.05)
+        limiter.attach(self.colonies)
+        self.addCleanup(limiter.detach)
+        events = []
+        self.colonies.add_rpc_hook(post=events.append)
+        for _ in range(5):
+            self.colonies.stats(self.colonyname, self.prvkey)
+        self.assertFalse(limiter.saturated)
+        self.assertLess(limiter.latency, 0.05)
+        self.assertAlmostEqual(limiter.rate("getcolonystatsmsg"), 10)
+        self.assertGreater(sum(event.wait for event in events), 0.2)
+
+    def test_overload_replies(self):
+        limiter = self.limiter(max_queue=None, target_latency=None)
+        event = RPCEvent("submitfuncspecmsg", 100, 0, 0)
+        event.error = ColoniesServerError("busy", status=503)
+        limiter.observe(event)
+        self.submit()
+        self.assertTrue(limiter.saturated)
+        self.submit()
+        self.assertFalse(limiter.saturated)
+        self.assertAlmostEqual(limiter.rate("submitfuncspecmsg"), 600)
+
+
+if __name__ == '__main__':
+    unittest.main()
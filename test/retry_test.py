@@ -0,0 +1,168 @@
+import unittest
+import sys
+import os
+import base64
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crypto import Crypto
+from pycolonies import (Colonies, ColoniesConnectionError, ColoniesTransportError, ColoniesError,
+                        ColoniesAuthError, ColoniesNotFoundError, ColoniesConflictError, ColoniesServerError)
+from errors import ColoniesTimeoutError, error_from_reply
+from retry import RetryBudget, RetryPolicy
+from mockserver import MockColoniesServer
+
+
+def unused_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FlakyServer:
+    """Replies with the given HTTP statuses in turn, then with an empty colony list."""
+
+    def __init__(self, statuses):
+        statuses = list(statuses)
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                server.requests += 1
+                status = statuses.pop(0) if len(statuses) > 0 else 200
+                if status == 200:
+                    payload = []
+                else:
+                    payload = {"status": status, "message": "unavailable"}
+                body = json.dumps({
+                    "payloadtype": "reply",
+                    "payload": base64.b64encode(json.dumps(payload).encode()).decode(),
+                    "error": status != 200
+                }).encode()
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class TestErrors(unittest.TestCase):
+    def test_error_from_reply(self):
+        self.assertIsInstance(error_from_reply(403, "denied"), ColoniesAuthError)
+        self.assertIsInstance(error_from_reply(404, "missing"), ColoniesNotFoundError)
+        self.assertIsInstance(error_from_reply(409, "exists"), ColoniesConflictError)
+        self.assertIsInstance(error_from_reply(504, "timeout"), ColoniesTimeoutError)
+        self.assertIsInstance(error_from_reply(500, "db"), ColoniesServerError)
+        err = error_from_reply(400, "bad", "addcolonymsg")
+        self.assertIs(type(err), ColoniesError)
+        self.assertEqual(err.status, 400)
+        self.assertEqual(err.msgtype, "addcolonymsg")
+        self.assertEqual(str(err), "bad")
+        # existing code catches ColoniesConnectionError for every failed call
+        self.assertIsInstance(err, ColoniesConnectionError)
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_budget(self):
+        budget = RetryBudget(max_tokens=4, ratio=0.5)
+        self.assertTrue(budget.failure())
+        self.assertFalse(budget.failure())
+        self.assertFalse(budget.failure())
+        for _ in range(6):
+            budget.success()
+        self.assertTrue(budget.failure())
+
+    def test_retryable(self):
+        policy = RetryPolicy()
+        refused = ColoniesTransportError("refused", "submitfuncspecmsg", connect_failed=True)
+        reset = ColoniesTransportError("reset", "submitfuncspecmsg")
+        self.assertTrue(policy.retryable("submitfuncspecmsg", refused))
+        self.assertFalse(policy.retryable("submitfuncspecmsg", reset))
+        self.assertTrue(policy.retryable("getprocessmsg", reset))
+        self.assertTrue(policy.retryable("getprocessmsg", error_from_reply(503, "unavailable")))
+        self.assertFalse(policy.retryable("getprocessmsg", error_from_reply(404, "missing")))
+        self.assertFalse(policy.retryable("closesuccessfulmsg", error_from_reply(503, "unavailable")))
+
+    def test_max_attempts(self):
+        policy = RetryPolicy(max_attempts=2)
+        err = error_from_reply(503, "unavailable")
+        self.assertTrue(policy.should_retry("getprocessmsg", err, 0))
+        self.assertFalse(policy.should_retry("getprocessmsg", err, 1))
+
+    def test_delay(self):
+        policy = RetryPolicy(base_delay=0.1, max_delay=0.3)
+        for attempt in range(10):
+            self.assertLessEqual(policy.delay(attempt), 0.3)
+
+
+class TestRetries(unittest.TestCase):
+    def setUp(self):
+        self.prvkey = Crypto().prvkey()
+
+    def count_attempts(self, colonies):
+        attempts = []
+        colonies.add_rpc_hook(pre=attempts.append)
+        return attempts
+
+    def test_retry_unavailable(self):
+        server = FlakyServer([503, 503])
+        try:
+            colonies = Colonies("127.0.0.1", server.port, retry=RetryPolicy(base_delay=0.01))
+            self.assertEqual(colonies.list_colonies(self.prvkey), [])
+            self.assertEqual(server.requests, 3)
+        finally:
+            server.stop()
+
+    def test_no_retry_when_disabled(self):
+        server = FlakyServer([503])
+        try:
+            colonies = Colonies("127.0.0.1", server.port, retry=False)
+            with self.assertRaises(ColoniesServerError) as cm:
+                colonies.list_colonies(self.prvkey)
+            self.assertEqual(cm.exception.status, 503)
+            self.assertEqual(cm.exception.msgtype, "getcoloniesmsg")
+            self.assertEqual(server.requests, 1)
+        finally:
+            server.stop()
+
+    def test_connection_refused(self):
+        colonies = Colonies("127.0.0.1", unused_port(), retry=RetryPolicy(max_attempts=3, base_delay=0.01))
+        attempts = self.count_attempts(colonies)
+        with self.assertRaises(ColoniesTransportError) as cm:
+            colonies.add_colony({"colonyid": "", "name": "test"}, self.prvkey)
+        self.assertTrue(cm.exception.connect_failed)
+        self.assertEqual(len(attempts), 3)
+
+    def test_mock_server_errors(self):
+        with MockColoniesServer() as server:
+            colonies = server.client()
+            attempts = self.count_attempts(colonies)
+            with self.assertRaises(ColoniesNotFoundError) as cm:
+                colonies.get_process("missing", self.prvkey)
+            self.assertEqual(cm.exception.status, 404)
+            self.assertEqual(len(attempts), 1)
+
+            colonies.add_colony({"colonyid": "", "name": "test"}, self.prvkey)
+            with self.assertRaises(ColoniesConflictError):
+                colonies.add_colony({"colonyid": "", "name": "test"}, self.prvkey)
+
+
+if __name__ == '__main__':
+    unittest.main()
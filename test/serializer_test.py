@@ -0,0 +1,44 @@
+import unittest
+import sys
+import os
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from serializer import available_serializers, get_serializer, StdlibSerializer
+
+
+class TestSerializer(unittest.TestCase):
+    def test_roundtrip(self):
+        msg = {
+            "msgtype": "closesuccessfulmsg",
+            "processid": "abc",
+            "out": ["hello", 1, 2.5, "/path/åäö"],
+            "nested": {"list": [True, False, None]}
+        }
+        for name in available_serializers():
+            serializer = get_serializer(name)
+            data = serializer.dumps(msg)
+            self.assertIsInstance(data, bytes)
+            self.assertEqual(serializer.loads(data), msg)
+            self.assertEqual(serializer.loads(data.decode("utf-8")), msg)
+
+    def test_backends_interoperate(self):
+        msg = {"payload": list(range(256)), "name": "chat"}
+        for a in available_serializers():
+            for b in available_serializers():
+                self.assertEqual(get_serializer(b).loads(get_serializer(a).dumps(msg)), msg)
+
+    def test_default_is_fastest(self):
+        self.assertEqual(get_serializer().name, available_serializers()[0])
+
+    def test_stdlib(self):
+        self.assertIsInstance(get_serializer("json"), StdlibSerializer)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_serializer("yaml")
+
+
+if __name__ == '__main__':
+    unittest.main()
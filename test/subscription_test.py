@@ -0,0 +1,109 @@
+import unittest
+import sys
+import os
+import queue
+import threading
+import time
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from errors import ColoniesAuthError, ColoniesTimeoutError
+from pycolonies import ProcessSubscription
+
+
+class FakeWebSocket:
+    def __init__(self, events):
+        self.events = events
+        self.closed = False
+
+    def recv(self):
+        while not self.closed:
+            try:
+                return self.events.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        raise ConnectionError("closed")
+
+    def abort(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+class TestProcessSubscription(unittest.TestCase):
+    def setUp(self):
+        self.events = {0: queue.Queue(), 2: queue.Queue()}
+        self.connects = []
+
+    def connect(self, state):
+        self.connects.append(state)
+        return FakeWebSocket(self.events[state])
+
+    def test_delivers_all_states(self):
+        sub = ProcessSubscription(self.connect, lambda data: data, [0, 2])
+        self.events[0].put(("p1", 0))
+        self.events[2].put(("p1", 2))
+        received = {sub.get(timeout=2), sub.get(timeout=2)}
+        sub.close()
+        self.assertEqual(received, {("p1", 0), ("p1", 2)})
+
+    def test_filter(self):
+        sub = ProcessSubscription(self.connect, lambda data: data, [0], filter=lambda p: p[0] != "skip")
+        self.events[0].put(("skip", 0))
+        self.events[0].put(("keep", 0))
+        self.assertEqual(sub.get(timeout=2), ("keep", 0))
+        sub.close()
+
+    def test_drop_oldest_on_overflow(self):
+        sub = ProcessSubscription(self.connect, lambda data: data, [0], maxqueue=2, overflow="drop")
+        for i in range(5):
+            self.events[0].put(i)
+        deadline = time.monotonic() + 2
+        while sub.dropped < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(sub.dropped, 3)
+        self.assertEqual([sub.get(timeout=1), sub.get(timeout=1)], [3, 4])
+        sub.close()
+
+    def test_resubscribes_after_timeout(self):
+        def decode(data):
+            if data == "timeout":
+                raise ColoniesTimeoutError("subscription timed out", status=408)
+            return data
+
+        sub = ProcessSubscription(self.connect, decode, [0])
+        self.events[0].put("timeout")
+        self.events[0].put("after")
+        self.assertEqual(sub.get(timeout=2), "after")
+        sub.close()
+        self.assertGreaterEqual(self.connects.count(0), 2)
+
+    def test_raises_permanent_error(self):
+        def decode(data):
+            if data == "denied":
+                raise ColoniesAuthError("access denied", status=403)
+            return data
+
+        sub = ProcessSubscription(self.connect, decode, [0])
+        self.events[0].put("denied")
+        with self.assertRaises(ColoniesAuthError):
+            sub.get(timeout=2)
+        with self.assertRaises(ColoniesAuthError):
+            list(sub)
+        self.assertTrue(sub.closed.is_set())
+        self.assertEqual(self.connects.count(0), 1)
+
+    def test_close_ends_iteration(self):
+        sub = ProcessSubscription(self.connect, lambda data: data, [0])
+        threading.Timer(0.1, sub.close).start()
+        self.assertEqual(list(sub), [])
+
+    def test_invalid_overflow(self):
+        with self.assertRaises(ValueError):
+            ProcessSubscription(self.connect, lambda data: data, [0], overflow="spill")
+
+
+if __name__ == '__main__':
+    unittest.main()
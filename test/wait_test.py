@@ -0,0 +1,100 @@
+import unittest
+import sys
+import os
+import socket
+import threading
+import time
+from types import SimpleNamespace
+
+# Prioritize local source over installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_testcase import MockServerTestCase
+from pycolonies import Colonies
+
+
+def unused_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TestWaitPollingFallback(unittest.TestCase):
+    def setUp(self):
+        # nothing listens on the port, so the WebSocket subscription fails
+        self.colonies = Colonies("127.0.0.1", unused_port(), tls=False)
+        conditions = SimpleNamespace(executortype="test", colonyname="test")
+        self.process = SimpleNamespace(processid="p1", spec=SimpleNamespace(conditions=conditions))
+
+    def fake_get_process(self, states):
+        calls = []
+
+        def get_process(processid, prvkey):
+            calls.append(time.monotonic())
+            return SimpleNamespace(processid=processid, state=states[min(len(calls), len(states)) - 1])
+
+        self.colonies.get_process = get_process
+        return calls
+
+    def test_returns_on_failure(self):
+        calls = self.fake_get_process([Colonies.WAITING, Colonies.RUNNING, Colonies.FAILED])
+        process = self.colonies.wait(self.process, 10, "prvkey")
+        self.assertEqual(process.state, Colonies.FAILED)
+        self.assertEqual(len(calls), 3)
+
+    def test_returns_on_success(self):
+        self.fake_get_process([Colonies.RUNNING, Colonies.SUCCESSFUL])
+        process = self.colonies.wait(self.process, 10, "prvkey")
+        self.assertEqual(process.state, Colonies.SUCCESSFUL)
+
+    def test_backoff_and_deadline(self):
+        calls = self.fake_get_process([Colonies.RUNNING])
+        start = time.monotonic()
+        process = self.colonies.wait(self.process, 0.5, "prvkey")
+        self.assertEqual(process.state, Colonies.RUNNING)
+        self.assertLess(time.monotonic() - start, 1.5)
+        intervals = [b - a for a, b in zip(calls, calls[1:])]
+        self.assertGreater(intervals[1], intervals[0])
+
+    def test_cancelled(self):
+        calls = self.fake_get_process([Colonies.RUNNING])
+        cancelled = threading.Event()
+        threading.Timer(0.2, cancelled.set).start()
+        start = time.monotonic()
+        process = self.colonies.wait(self.process, 10, "prvkey", cancelled)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(process.state, Colonies.RUNNING)
+
+
+class TestWaitSubscription(MockServerTestCase):
+    colony_prefix = "wait"
+
+    def setUp(self):
+        super().setUp()
+        self.prvkey = self.executor_prvkey = self.crypto.prvkey()
+        self.process = self.submit("f")
+        self.rpcs = []
+        self.colonies.add_rpc_hook(pre=lambda event: self.rpcs.append(event.msgtype))
+
+    def test_fractional_timeout(self):
+        def finish():
+            self.colonies.assign(self.colonyname, 1, self.prvkey)
+            self.colonies.close(self.process.processid, ["done"], self.prvkey)
+
+        threading.Timer(0.2, finish).start()
+        process = self.colonies.wait(self.process, 1.5, self.prvkey)
+        self.assertEqual(process.state, Colonies.SUCCESSFUL)
+        # delivered by the subscription, not polled
+        self.assertNotIn("getprocessmsg", self.rpcs)
+
+    def test_cancelled(self):
+        cancelled = threading.Event()
+        threading.Timer(0.2, cancelled.set).start()
+        start = time.monotonic()
+        process = self.colonies.wait(self.process, 10, self.prvkey, cancelled)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(process.state, Colonies.WAITING)
+
+
+if __name__ == '__main__':
+    unittest.main()